@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark del channel layer SQLite (core.channels_sqlite) frente a InMemoryChannelLayer.
+
+Mide, en un mismo proceso, envío+recepción por un canal y group_send a un grupo
+de --conexiones canales; y, solo para SQLite (InMemory no cruza procesos), la
+entrega de --mensajes group_send a un canal que escucha otro proceso.
+Usa un archivo SQLite temporal (no toca el configurado en settings).
+
+Uso: python benchmarks/channel_layers.py [--mensajes 5000] [--conexiones 1000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from channels.layers import InMemoryChannelLayer  # noqa: E402
+
+from core.channels_sqlite import SQLiteChannelLayer  # noqa: E402
+
+
+async def punto_a_punto(layer, mensajes):
+    canal = await layer.new_channel()
+    inicio = time.perf_counter()
+    for i in range(mensajes):
+        await layer.send(canal, {'type': 'bench', 'i': i})
+        await layer.receive(canal)
+    return mensajes / (time.perf_counter() - inicio)
+
+
+async def difusion(layer, conexiones, repeticiones=5):
+    canales = [await layer.new_channel() for _ in range(conexiones)]
+    for canal in canales:
+        await layer.group_add('bench', canal)
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        await layer.group_send('bench', {'type': 'bench', 'i': i})
+        for canal in canales:
+            await layer.receive(canal)
+    return conexiones * repeticiones / (time.perf_counter() - inicio)
+
+
+def receptor(ruta, mensajes, listo, resultado):
+    async def _recibir():
+        layer = SQLiteChannelLayer(ruta=ruta)
+        canal = await layer.new_channel()
+        await layer.group_add('entre_procesos', canal)
+        listo.set()
+        await layer.receive(canal)
+        inicio = time.perf_counter()
+        for _ in range(mensajes - 1):
+            await layer.receive(canal)
+        resultado.value = (mensajes - 1) / (time.perf_counter() - inicio)
+
+    asyncio.run(_recibir())
+
+
+async def emisor(ruta, mensajes):
+    layer = SQLiteChannelLayer(ruta=ruta)
+    inicio = time.perf_counter()
+    for i in range(mensajes):
+        await layer.group_send('entre_procesos', {'type': 'bench', 'i': i})
+    return mensajes / (time.perf_counter() - inicio)
+
+
+def entre_procesos(ruta, mensajes):
+    contexto = multiprocessing.get_context('spawn')
+    listo, resultado = contexto.Event(), contexto.Value('d', 0.0)
+    proceso = contexto.Process(target=receptor, args=(ruta, mensajes, listo, resultado))
+    proceso.start()
+    listo.wait(30)
+    enviados = asyncio.run(emisor(ruta, mensajes))
+    proceso.join(120)
+    return enviados, resultado.value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mensajes', type=int, default=5000)
+    parser.add_argument('--conexiones', type=int, default=1000)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='sara-channels-')
+    try:
+        ruta = str(Path(directorio) / 'channels.sqlite3')
+        capas = {
+            'InMemoryChannelLayer': lambda: InMemoryChannelLayer(capacity=args.mensajes),
+            'SQLiteChannelLayer': lambda: SQLiteChannelLayer(ruta=ruta, capacity=args.mensajes),
+        }
+        for nombre, crear in capas.items():
+            print(nombre)
+            print(f'  send+receive (mismo loop)     {asyncio.run(punto_a_punto(crear(), args.mensajes)):10,.0f} msg/s')
+            print(f'  group_send a {args.conexiones} canales   {asyncio.run(difusion(crear(), args.conexiones)):10,.0f} entregas/s')
+
+        enviados, recibidos = entre_procesos(ruta, args.mensajes)
+        print('SQLiteChannelLayer entre procesos')
+        print(f'  group_send                    {enviados:10,.0f} msg/s')
+        print(f'  recepción en el otro proceso  {recibidos:10,.0f} msg/s')
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
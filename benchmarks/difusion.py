@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Benchmark de entrega de difusiones por el channel layer: un group_send por usuario vs. un grupo compartido.
+
+Simula --conexiones conexiones WebSocket (un canal cada una, como NotificationConsumer)
+sobre el channel layer configurado y mide el tiempo hasta que todas reciben el aviso.
+No usa la base de datos; la inserción se mide con `manage.py difundir_notificacion`.
+
+Uso: python benchmarks/difusion.py [--conexiones 2000] [--repeticiones 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sara.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from channels.layers import get_channel_layer  # noqa: E402
+
+from core.notificaciones import GRUPO_TODOS, grupo_usuario  # noqa: E402
+
+MENSAJE = {'type': 'notification_broadcast', 'notification': {'id': None, 'titulo': 'Aviso', 'mensaje': 'Prueba'}}
+
+
+async def conectar(layer, conexiones):
+    """Crea un canal por conexión y lo une a su grupo propio y al compartido"""
+    canales = []
+    for usuario_id in range(conexiones):
+        canal = await layer.new_channel()
+        await layer.group_add(grupo_usuario(usuario_id), canal)
+        await layer.group_add(GRUPO_TODOS, canal)
+        canales.append(canal)
+    return canales
+
+
+async def recibir_todos(layer, canales):
+    for canal in canales:
+        await layer.receive(canal)
+
+
+async def medir(layer, canales, compartido):
+    inicio = time.perf_counter()
+    if compartido:
+        await layer.group_send(GRUPO_TODOS, dict(MENSAJE))
+    else:
+        for usuario_id in range(len(canales)):
+            await layer.group_send(grupo_usuario(usuario_id), dict(MENSAJE))
+    enviado = time.perf_counter() - inicio
+    await recibir_todos(layer, canales)
+    return enviado, time.perf_counter() - inicio
+
+
+async def principal(conexiones, repeticiones):
+    layer = get_channel_layer()
+    canales = await conectar(layer, conexiones)
+    print(f'{conexiones} conexiones sobre {type(layer).__name__}')
+
+    for nombre, compartido in (('un grupo por usuario', False), ('grupo compartido', True)):
+        envios, totales = [], []
+        for _ in range(repeticiones):
+            enviado, total = await medir(layer, canales, compartido)
+            envios.append(enviado * 1000)
+            totales.append(total * 1000)
+        total = statistics.median(totales)
+        print(f'  {nombre:22s} group_send {statistics.median(envios):9.2f} ms   '
+              f'entrega completa {total:9.2f} ms   ({conexiones / total * 1000:,.0f} conexiones/s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--conexiones', type=int, default=2000)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(principal(args.conexiones, args.repeticiones))
+
+
+if __name__ == '__main__':
+    main()
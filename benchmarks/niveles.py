@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark del cálculo de nivel: bucle original vs. fórmula cerrada vs. bisect.
+
+Uso: python benchmarks/niveles.py [--max-xp 1000000] [--repeticiones 5]
+"""
+import argparse
+import random
+import sys
+import timeit
+from bisect import bisect_right
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from core.gamificacion import nivel_desde_experiencia, umbral_nivel  # noqa: E402
+
+
+def nivel_bucle(puntos_experiencia):
+    """Implementación original de Usuario.calcular_nivel"""
+    puntos_necesarios = 0
+    nivel = 1
+    while puntos_necesarios <= puntos_experiencia:
+        puntos_necesarios += nivel * 100
+        if puntos_necesarios <= puntos_experiencia:
+            nivel += 1
+    return nivel
+
+
+def crear_nivel_bisect(max_xp):
+    """Alternativa con tabla de umbrales precalculada"""
+    umbrales = []
+    nivel = 1
+    while not umbrales or umbrales[-1] <= max_xp:
+        umbrales.append(umbral_nivel(nivel))
+        nivel += 1
+    return lambda xp: bisect_right(umbrales, xp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--max-xp', type=int, default=1_000_000)
+    parser.add_argument('--muestras', type=int, default=10_000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    muestras = [random.randint(0, args.max_xp) for _ in range(args.muestras)]
+    nivel_bisect = crear_nivel_bisect(args.max_xp)
+
+    # Las tres implementaciones deben coincidir (incluidos los bordes de cada nivel)
+    bordes = [umbral_nivel(n) + d for n in range(1, 200) for d in (-1, 0, 1) if umbral_nivel(n) + d >= 0]
+    for xp in muestras + bordes:
+        esperado = nivel_bucle(xp)
+        assert nivel_desde_experiencia(xp) == esperado, xp
+        if xp <= args.max_xp:
+            assert nivel_bisect(xp) == esperado, xp
+
+    print(f'{args.muestras} cálculos de nivel con XP en [0, {args.max_xp}]')
+    resultados = {}
+    for nombre, funcion in [('bucle', nivel_bucle), ('formula', nivel_desde_experiencia), ('bisect', nivel_bisect)]:
+        tiempo = min(timeit.repeat(lambda: [funcion(xp) for xp in muestras], number=1, repeat=args.repeticiones))
+        resultados[nombre] = tiempo
+        print(f'  {nombre:8s} {tiempo * 1e6 / args.muestras:8.3f} µs/cálculo')
+
+    print(f'Aceleración de la fórmula sobre el bucle: x{resultados["bucle"] / resultados["formula"]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Benchmark de conteo y listado de notificaciones con y sin los índices de Notificacion.
+
+Crea una base SQLite temporal (nunca toca db.sqlite3), la puebla con
+--filas notificaciones repartidas entre --usuarios usuarios y mide:
+  - conteo de no leídas de un usuario
+  - últimas 10 no leídas de un usuario
+  - últimas 20 notificaciones de un usuario
+primero con los índices del modelo y luego sin ellos, y el archivado por
+lotes. La base se puebla una vez y cada caso trabaja sobre una copia
+nueva, así todos miden exactamente los mismos datos.
+
+Uso: python benchmarks/notificaciones.py [--filas 10000000] [--usuarios 10000]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sara.settings')
+
+
+def configurar_django(ruta_db):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(ruta_db)}
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def poblar(filas, usuarios, proporcion_leidas, tamano_lote=200_000):
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from core.models import Notificacion, Usuario
+
+    Usuario.objects.bulk_create(
+        [Usuario(username=f'bench{i}', password='!') for i in range(usuarios)], batch_size=5000
+    )
+    ids = list(Usuario.objects.filter(username__startswith='bench').values_list('id', flat=True))
+
+    tabla = Notificacion._meta.db_table
+    sql = (
+        f'INSERT INTO {tabla} (usuario_id, tipo, titulo, mensaje, fecha, leida, fecha_lectura, '
+        f'url_accion, texto_accion, prioridad) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'
+    )
+    ahora = timezone.now()
+    random.seed(42)
+    insertadas = 0
+    inicio = time.perf_counter()
+    while insertadas < filas:
+        n = min(tamano_lote, filas - insertadas)
+        lote = []
+        for _ in range(n):
+            fecha = ahora - timedelta(minutes=random.randint(0, 365 * 24 * 60))
+            leida = random.random() < proporcion_leidas
+            lote.append((
+                random.choice(ids), 'info', 'Notificación', 'Mensaje de prueba', fecha,
+                leida, fecha if leida else None, '', '', 1,
+            ))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, lote)
+        insertadas += n
+        print(f'  {insertadas}/{filas} filas ({insertadas / (time.perf_counter() - inicio):.0f}/s)', end='\r')
+    print()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return ids
+
+
+def usar_copia(base, copia):
+    """Apunta la conexión a una copia recién hecha de la base poblada (y borra la copia anterior)"""
+    from django.db import connection
+
+    anterior = Path(connection.settings_dict['NAME'])
+    connection.close()
+    if anterior != base:
+        anterior.unlink(missing_ok=True)
+    shutil.copyfile(base, copia)
+    connection.settings_dict['NAME'] = str(copia)
+
+
+def medir(usuarios):
+    from core.models import Notificacion
+
+    consultas = {
+        'conteo no leídas': lambda u: Notificacion.objects.filter(usuario_id=u, leida=False).count(),
+        'últimas 10 no leídas': lambda u: list(Notificacion.objects.filter(usuario_id=u, leida=False).order_by('-fecha')[:10]),
+        'últimas 20': lambda u: list(Notificacion.objects.filter(usuario_id=u).order_by('-fecha')[:20]),
+    }
+    resultados = {}
+    for nombre, consulta in consultas.items():
+        tiempos = []
+        for usuario_id in usuarios:
+            inicio = time.perf_counter()
+            consulta(usuario_id)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        resultados[nombre] = (statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1])
+    return resultados
+
+
+def plan(usuario_id):
+    from django.db import connection
+    from core.models import Notificacion
+
+    sql, params = Notificacion.objects.filter(usuario_id=usuario_id, leida=False).order_by('-fecha')[:10].query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return ' | '.join(str(fila[-1]) for fila in cursor.fetchall())
+
+
+def quitar_indices():
+    from django.db import connection
+    from core.models import Notificacion
+
+    with connection.schema_editor() as editor:
+        for indice in Notificacion._meta.indexes:
+            editor.remove_index(Notificacion, indice)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def imprimir(titulo, resultados):
+    print(titulo)
+    for nombre, (mediana, p95) in resultados.items():
+        print(f'  {nombre:22s} mediana {mediana:8.2f} ms   p95 {p95:8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, default=10_000_000)
+    parser.add_argument('--usuarios', type=int, default=10_000)
+    parser.add_argument('--leidas', type=float, default=0.95, help='Proporción de notificaciones leídas')
+    parser.add_argument('--muestras', type=int, default=200, help='Usuarios consultados por medición')
+    parser.add_argument('--lotes-archivo', type=int, default=20, help='Lotes de archivado a medir')
+    args = parser.parse_args()
+
+    directorio = Path(tempfile.mkdtemp(prefix='sara-bench-'))
+    try:
+        base = directorio / 'bench.sqlite3'
+        configurar_django(base)
+        print(f'Poblando {args.filas} notificaciones para {args.usuarios} usuarios...')
+        ids = poblar(args.filas, args.usuarios, args.leidas)
+        usuarios = random.Random(7).sample(ids, min(args.muestras, len(ids)))
+
+        usar_copia(base, directorio / 'con_indices.sqlite3')
+        print(f'Plan con índices: {plan(usuarios[0])}')
+        imprimir('Con índices:', medir(usuarios))
+
+        usar_copia(base, directorio / 'archivado.sqlite3')
+        from core.archivado import archivar_notificaciones
+        resumen = archivar_notificaciones(max_lotes=args.lotes_archivo)
+        print(f'Archivado: {resumen["archivadas"]} notificaciones en {resumen["segundos"]}s ({resumen["por_segundo"]}/s)')
+
+        usar_copia(base, directorio / 'sin_indices.sqlite3')
+        quitar_indices()
+        print(f'Plan sin índices: {plan(usuarios[0])}')
+        imprimir('Sin índices (solo el índice de la FK):', medir(usuarios))
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Actividad diaria por usuario.
+
+ActividadDiaria guarda una fila por usuario y día con la cantidad de
+registros y errores. Las rachas y el calendario de actividad salen de un
+único escaneo por rango sobre el índice (usuario, fecha).
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ActividadDiaria
+
+# Días leídos por consulta al calcular una racha; si la racha ocupa toda la ventana se amplía
+VENTANA_RACHA = 366
+
+
+def fecha_local(momento=None):
+    return timezone.localdate(momento) if momento else timezone.localdate()
+
+
+def registrar_actividad(usuario_id, fecha=None, registros=0, errores=0):
+    """Suma los deltas a la actividad del día (crea la fila si no existe)"""
+    fecha = fecha or fecha_local()
+    cambios = {
+        'registros': Greatest(F('registros') + registros, Value(0)),
+        'errores': Greatest(F('errores') + errores, Value(0)),
+    }
+    if ActividadDiaria.objects.filter(usuario_id=usuario_id, fecha=fecha).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            ActividadDiaria.objects.create(
+                usuario_id=usuario_id, fecha=fecha, registros=max(registros, 0), errores=max(errores, 0)
+            )
+    except IntegrityError:
+        # Otra petición creó la fila del día entre el UPDATE y el INSERT
+        ActividadDiaria.objects.filter(usuario_id=usuario_id, fecha=fecha).update(**cambios)
+
+
+def calcular_racha(usuario_id, hoy=None):
+    """
+    Días consecutivos con registros que terminan hoy (o ayer, si hoy todavía no hubo actividad).
+    """
+    hoy = hoy or fecha_local()
+    racha = 0
+    esperado = hoy
+    hasta = hoy
+    while True:
+        desde = hasta - timedelta(days=VENTANA_RACHA - 1)
+        fechas = ActividadDiaria.objects.filter(
+            usuario_id=usuario_id, fecha__range=(desde, hasta), registros__gt=0
+        ).order_by('-fecha').values_list('fecha', flat=True)
+
+        for fecha in fechas:
+            if racha == 0 and fecha == hoy - timedelta(days=1):
+                # Sin actividad hoy la racha de ayer sigue vigente
+                esperado = fecha
+            if fecha != esperado:
+                return racha
+            racha += 1
+            esperado = fecha - timedelta(days=1)
+
+        if esperado >= desde:
+            return racha
+        hasta = desde - timedelta(days=1)
+
+
+def registros_del_dia(usuario_id, fecha=None):
+    """Registros del usuario en el día (por defecto hoy), leídos de la fila única (usuario, fecha)"""
+    return ActividadDiaria.objects.filter(
+        usuario_id=usuario_id, fecha=fecha or fecha_local()
+    ).values_list('registros', flat=True).first() or 0
+
+
+def calendario_actividad(usuario_id, dias=365, hoy=None):
+    """Actividad por día del período (solo los días con actividad)"""
+    hoy = hoy or fecha_local()
+    return list(ActividadDiaria.objects.filter(
+        usuario_id=usuario_id, fecha__range=(hoy - timedelta(days=dias - 1), hoy)
+    ).order_by('fecha').values('fecha', 'registros', 'errores'))
@@ -0,0 +1,112 @@
+"""
+Cache por usuario del análisis de IA.
+
+Las vistas leen la última instantánea calculada y, si no existe o quedó
+obsoleta (nuevos errores o TTL vencido), se recalcula en segundo plano.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .tareas import ejecutar_en_segundo_plano
+
+logger = logging.getLogger(__name__)
+
+CLAVE_ANALISIS = 'analisis_ia:{usuario_id}'
+CLAVE_OBSOLETO = 'analisis_ia:{usuario_id}:obsoleto'
+
+# Usuarios con un recálculo en curso en este proceso y los que deben repetirse al terminar
+_en_curso = set()
+_repetir = set()
+_lock = threading.Lock()
+
+
+def _ttl():
+    return getattr(settings, 'SARA_ANALISIS_IA_TTL', 3600)
+
+
+def analisis_vacio():
+    """Análisis mostrado mientras todavía no hay una instantánea calculada"""
+    return {
+        'precision': None,
+        'recomendacion': None,
+        'sugerencias': [],
+        'analisis_errores': None,
+        'generado_en': None,
+        'antiguedad': None,
+        'pendiente': True,
+    }
+
+
+def obtener_analisis(usuario_id):
+    """Devuelve la última instantánea del análisis y programa su recálculo si hace falta"""
+    snapshot = cache.get(CLAVE_ANALISIS.format(usuario_id=usuario_id))
+
+    if snapshot is None:
+        programar_recalculo(usuario_id)
+        return analisis_vacio()
+
+    antiguedad = timezone.now() - snapshot['generado_en']
+    obsoleto = cache.get(CLAVE_OBSOLETO.format(usuario_id=usuario_id), False)
+    if obsoleto or antiguedad.total_seconds() > _ttl():
+        programar_recalculo(usuario_id)
+
+    analisis = dict(snapshot['datos'])
+    analisis['generado_en'] = snapshot['generado_en']
+    analisis['antiguedad'] = antiguedad
+    analisis['pendiente'] = bool(obsoleto)
+    return analisis
+
+
+def marcar_obsoleto(usuario_id, recalcular=True):
+    """Marca la instantánea del usuario como desactualizada (por ejemplo, al aparecer nuevos errores)"""
+    cache.set(CLAVE_OBSOLETO.format(usuario_id=usuario_id), True, timeout=None)
+    if recalcular:
+        # Tras el commit: antes, el recálculo podría leer la base sin el cambio y darse por actualizado
+        transaction.on_commit(lambda: programar_recalculo(usuario_id))
+
+
+def programar_recalculo(usuario_id):
+    """Encola el recálculo del análisis evitando duplicados para el mismo usuario"""
+    with _lock:
+        if usuario_id in _en_curso:
+            _repetir.add(usuario_id)
+            return False
+        _en_curso.add(usuario_id)
+
+    ejecutar_en_segundo_plano(_recalcular, usuario_id)
+    return True
+
+
+def recalcular_analisis(usuario_id):
+    """Calcula el análisis completo y guarda la instantánea en la cache"""
+    from .ia_recomendador import analizar_usuario
+
+    # Se borra la marca antes de calcular: un error que llegue durante el cálculo la vuelve a activar
+    cache.delete(CLAVE_OBSOLETO.format(usuario_id=usuario_id))
+    datos = analizar_usuario(usuario_id)
+    logger.debug("Análisis IA del usuario %s recalculado; tiempos por etapa (ms): %s", usuario_id, datos.get('tiempos'))
+    cache.set(
+        CLAVE_ANALISIS.format(usuario_id=usuario_id),
+        {'datos': datos, 'generado_en': timezone.now()},
+        timeout=None,
+    )
+    return datos
+
+
+def _recalcular(usuario_id):
+    try:
+        while True:
+            recalcular_analisis(usuario_id)
+            with _lock:
+                if usuario_id not in _repetir:
+                    break
+                _repetir.discard(usuario_id)
+    finally:
+        with _lock:
+            _en_curso.discard(usuario_id)
+            _repetir.discard(usuario_id)
@@ -1,5 +1,3 @@
-from django.conf import settings
-from django.db.utils import OperationalError
 from django.apps import AppConfig
 
 
@@ -8,21 +6,5 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
-        # Crear el usuario bot automáticamente si no existe
-        try:
-            from .models import Usuario
-            Usuario.objects.get_or_create(
-                username='sara_bot',
-                defaults={
-                    'first_name': 'SARA',
-                    'last_name': 'Bot',
-                    'email': 'sara-bot@localhost',
-                    'is_active': True,
-                    'rol': 'operador',
-                }
-            )
-        except OperationalError:
-            # La base de datos puede no estar lista en migraciones
-            pass
-        except Exception:
-            pass
+        from . import signals  # noqa: F401
+        # El usuario bot lo crea la migración 0012_usuario_bot (sin escrituras al arrancar)
@@ -0,0 +1,68 @@
+"""
+Retención de notificaciones.
+
+Las notificaciones leídas más antiguas que el período de retención se copian
+a NotificacionArchivada y se eliminan de la tabla activa, por lotes y en una
+transacción por lote, para que Notificacion solo crezca con lo reciente.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notificacion, NotificacionArchivada
+
+CAMPOS_ARCHIVO = [
+    'id', 'usuario_id', 'tipo', 'titulo', 'mensaje', 'fecha', 'fecha_lectura',
+    'url_accion', 'texto_accion', 'creada_por_id', 'prioridad', 'difusion',
+]
+
+
+def dias_retencion():
+    return getattr(settings, 'SARA_NOTIFICACIONES_RETENCION_DIAS', 90)
+
+
+def pendientes_de_archivo(dias=None):
+    """Notificaciones leídas anteriores al límite de retención (usa el índice parcial de leídas)"""
+    limite = timezone.now() - timedelta(days=dias_retencion() if dias is None else dias)
+    return Notificacion.objects.filter(leida=True, fecha__lt=limite)
+
+
+def archivar_lote(dias=None, tamano_lote=5000):
+    """Mueve un lote al archivo; devuelve la cantidad de notificaciones movidas"""
+    with transaction.atomic():
+        filas = list(pendientes_de_archivo(dias).order_by('fecha').values(*CAMPOS_ARCHIVO)[:tamano_lote])
+        if not filas:
+            return 0
+
+        ahora = timezone.now()
+        NotificacionArchivada.objects.bulk_create(
+            [NotificacionArchivada(fecha_archivado=ahora, **fila) for fila in filas],
+            ignore_conflicts=True,
+        )
+        # delete() normal: el receiver post_delete invalida los contadores de cada usuario
+        Notificacion.objects.filter(pk__in=[fila['id'] for fila in filas]).delete()
+
+    return len(filas)
+
+
+def archivar_notificaciones(dias=None, tamano_lote=5000, max_lotes=None, progreso=None):
+    """Archiva por lotes hasta agotar las pendientes (o `max_lotes`) y devuelve un resumen"""
+    inicio = time.perf_counter()
+    resumen = {'archivadas': 0, 'lotes': 0}
+
+    while max_lotes is None or resumen['lotes'] < max_lotes:
+        movidas = archivar_lote(dias, tamano_lote)
+        if not movidas:
+            break
+        resumen['archivadas'] += movidas
+        resumen['lotes'] += 1
+        if progreso:
+            progreso(resumen['archivadas'])
+
+    segundos = time.perf_counter() - inicio
+    resumen['segundos'] = round(segundos, 3)
+    resumen['por_segundo'] = int(resumen['archivadas'] / segundos) if segundos else 0
+    return resumen
@@ -0,0 +1,220 @@
+"""
+Carga masiva de registros (fuente='bulk') desde archivos CSV o JSONL.
+
+El archivo se lee por bloques con pandas, cada bloque se valida en una sola
+pasada vectorizada (core.validacion.validar_lote) y se escribe con
+bulk_create: un INSERT por lote de registros, otro para sus errores y un
+único UPDATE de las estadísticas del usuario por bloque.
+"""
+import io
+import logging
+import time
+
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from .actividad import fecha_local, registrar_actividad
+from .analisis_cache import marcar_obsoleto
+from .estadisticas import aplicar_delta
+from .models import Error, LogAuditoria, Registro
+from .notificaciones import encolar_estadisticas_usuario
+from .validacion import validar_lote
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ['dni', 'apellido', 'nombres', 'email', 'telefono', 'fecha_nacimiento', 'direccion']
+CAMPOS_OBLIGATORIOS = ['dni', 'apellido', 'email']
+FORMATOS = ('csv', 'jsonl')
+TAMANO_LOTE = 5000
+
+
+def detectar_formato(nombre_archivo, formato=None):
+    """Formato explícito o deducido de la extensión del archivo"""
+    if formato:
+        formato = formato.lower()
+    elif nombre_archivo and nombre_archivo.lower().endswith(('.jsonl', '.ndjson')):
+        formato = 'jsonl'
+    else:
+        formato = 'csv'
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato no soportado: {formato}')
+    return formato
+
+
+def _como_texto(archivo):
+    # Los archivos subidos y los abiertos en modo binario se decodifican al vuelo
+    if isinstance(archivo, (io.TextIOBase, str)):
+        return archivo
+    return io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+
+
+def leer_bloques(archivo, formato='csv', tamano_lote=TAMANO_LOTE):
+    """Itera el archivo en DataFrames de a lo sumo `tamano_lote` filas, sin cargarlo entero en memoria"""
+    archivo = _como_texto(archivo)
+    if formato == 'jsonl':
+        lector = pd.read_json(archivo, lines=True, chunksize=tamano_lote, dtype=False)
+    else:
+        lector = pd.read_csv(archivo, chunksize=tamano_lote, dtype=str, keep_default_na=False)
+    with lector:
+        yield from lector
+
+
+def _normalizar(bloque):
+    df = pd.DataFrame(index=bloque.index)
+    for campo in CAMPOS:
+        if campo in bloque.columns:
+            df[campo] = bloque[campo].fillna('').astype(str).str.strip()
+        else:
+            df[campo] = ''
+        max_length = Registro._meta.get_field(campo).max_length
+        if max_length:
+            df[campo] = df[campo].str[:max_length]
+    return df.reset_index(drop=True)
+
+
+def _errores_del_bloque(df):
+    """DataFrame con una fila por error (fila, campo, tipo, mensaje) del bloque normalizado"""
+    errores = validar_lote(df[['dni', 'email', 'telefono']])
+    # El teléfono es opcional: solo se valida si vino informado
+    if len(errores):
+        vacios = df['telefono'].eq('')
+        errores = errores[~((errores['campo'] == 'telefono') & vacios.loc[errores['fila']].to_numpy())]
+
+    adicionales = []
+    for campo in CAMPOS_OBLIGATORIOS:
+        filas = df.index[df[campo].eq('')]
+        if len(filas):
+            adicionales.append(pd.DataFrame({
+                'fila': filas, 'campo': campo, 'tipo': 'requerido',
+                'mensaje': f'El campo {campo} es obligatorio',
+            }))
+            # Un campo vacío no suma además el error de formato
+            errores = errores[~((errores['campo'] == campo) & errores['fila'].isin(filas))]
+
+    informadas = df['fecha_nacimiento'].ne('')
+    fechas = pd.to_datetime(df['fecha_nacimiento'].where(informadas), errors='coerce', format='mixed', dayfirst=True)
+    filas = df.index[informadas & fechas.isna()]
+    if len(filas):
+        adicionales.append(pd.DataFrame({
+            'fila': filas, 'campo': 'fecha_nacimiento', 'tipo': 'formato',
+            'mensaje': 'La fecha de nacimiento no tiene un formato válido',
+        }))
+
+    columnas = ['fila', 'campo', 'tipo', 'mensaje']
+    errores = pd.concat([errores[columnas], *adicionales], ignore_index=True) if adicionales else errores[columnas]
+    return errores, fechas.dt.date
+
+
+def procesar_bloque(usuario, bloque, ip_origen=None, user_agent=''):
+    """Valida y persiste un bloque; devuelve (registros creados, errores creados, registros con errores)"""
+    df = _normalizar(bloque)
+    if df.empty:
+        return 0, 0, 0
+
+    errores, fechas = _errores_del_bloque(df)
+    errores_por_fila = errores.groupby('fila').size().reindex(df.index, fill_value=0)
+    vacios = sum(df[campo].eq('').astype(int) for campo in CAMPOS_OBLIGATORIOS)
+    # Misma fórmula que Registro.calcular_puntuacion_calidad, sin una consulta por registro
+    calidad = (100.0 - 20 * vacios - 5 * errores_por_fila).clip(0, 100)
+
+    ahora = timezone.now()
+    registros = []
+    for fila in df.itertuples():
+        registro = Registro(
+            usuario=usuario,
+            fecha=ahora,
+            estado='rechazado' if errores_por_fila[fila.Index] else 'pendiente',
+            dni=fila.dni,
+            apellido=fila.apellido,
+            nombres=fila.nombres,
+            email=fila.email,
+            telefono=fila.telefono,
+            fecha_nacimiento=None if pd.isna(fechas[fila.Index]) else fechas[fila.Index],
+            direccion=fila.direccion,
+            fuente='bulk',
+            ip_origen=ip_origen,
+            user_agent=user_agent or '',
+            puntuacion_calidad=float(calidad[fila.Index]),
+        )
+        # bulk_create no llama a save(), así que los datos legacy se arman aquí
+        registro.datos = registro.construir_datos()
+        registros.append(registro)
+
+    con_errores = int((errores_por_fila > 0).sum())
+    total = len(registros)
+
+    with transaction.atomic():
+        Registro.objects.bulk_create(registros, batch_size=TAMANO_LOTE)
+        Error.objects.bulk_create([
+            Error(
+                registro=registros[error.fila],
+                campo=error.campo,
+                tipo=error.tipo,
+                gravedad='alta' if error.tipo == 'requerido' else 'media',
+                mensaje=error.mensaje,
+                mensaje_usuario=error.mensaje[:200],
+                timestamp=ahora,
+            )
+            for error in errores.itertuples()
+        ], batch_size=TAMANO_LOTE)
+
+        # bulk_create no dispara señales: una sola actualización de estadísticas por bloque
+        aplicar_delta(usuario.pk, registros=total, errores=len(errores))
+        registrar_actividad(usuario.pk, fecha_local(ahora), registros=total, errores=len(errores))
+
+    return total, len(errores), con_errores
+
+
+def importar_registros(usuario, archivo, formato='csv', tamano_lote=TAMANO_LOTE, ip_origen=None, user_agent='', progreso=None):
+    """
+    Importa un archivo completo por bloques y devuelve un resumen de la carga.
+
+    Cada bloque se guarda en su propia transacción. Si un bloque posterior no
+    se puede leer, los anteriores quedan guardados: el resumen informa lo
+    importado con la clave 'error' y el análisis, las estadísticas y la
+    auditoría se actualizan igual.
+    """
+    inicio = time.perf_counter()
+    resumen = {'registros': 0, 'errores': 0, 'registros_con_errores': 0, 'lotes': 0}
+
+    try:
+        for bloque in leer_bloques(archivo, formato, tamano_lote):
+            creados, errores, con_errores = procesar_bloque(usuario, bloque, ip_origen, user_agent)
+            resumen['registros'] += creados
+            resumen['errores'] += errores
+            resumen['registros_con_errores'] += con_errores
+            resumen['lotes'] += 1
+            if progreso:
+                progreso(f'Lote {resumen["lotes"]}: {creados} registros, {errores} errores')
+    except (ValueError, UnicodeDecodeError) as e:
+        resumen['error'] = f'Archivo inválido: {e}'
+    finally:
+        _cerrar_carga(usuario, resumen, inicio, ip_origen, user_agent)
+    return resumen
+
+
+def _cerrar_carga(usuario, resumen, inicio, ip_origen, user_agent):
+    segundos = time.perf_counter() - inicio
+    resumen['segundos'] = round(segundos, 3)
+    resumen['registros_por_minuto'] = int(resumen['registros'] / segundos * 60) if segundos else 0
+
+    if resumen['registros']:
+        # bulk_create no dispara señales: se invalida el análisis una sola vez
+        marcar_obsoleto(usuario.pk)
+        usuario.refresh_from_db(fields=['registros_totales', 'errores_totales', 'precision_promedio'])
+        encolar_estadisticas_usuario(usuario)
+
+    descripcion = f'Carga masiva de {resumen["registros"]} registros ({resumen["errores"]} errores)'
+    if 'error' in resumen:
+        descripcion += f' interrumpida: {resumen["error"]}'
+    LogAuditoria.objects.create(
+        usuario=usuario,
+        accion='import',
+        modelo_afectado='Registro',
+        descripcion=descripcion,
+        ip_address=ip_origen,
+        user_agent=user_agent or '',
+        datos_nuevos=resumen,
+    )
+    logger.info('Carga masiva de %s: %s', usuario.pk, resumen)
@@ -0,0 +1,367 @@
+"""
+Channel layer sobre SQLite para varios procesos en un mismo host.
+
+InMemoryChannelLayer solo entrega mensajes dentro del proceso que los envía:
+con varios workers, una notificación enviada desde uno no llega a los sockets
+que atiende otro. Esta capa guarda mensajes y grupos en un archivo SQLite
+compartido (modo WAL), sin servicios externos.
+
+Cada proceso crea sus canales con un prefijo propio ("sqlite.<hex>!...") y un
+único sondeo por proceso recoge todos sus mensajes y los reparte a colas
+locales, así el costo no crece con la cantidad de conexiones. Los envíos a
+canales del propio proceso hechos desde su event loop no pasan por la base.
+
+Solo se entrega localmente a canales vivos de este proceso. Cuando el
+consumer de un canal deja de recibir (se cerró sin group_discard), el canal
+tiene `expiry` segundos de gracia; después se descartan su cola y sus
+membresías, y los mensajes que le lleguen se ignoran.
+
+receive() sobre un canal sin el prefijo del proceso (canales con nombre fijo,
+como los de un worker) no usa el sondeo compartido: cada llamada consulta la
+base por su cuenta. Sirve para pruebas o un worker ocasional, no para muchos
+receptores concurrentes; los consumers usan siempre canales de new_channel().
+
+Los mensajes se serializan con pickle, así admiten los mismos valores que
+InMemoryChannelLayer (bytes, datetime, Decimal...). Por eso el archivo debe
+ser escribible solo por el usuario del servicio, igual que la base de Django.
+
+Sin tráfico, cada sondeo es un PRAGMA data_version (no toca la tabla de
+mensajes) y el intervalo crece hasta sondeo_maximo; tras `inactividad`
+segundos sin mensajes llega a sondeo_inactivo, que es la demora máxima del
+primer mensaje entre procesos después de un período quieto.
+
+Configuración:
+    CHANNEL_LAYERS = {'default': {
+        'BACKEND': 'core.channels_sqlite.SQLiteChannelLayer',
+        'CONFIG': {'ruta': BASE_DIR / 'channels.sqlite3'},
+    }}
+"""
+import asyncio
+import logging
+import pickle
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS mensajes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    canal TEXT NOT NULL,
+    cuerpo BLOB NOT NULL,
+    expira REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mensajes_canal_idx ON mensajes (canal, id);
+CREATE INDEX IF NOT EXISTS mensajes_expira_idx ON mensajes (expira);
+CREATE TABLE IF NOT EXISTS grupos (
+    grupo TEXT NOT NULL,
+    canal TEXT NOT NULL,
+    expira REAL NOT NULL,
+    PRIMARY KEY (grupo, canal)
+) WITHOUT ROWID;
+"""
+
+
+def serializar(mensaje):
+    return pickle.dumps(mensaje, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def deserializar(cuerpo):
+    return pickle.loads(cuerpo)
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """Channel layer con grupos y expiración compartido entre procesos a través de un archivo SQLite"""
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, ruta='channels.sqlite3', expiry=60, group_expiry=86400, capacity=100,
+                 channel_capacity=None, sondeo_minimo=0.002, sondeo_maximo=0.05, sondeo_inactivo=0.25,
+                 inactividad=10.0, intervalo_limpieza=5.0, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.ruta = str(ruta)
+        self.group_expiry = group_expiry
+        self.sondeo_minimo = sondeo_minimo
+        self.sondeo_maximo = sondeo_maximo
+        self.sondeo_inactivo = sondeo_inactivo
+        self.inactividad = inactividad
+        self.intervalo_limpieza = intervalo_limpieza
+
+        # Todos los canales de este proceso comparten el prefijo; el sondeo los recoge de una vez
+        self.prefijo = f'sqlite.{uuid.uuid4().hex}!'
+        self._colas = {}
+        # Canales de este proceso que pueden recibir, y desde cuándo está inactivo cada uno sin receptor
+        self._vivos = set()
+        self._inactivos = {}
+        self._loop = None
+        self._sondeo = None
+
+        # Un solo hilo con su propia conexión: SQLite no bloquea el event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='channels-sqlite')
+        self._conexion = None
+        self._ultima_limpieza = 0.0
+        # PRAGMA data_version visto en el último sondeo y si esta conexión insertó mensajes desde entonces
+        self._version = None
+        self._escrito = False
+
+    # --- Acceso a la base (siempre en el hilo del executor) ---
+
+    def _db(self):
+        if self._conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, check_same_thread=False)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.executescript(ESQUEMA)
+            self._conexion = conexion
+        return self._conexion
+
+    async def _ejecutar(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcion, *args)
+
+    def _pendientes(self, canal):
+        return self._db().execute(
+            'SELECT COUNT(*) FROM mensajes WHERE canal = ? AND expira > ?', (canal, time.time())
+        ).fetchone()[0]
+
+    def _insertar(self, canales, cuerpo):
+        db = self._db()
+        expira = time.time() + self.expiry
+        db.execute('BEGIN')
+        try:
+            db.executemany('INSERT INTO mensajes (canal, cuerpo, expira) VALUES (?, ?, ?)',
+                           [(canal, cuerpo, expira) for canal in canales])
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        self._escrito = True
+
+    def _miembros(self, grupo):
+        """Canales vigentes del grupo con la cantidad de mensajes que tienen pendientes"""
+        ahora = time.time()
+        return self._db().execute(
+            'SELECT g.canal, COUNT(m.id) FROM grupos g '
+            'LEFT JOIN mensajes m ON m.canal = g.canal AND m.expira > ? '
+            'WHERE g.grupo = ? AND g.expira > ? GROUP BY g.canal',
+            (ahora, grupo, ahora),
+        ).fetchall()
+
+    def _recoger_proceso(self):
+        """Extrae todos los mensajes dirigidos a canales de este proceso"""
+        db = self._db()
+        # data_version solo cambia con commits de otras conexiones; los propios los marca _insertar
+        version = db.execute('PRAGMA data_version').fetchone()[0]
+        if version == self._version and not self._escrito:
+            return []
+        self._version, self._escrito = version, False
+        # '"' es el carácter siguiente a '!': el rango cubre exactamente el prefijo
+        filas = db.execute(
+            'DELETE FROM mensajes WHERE canal >= ? AND canal < ? RETURNING id, canal, cuerpo, expira',
+            (self.prefijo, self.prefijo[:-1] + '"'),
+        ).fetchall()
+        filas.sort()
+        return filas
+
+    def _recoger_canal(self, canal):
+        """Extrae el mensaje vigente más antiguo de un canal que no pertenece a ningún proceso"""
+        fila = self._db().execute(
+            'DELETE FROM mensajes WHERE id = ('
+            '  SELECT id FROM mensajes WHERE canal = ? AND expira > ? ORDER BY id LIMIT 1'
+            ') RETURNING cuerpo',
+            (canal, time.time()),
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def _limpiar(self):
+        ahora = time.time()
+        db = self._db()
+        db.execute('DELETE FROM mensajes WHERE expira < ?', (ahora,))
+        db.execute('DELETE FROM grupos WHERE expira < ?', (ahora,))
+
+    # --- Entrega local ---
+
+    def _en_mi_loop(self):
+        return self._loop is not None and self._loop is asyncio.get_running_loop()
+
+    def _cola(self, canal):
+        cola = self._colas.get(canal)
+        if cola is None:
+            cola = self._colas[canal] = asyncio.Queue(maxsize=self.get_capacity(canal))
+        return cola
+
+    def _entregar_local(self, canal, cuerpo):
+        if canal not in self._vivos:
+            # Canal cerrado (o de un proceso anterior con el mismo prefijo): no se crea una cola huérfana
+            return
+        try:
+            self._cola(canal).put_nowait(deserializar(cuerpo))
+        except asyncio.QueueFull:
+            raise ChannelFull(canal)
+
+    def _vencer_inactivos(self):
+        """Canales sin receptor desde hace más de `expiry`: se olvidan y se devuelven para borrar sus membresías"""
+        limite = time.time() - self.expiry
+        vencidos = [canal for canal, desde in self._inactivos.items() if desde < limite]
+        for canal in vencidos:
+            del self._inactivos[canal]
+            self._vivos.discard(canal)
+            self._colas.pop(canal, None)
+        return vencidos
+
+    def _borrar_membresias(self, canales):
+        self._db().executemany('DELETE FROM grupos WHERE canal = ?', [(canal,) for canal in canales])
+
+    def _asegurar_sondeo(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Las colas pertenecen al loop anterior (p. ej. un async_to_sync que ya terminó)
+            self._loop = loop
+            self._colas = {}
+            self._sondeo = None
+        if self._sondeo is None or self._sondeo.done():
+            self._sondeo = loop.create_task(self._sondear())
+
+    async def _sondear(self):
+        espera = self.sondeo_minimo
+        ultimo_mensaje = time.time()
+        while True:
+            try:
+                filas = await self._ejecutar(self._recoger_proceso)
+                if time.time() - self._ultima_limpieza > self.intervalo_limpieza:
+                    self._ultima_limpieza = time.time()
+                    await self._ejecutar(self._limpiar)
+                    vencidos = self._vencer_inactivos()
+                    if vencidos:
+                        await self._ejecutar(self._borrar_membresias, vencidos)
+            except sqlite3.Error:
+                logger.exception('Error al leer mensajes del channel layer SQLite')
+                filas = []
+
+            ahora = time.time()
+            for _, canal, cuerpo, expira in filas:
+                if expira < ahora:
+                    continue
+                try:
+                    self._entregar_local(canal, cuerpo)
+                except ChannelFull:
+                    pass
+                except Exception:
+                    logger.exception('Mensaje ilegible descartado del channel layer SQLite (canal %s)', canal)
+
+            # Con tráfico el intervalo vuelve al mínimo; sin mensajes crece hasta sondeo_maximo,
+            # y hasta sondeo_inactivo si no llegó nada en los últimos `inactividad` segundos
+            if filas:
+                ultimo_mensaje = ahora
+                espera = self.sondeo_minimo
+            else:
+                tope = self.sondeo_inactivo if ahora - ultimo_mensaje > self.inactividad else self.sondeo_maximo
+                espera = min(espera * 2, tope)
+            await asyncio.sleep(espera)
+
+    # --- API de channel layer ---
+
+    async def new_channel(self, prefix='specific'):
+        canal = f'{self.prefijo}{prefix}.{uuid.uuid4().hex[:12]}'
+        self._vivos.add(canal)
+        return canal
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        cuerpo = serializar(message)
+
+        if channel.startswith(self.prefijo) and self._en_mi_loop():
+            self._entregar_local(channel, cuerpo)
+            return
+
+        # El límite de capacidad es aproximado entre procesos (conteo e inserción no son atómicos)
+        if await self._ejecutar(self._pendientes, channel) >= self.get_capacity(channel):
+            raise ChannelFull(channel)
+        await self._ejecutar(self._insertar, [channel], cuerpo)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+
+        if not channel.startswith(self.prefijo):
+            # Canal con nombre fijo: sondeo propio de esta llamada (ver docstring del módulo)
+            espera = self.sondeo_minimo
+            while True:
+                cuerpo = await self._ejecutar(self._recoger_canal, channel)
+                if cuerpo is not None:
+                    return deserializar(cuerpo)
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, self.sondeo_maximo)
+
+        self._asegurar_sondeo()
+        self._vivos.add(channel)
+        self._inactivos.pop(channel, None)
+        cola = self._cola(channel)
+        try:
+            return await cola.get()
+        except asyncio.CancelledError:
+            # El consumer se cerró (o un wait_for venció): si no vuelve a recibir dentro
+            # de `expiry`, el sondeo descarta el canal y sus membresías
+            self._inactivos[channel] = time.time()
+            if cola.empty():
+                self._colas.pop(channel, None)
+            raise
+
+    async def flush(self):
+        def _vaciar():
+            db = self._db()
+            db.execute('DELETE FROM mensajes')
+            db.execute('DELETE FROM grupos')
+
+        await self._ejecutar(_vaciar)
+        self._colas = {}
+        self._inactivos = {}
+
+    async def close(self):
+        if self._sondeo is not None:
+            self._sondeo.cancel()
+            self._sondeo = None
+
+    # --- Extensión de grupos ---
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._ejecutar(lambda: self._db().execute(
+            'INSERT INTO grupos (grupo, canal, expira) VALUES (?, ?, ?) '
+            'ON CONFLICT (grupo, canal) DO UPDATE SET expira = excluded.expira',
+            (group, channel, time.time() + self.group_expiry),
+        ))
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._ejecutar(lambda: self._db().execute(
+            'DELETE FROM grupos WHERE grupo = ? AND canal = ?', (group, channel)
+        ))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        self.require_valid_group_name(group)
+        cuerpo = serializar(message)
+
+        locales = self._en_mi_loop()
+        remotos = []
+        for canal, pendientes in await self._ejecutar(self._miembros, group):
+            if locales and canal.startswith(self.prefijo):
+                try:
+                    self._entregar_local(canal, cuerpo)
+                except ChannelFull:
+                    pass
+            elif pendientes < self.get_capacity(canal):
+                remotos.append(canal)
+
+        # Un solo INSERT por lotes para todos los miembros de otros procesos
+        if remotos:
+            await self._ejecutar(self._insertar, remotos, cuerpo)
@@ -0,0 +1,93 @@
+"""
+Conexiones WebSocket abiertas en el proceso.
+
+Aplica el límite de conexiones por nodo (repartido entre los workers que
+lanza run_asgi.py) y drena las conexiones al apagar: se cierran por tandas a
+lo largo de unos segundos con el código 1012, para que los clientes se
+reconecten a otro worker o nodo de forma escalonada y no todos a la vez.
+"""
+import asyncio
+import logging
+import math
+import os
+import random
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Códigos de cierre: 1013 "Try Again Later" (nodo lleno o drenando), 1012 "Service Restart"
+CODIGO_REINTENTAR = 1013
+CODIGO_REINICIO = 1012
+
+# Tandas por segundo durante el drenado
+TANDAS_POR_SEGUNDO = 10
+
+_conexiones = set()
+_drenando = False
+
+
+def limite_por_proceso():
+    """Conexiones admitidas por este worker (SARA_WS_MAX_CONEXIONES es por nodo); None sin límite"""
+    limite = getattr(settings, 'SARA_WS_MAX_CONEXIONES', None)
+    if not limite:
+        return None
+    workers = int(os.environ.get('SARA_WS_WORKERS') or 1)
+    return max(1, math.ceil(limite / workers))
+
+
+def conexiones_activas():
+    return len(_conexiones)
+
+
+def registrar(consumer):
+    """Anota la conexión si hay lugar; devuelve False si el proceso está lleno o drenando"""
+    limite = limite_por_proceso()
+    if _drenando or (limite is not None and len(_conexiones) >= limite):
+        return False
+    _conexiones.add(consumer)
+    return True
+
+
+def liberar(consumer):
+    _conexiones.discard(consumer)
+
+
+async def drenar(segundos=None):
+    """Deja de admitir conexiones y cierra las abiertas repartidas en `segundos`"""
+    global _drenando
+    _drenando = True
+    pendientes = list(_conexiones)
+    if not pendientes:
+        return
+
+    segundos = getattr(settings, 'SARA_WS_DRENADO_SEGUNDOS', 10) if segundos is None else segundos
+    random.shuffle(pendientes)
+    tandas = max(1, min(len(pendientes), int(segundos * TANDAS_POR_SEGUNDO)))
+    tamano = math.ceil(len(pendientes) / tandas)
+    logger.info('Drenando %s conexiones WebSocket en %ss', len(pendientes), segundos)
+
+    for inicio in range(0, len(pendientes), tamano):
+        for consumer in pendientes[inicio:inicio + tamano]:
+            try:
+                await consumer.close(code=CODIGO_REINICIO)
+            except Exception:
+                logger.debug('No se pudo cerrar una conexión durante el drenado', exc_info=True)
+            liberar(consumer)
+        await asyncio.sleep(segundos / tandas)
+
+
+class ConexionLimitadaMixin:
+    """Para consumers WebSocket: acepta solo si el nodo tiene lugar y libera el cupo al desconectar"""
+
+    async def admitir_conexion(self):
+        """Acepta el socket; si no hay lugar lo cierra con 1013 para que el cliente reintente más tarde"""
+        await self.accept()
+        if registrar(self):
+            return True
+        await self.close(code=CODIGO_REINTENTAR)
+        return False
+
+    async def websocket_disconnect(self, message):
+        liberar(self)
+        await super().websocket_disconnect(message)
@@ -1,11 +1,17 @@
 import json
+from datetime import datetime
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from .models import Notificacion, Usuario
+from .models import Notificacion
+from .conexiones import ConexionLimitadaMixin
+from .contadores import obtener_contadores
+from .notificaciones import GRUPO_TODOS, grupo_rol, snapshot_notificaciones
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(ConexionLimitadaMixin, AsyncWebsocketConsumer):
     """Consumer para manejar notificaciones en tiempo real vía WebSocket"""
 
     async def connect(self):
@@ -14,6 +20,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         logger = logging.getLogger("channels.auth")
         self.user_id = self.scope['url_route']['kwargs']['user_id']
         self.room_group_name = f'notifications_{self.user_id}'
+        self.grupos = []
 
         user = self.scope.get('user')
         logger.info(f"[WS] Intento de conexión: user en scope={user}, user.id={getattr(user, 'id', None)}, user_id en URL={self.user_id}")
@@ -27,25 +34,35 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        logger.info(f"[WS] Usuario autenticado y autorizado. user_id={self.user_id}. Uniendo al grupo {self.room_group_name}")
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Si el nodo está lleno o drenando se cierra con 1013 y el cliente reintenta en otro momento
+        if not await self.admitir_conexion():
+            logger.warning(f"[WS] Límite de conexiones alcanzado. Cerrando conexión para user_id={self.user_id}")
+            return
 
-        await self.accept()
+        logger.info(f"[WS] Usuario autenticado y autorizado. user_id={self.user_id}. Uniendo al grupo {self.room_group_name}")
+        # Grupo propio más los compartidos de difusión (todos y el rol del usuario)
+        self.grupo_rol = grupo_rol(user.rol)
+        self.grupos = [self.room_group_name, GRUPO_TODOS, self.grupo_rol]
+        for grupo in self.grupos:
+            await self.channel_layer.group_add(grupo, self.channel_name)
         logger.info(f"[WS] Conexión WebSocket aceptada para user_id={self.user_id}")
 
-        # Enviar notificaciones no leídas al conectar
-        await self.send_unread_notifications_to_client()
+        # Un solo frame con el estado inicial; ?since=<id> reanuda desde la última notificación vista
+        await self.send_snapshot_to_client(self.cursor_desde())
+
+    def cursor_desde(self):
+        """Id de la última notificación que ya tiene el cliente (parámetro ?since=), o None"""
+        parametros = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return int(parametros['since'][0])
+        except (KeyError, ValueError):
+            return None
 
     async def disconnect(self, close_code):
         """Se ejecuta cuando un cliente se desconecta"""
-        # Salir del grupo
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Salir de los grupos
+        for grupo in self.grupos:
+            await self.channel_layer.group_discard(grupo, self.channel_name)
 
     async def receive(self, text_data):
         """Manejar mensajes del cliente"""
@@ -55,6 +72,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
             if action == 'mark_read':
                 notification_id = data.get('notification_id')
+                if notification_id is None and data.get('difusion'):
+                    # Las difusiones llegan sin id: se busca la fila del usuario por su fecha
+                    notification_id = await self.broadcast_notification_id(data['difusion'])
                 await self.mark_notification_read(notification_id)
             elif action == 'get_unread_count':
                 await self.send_unread_count_to_client()
@@ -81,45 +101,57 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'stats': stats
         }))
 
-    async def send_unread_notifications_to_client(self):
-        """Obtener y enviar notificaciones no leídas al cliente conectado"""
-        try:
-            user = await database_sync_to_async(Usuario.objects.get)(id=self.user_id)
-            notifications = await database_sync_to_async(
-                lambda: list(Notificacion.objects.filter(
-                    usuario=user,
-                    leida=False
-                ).order_by('-fecha')[:10])
-            )()
-
-            for notification in notifications:
-                # Enviar cada notificación directamente al cliente
-                notification_data = {
-                    'id': notification.id,
-                    'titulo': notification.titulo,
-                    'mensaje': notification.mensaje,
-                    'tipo': notification.tipo,
-                    'fecha': notification.fecha.isoformat(),
-                    'leida': notification.leida,
-                    'url_accion': notification.url_accion,
-                    'texto_accion': notification.texto_accion,
-                }
+    async def notification_broadcast(self, event):
+        """Enviar una difusión recibida por el grupo compartido (un mensaje para todas las conexiones)"""
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event['notification']
+        }))
 
-                await self.send(text_data=json.dumps({
-                    'type': 'notification',
-                    'notification': notification_data
-                }))
+    async def notification_batch(self, event):
+        """Enviar en un solo mensaje las notificaciones y estadísticas acumuladas de una petición"""
+        if event.get('rol'):
+            await self.change_role_group(event['rol'])
+            if not event.get('notifications') and not event.get('stats'):
+                return
+        await self.send(text_data=json.dumps({
+            'type': 'notification_batch',
+            'notifications': event.get('notifications', []),
+            'stats': event.get('stats', {}),
+        }))
 
-        except Usuario.DoesNotExist:
-            pass
+    async def change_role_group(self, rol):
+        """El rol del usuario cambió: deja el grupo de difusión anterior y se une al del rol nuevo"""
+        nuevo = grupo_rol(rol)
+        if nuevo == self.grupo_rol:
+            return
+        await self.channel_layer.group_discard(self.grupo_rol, self.channel_name)
+        await self.channel_layer.group_add(nuevo, self.channel_name)
+        self.grupos[self.grupos.index(self.grupo_rol)] = nuevo
+        self.grupo_rol = nuevo
+
+    @database_sync_to_async
+    def broadcast_notification_id(self, fecha):
+        """Id de la fila del usuario para la difusión enviada con esa fecha, o None"""
+        try:
+            fecha = datetime.fromisoformat(fecha)
+        except (TypeError, ValueError):
+            return None
+        return Notificacion.objects.filter(
+            usuario_id=self.user_id, difusion=True, fecha=fecha
+        ).values_list('id', flat=True).first()
+
+    async def send_snapshot_to_client(self, desde_id=None):
+        """Enviar conteo de no leídas y últimas notificaciones en un único mensaje"""
+        snapshot = await database_sync_to_async(snapshot_notificaciones)(self.user_id, desde_id)
+        await self.send(text_data=json.dumps(snapshot))
 
     async def mark_notification_read(self, notification_id):
         """Marcar notificación como leída"""
         try:
-            user = await database_sync_to_async(Usuario.objects.get)(id=self.user_id)
             notification = await database_sync_to_async(
                 Notificacion.objects.get
-            )(id=notification_id, usuario=user)
+            )(id=notification_id, usuario_id=self.user_id)
             
             await database_sync_to_async(notification.marcar_leida)()
 
@@ -135,29 +167,19 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 }
             )
 
-        except (Usuario.DoesNotExist, Notificacion.DoesNotExist):
+        except Notificacion.DoesNotExist:
             pass
 
     async def send_unread_count_to_client(self):
         """Enviar conteo de notificaciones no leídas al cliente"""
-        try:
-            user = await database_sync_to_async(Usuario.objects.get)(id=self.user_id)
-            count = await database_sync_to_async(
-                lambda: Notificacion.objects.filter(
-                    usuario=user,
-                    leida=False
-                ).count()
-            )()
-
-            await self.send(text_data=json.dumps({
-                'type': 'stats_update',
-                'stats': {
-                    'unread_notifications': count
-                }
-            }))
+        contadores = await database_sync_to_async(obtener_contadores)(self.user_id)
 
-        except Usuario.DoesNotExist:
-            pass
+        await self.send(text_data=json.dumps({
+            'type': 'stats_update',
+            'stats': {
+                'unread_notifications': contadores['no_leidas']
+            }
+        }))
 
 
 # Función utilitaria para enviar notificaciones desde cualquier parte del código
@@ -3,23 +3,15 @@ import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from .models import ChatMessage, Usuario
-from .ia_recomendador import ollama_generate
+from django.db import IntegrityError, transaction
+from .models import ChatMessage
+from .conexiones import ConexionLimitadaMixin
+from .conversaciones import get_bot_user, id_bot, marcar_hilo_leido, registrar_mensaje  # noqa: F401 (get_bot_user se reexporta)
+from .ia_recomendador import ollama_stream
 
 logger = logging.getLogger("chat_ollama")
 
-def get_bot_user():
-    from .models import Usuario
-    bot_user, _ = Usuario.objects.get_or_create(username='sara_bot', defaults={
-        'first_name': 'SARA',
-        'last_name': 'Bot',
-        'email': 'sara-bot@localhost',
-        'is_active': True,
-        'rol': 'operador',
-    })
-    return bot_user
-
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(ConexionLimitadaMixin, AsyncWebsocketConsumer):
     async def connect(self):
         user = self.scope.get('user')
         if isinstance(user, AnonymousUser):
@@ -27,28 +19,48 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
         self.user_id = str(user.id)
         self.room_group_name = f'chat_{self.user_id}'
-        # Obtener el usuario bot y su ID real de forma asíncrona
-        bot_user = await database_sync_to_async(get_bot_user)()
-        self.bot_user_id = str(bot_user.id)
-        self.bot_user = bot_user
+        if not await self.admitir_conexion():
+            return
+        # Id del bot cacheado por proceso: solo la primera conexión consulta la base
+        self.bot_user_id = str(await database_sync_to_async(id_bot)())
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
     async def receive(self, text_data=None, bytes_data=None):
         data = json.loads(text_data)
+        if data.get('action') == 'read':
+            # El cliente tiene la conversación abierta: lo recibido ya está leído
+            await self.mark_read(data.get('other_id'))
+            return
         sender_id = self.user_id
-        recipient_id = data.get('recipient_id')
+        try:
+            recipient_id = int(data.get('recipient_id'))
+        except (TypeError, ValueError):
+            return
         text = data.get('text')
+        if not text:
+            return
         is_bot = str(recipient_id) == str(self.bot_user_id)
         logger.info(f"Mensaje recibido: de {sender_id} para {recipient_id} (is_bot={is_bot}): {text}")
-        await self.save_message(sender_id, recipient_id, text, is_bot)
+        if not await self.save_message(sender_id, recipient_id, text, is_bot):
+            return
         await self.send_message_to_user(sender_id, recipient_id, text, is_bot)
         if is_bot:
             logger.info(f"Enviando prompt a Ollama: {text}")
-            response = await database_sync_to_async(ollama_generate)(text)
+            partes = []
+            async for token in ollama_stream(text):
+                partes.append(token)
+                # Respuesta parcial solo a este socket; el mensaje completo se envía al grupo al terminar
+                await self.send(text_data=json.dumps({
+                    'sender_id': self.bot_user_id,
+                    'recipient_id': sender_id,
+                    'text': token,
+                    'is_bot': True,
+                    'partial': True
+                }))
+            response = ''.join(partes)
             logger.info(f"Respuesta de Ollama: {response}")
             await self.save_message(self.bot_user_id, sender_id, response, True)
             await self.send_message_to_user(self.bot_user_id, sender_id, response, True)
@@ -74,15 +86,27 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'is_bot': event['is_bot']
         }))
 
+    @database_sync_to_async
+    def mark_read(self, other_id):
+        try:
+            marcar_hilo_leido(self.user_id, int(other_id))
+        except (TypeError, ValueError):
+            pass
+
     @database_sync_to_async
     def save_message(self, sender_id, recipient_id, text, is_bot):
-        # Obtener o crear el usuario bot
-        bot_user = get_bot_user()
-        sender = Usuario.objects.filter(id=sender_id).first() if str(sender_id) != str(bot_user.id) else bot_user
-        recipient = Usuario.objects.filter(id=recipient_id).first() if str(recipient_id) != str(bot_user.id) else bot_user
-        ChatMessage.objects.create(
-            sender=sender,
-            recipient=recipient,
-            text=text,
-            is_bot=is_bot
-        )
+        """Un INSERT del mensaje (con los ids que ya conoce el consumer) y la actualización de los hilos"""
+        try:
+            with transaction.atomic():
+                mensaje = ChatMessage.objects.create(
+                    sender_id=sender_id,
+                    recipient_id=recipient_id,
+                    text=text,
+                    is_bot=is_bot
+                )
+                registrar_mensaje(sender_id, recipient_id, text, mensaje.timestamp)
+        except IntegrityError:
+            # Destinatario inexistente
+            logger.warning(f"Mensaje descartado: destinatario {recipient_id} inválido")
+            return False
+        return True
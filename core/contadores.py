@@ -0,0 +1,94 @@
+"""
+Cache de contadores por usuario (navbar, APIs y WebSocket).
+
+Cada contador vive en su propia clave para poder actualizarlo con
+cache.incr/decr al escribir. La lectura es un único get_many; si falta
+alguna clave se reconstruyen todas con una sola consulta. Un TTL acota la
+deriva ante carreras entre una reconstrucción y un incremento.
+
+Las escrituras en la cache (incrementos, valores fijos e invalidaciones) se
+aplican con transaction.on_commit: si la transacción se revierte la cache no
+queda desalineada con la base. Fuera de una transacción se aplican en el acto.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Notificacion, Usuario
+
+CONTADORES = ('no_leidas', 'notificaciones_total', 'insignias_total', 'nivel', 'puntos_experiencia')
+
+
+def _ttl():
+    return getattr(settings, 'SARA_CONTADORES_TTL', 3600)
+
+
+def _clave(usuario_id, contador):
+    return f'contadores:{usuario_id}:{contador}'
+
+
+def _conteo(queryset):
+    return Coalesce(Subquery(queryset.order_by().values('usuario').annotate(n=Count('pk')).values('n')[:1],
+                             output_field=IntegerField()), 0)
+
+
+def reconstruir_contadores(usuario_id):
+    """Recalcula todos los contadores del usuario con una sola consulta y los guarda en la cache"""
+    Through = Usuario.insignias.through
+    fila = Usuario.objects.filter(pk=usuario_id).annotate(
+        no_leidas=_conteo(Notificacion.objects.filter(usuario=OuterRef('pk'), leida=False)),
+        notificaciones_total=_conteo(Notificacion.objects.filter(usuario=OuterRef('pk'))),
+        insignias_total=_conteo(Through.objects.filter(usuario=OuterRef('pk'))),
+    ).values(*CONTADORES).first()
+    if fila is None:
+        return dict.fromkeys(CONTADORES, 0)
+
+    cache.set_many({_clave(usuario_id, contador): valor for contador, valor in fila.items()}, _ttl())
+    return fila
+
+
+def obtener_contadores(usuario_id):
+    """Contadores del usuario en O(1); ante un fallo de cache se reconstruyen"""
+    claves = {_clave(usuario_id, contador): contador for contador in CONTADORES}
+    valores = cache.get_many(list(claves))
+    if len(valores) < len(claves):
+        return reconstruir_contadores(usuario_id)
+    return {claves[clave]: valor for clave, valor in valores.items()}
+
+
+def _incr(clave, delta):
+    try:
+        cache.incr(clave, delta)
+    except ValueError:
+        pass
+
+
+def incrementar(usuario_id, contador, delta=1):
+    """Ajusta un contador cacheado al confirmarse; si no está en cache se reconstruirá en la próxima lectura"""
+    if not delta:
+        return
+    clave = _clave(usuario_id, contador)
+    transaction.on_commit(lambda: _incr(clave, delta))
+
+
+def actualizar(usuario_id, **valores):
+    """Fija contadores que no son acumulativos (nivel, experiencia) al confirmarse la transacción"""
+    nuevos = {_clave(usuario_id, contador): valor for contador, valor in valores.items()}
+    transaction.on_commit(lambda: cache.set_many(nuevos, _ttl()))
+
+
+def invalidar(usuario_id, *contadores):
+    claves = [_clave(usuario_id, contador) for contador in (contadores or CONTADORES)]
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def invalidar_usuarios(usuario_ids, *contadores):
+    """Invalida los contadores de muchos usuarios (escrituras masivas que no disparan señales)"""
+    claves = [
+        _clave(usuario_id, contador)
+        for usuario_id in usuario_ids
+        for contador in (contadores or CONTADORES)
+    ]
+    transaction.on_commit(lambda: cache.delete_many(claves))
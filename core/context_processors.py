@@ -1,13 +1,11 @@
-from .models import Notificacion
+from .contadores import obtener_contadores
 
 def user_navbar_context(request):
     """Context processor para agregar información del usuario al navbar"""
     if request.user.is_authenticated:
-        # Contador de notificaciones no leídas
-        notificaciones_no_leidas = Notificacion.objects.filter(
-            usuario=request.user,
-            leida=False
-        ).count()
+        # Contadores cacheados (notificaciones no leídas, insignias, nivel y experiencia)
+        contadores = obtener_contadores(request.user.id)
+        notificaciones_no_leidas = contadores['no_leidas']
 
         # Agregar propiedad al usuario
         request.user.notificaciones_no_leidas = notificaciones_no_leidas
@@ -15,9 +13,9 @@ def user_navbar_context(request):
         return {
             'user_navbar': {
                 'notificaciones_no_leidas': notificaciones_no_leidas,
-                'total_insignias': request.user.insignias.count(),
-                'nivel_actual': request.user.nivel,
-                'puntos_experiencia': request.user.puntos_experiencia,
+                'total_insignias': contadores['insignias_total'],
+                'nivel_actual': contadores['nivel'],
+                'puntos_experiencia': contadores['puntos_experiencia'],
             }
         }
 
@@ -0,0 +1,167 @@
+"""
+Historial de chat entre dos usuarios y lista de conversaciones.
+
+Cada sentido de la conversación (a -> b y b -> a) se lee por separado sobre
+el índice (sender, recipient, timestamp, id), con paginación por cursor y
+LIMIT, y las dos páginas se combinan en Python. Así abrir un chat largo o
+pedir mensajes anteriores cuesta lo mismo sin importar cuántos haya.
+
+HiloConversacion guarda, por participante, el último mensaje, la última
+actividad y los no leídos de cada conversación; se actualiza al guardar cada
+mensaje y alimenta la lista lateral del chat con una consulta indexada.
+"""
+import heapq
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, FilteredRelation, Q
+
+from .models import ChatMessage, HiloConversacion, Usuario
+
+# Mensajes por página del historial (y máximo que puede pedir el cliente)
+PAGINA_MENSAJES = 50
+PAGINA_MENSAJES_MAX = 200
+
+# Usuario del asistente en el chat (lo crea la migración 0012_usuario_bot)
+BOT_USERNAME = 'sara_bot'
+DATOS_BOT = {
+    'first_name': 'SARA',
+    'last_name': 'Bot',
+    'email': 'sara-bot@localhost',
+    'is_active': True,
+    'rol': 'operador',
+}
+
+# Id del bot, leído una vez por proceso (ver id_bot)
+_bot_id = None
+
+# Conversaciones por página en la lista lateral
+PAGINA_HILOS = 30
+PAGINA_HILOS_MAX = 100
+
+# Caracteres del último mensaje que se guardan en el hilo
+VISTA_PREVIA = HiloConversacion._meta.get_field('ultimo_mensaje').max_length
+
+CAMPOS_MENSAJE = ('id', 'sender_id', 'recipient_id', 'sender__username', 'recipient__username',
+                  'text', 'timestamp', 'is_bot')
+
+
+def get_bot_user():
+    bot_user, _ = Usuario.objects.get_or_create(username=BOT_USERNAME, defaults=DATOS_BOT)
+    return bot_user
+
+
+def id_bot():
+    """Id del usuario bot; solo la primera llamada del proceso consulta la base"""
+    global _bot_id
+    if _bot_id is None:
+        _bot_id = get_bot_user().id
+    return _bot_id
+
+
+def _orden(mensaje):
+    return mensaje['timestamp'], mensaje['id']
+
+
+def _sentido(sender_id, recipient_id, cursor, limite):
+    mensajes = ChatMessage.objects.filter(sender_id=sender_id, recipient_id=recipient_id)
+    if cursor:
+        timestamp, mensaje_id = cursor
+        # La cota timestamp <= ... deja que el índice arranque en el cursor; el OR desempata por id
+        mensajes = mensajes.filter(timestamp__lte=timestamp).filter(Q(timestamp__lt=timestamp) | Q(id__lt=mensaje_id))
+    return list(mensajes.order_by('-timestamp', '-id').values(*CAMPOS_MENSAJE)[:limite])
+
+
+def historial(usuario_id, otro_id, antes_id=None, limite=PAGINA_MENSAJES):
+    """Página de mensajes entre dos usuarios anteriores a `antes_id` (en orden cronológico) y si hay más"""
+    cursor = None
+    if antes_id is not None:
+        cursor = ChatMessage.objects.filter(pk=antes_id).values_list('timestamp', 'id').first()
+        if cursor is None:
+            return [], False
+
+    # Un mensaje de más por sentido para saber si quedan anteriores
+    paginas = [_sentido(usuario_id, otro_id, cursor, limite + 1)]
+    if str(usuario_id) != str(otro_id):
+        paginas.append(_sentido(otro_id, usuario_id, cursor, limite + 1))
+    mensajes = list(islice(heapq.merge(*paginas, key=_orden, reverse=True), limite + 1))
+
+    hay_mas = len(mensajes) > limite
+    mensajes = mensajes[:limite]
+    mensajes.reverse()
+    return mensajes, hay_mas
+
+
+def _actualizar_hilo(usuario_id, otro_id, texto, momento, propio):
+    # Quien escribe ya leyó la conversación; el otro participante suma un no leído
+    cambios = {
+        'ultimo_mensaje': texto, 'ultimo_mensaje_propio': propio, 'ultima_actividad': momento,
+        'no_leidos': 0 if propio else F('no_leidos') + 1,
+    }
+    if HiloConversacion.objects.filter(usuario_id=usuario_id, otro_id=otro_id).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            HiloConversacion.objects.create(
+                usuario_id=usuario_id, otro_id=otro_id, ultimo_mensaje=texto,
+                ultimo_mensaje_propio=propio, ultima_actividad=momento, no_leidos=0 if propio else 1,
+            )
+    except IntegrityError:
+        # Otro mensaje creó el hilo entre el UPDATE y el INSERT
+        HiloConversacion.objects.filter(usuario_id=usuario_id, otro_id=otro_id).update(**cambios)
+
+
+def registrar_mensaje(sender_id, recipient_id, texto, momento):
+    """Actualiza el hilo de los dos participantes con un mensaje recién guardado"""
+    texto = texto[:VISTA_PREVIA]
+    _actualizar_hilo(sender_id, recipient_id, texto, momento, propio=True)
+    if str(sender_id) != str(recipient_id):
+        _actualizar_hilo(recipient_id, sender_id, texto, momento, propio=False)
+
+
+def marcar_hilo_leido(usuario_id, otro_id):
+    HiloConversacion.objects.filter(usuario_id=usuario_id, otro_id=otro_id, no_leidos__gt=0).update(no_leidos=0)
+
+
+def hilos_recientes(usuario_id, antes_de=None, limite=PAGINA_HILOS):
+    """
+    Conversaciones del usuario por actividad reciente y si hay más.
+    `antes_de` es el otro_id del último hilo de la página anterior.
+    """
+    hilos = HiloConversacion.objects.filter(usuario_id=usuario_id)
+    if antes_de is not None:
+        cursor = hilos.filter(otro_id=antes_de).values_list('ultima_actividad', 'id').first()
+        if cursor is None:
+            return [], False
+        actividad, hilo_id = cursor
+        hilos = hilos.filter(ultima_actividad__lte=actividad).filter(Q(ultima_actividad__lt=actividad) | Q(id__lt=hilo_id))
+
+    filas = list(hilos.order_by('-ultima_actividad', '-id').values(
+        'otro_id', 'ultimo_mensaje', 'ultimo_mensaje_propio', 'ultima_actividad', 'no_leidos',
+        username=F('otro__username'), first_name=F('otro__first_name'), last_name=F('otro__last_name'),
+    )[:limite + 1])
+    return filas[:limite], len(filas) > limite
+
+
+def buscar_usuarios(usuario_id, prefijo, despues_de=None, limite=PAGINA_HILOS):
+    """
+    Usuarios activos cuyo username empieza con `prefijo`, en orden alfabético
+    a partir de `despues_de`, con el resumen del hilo si ya conversaron.
+
+    startswith es un LIKE 'prefijo%': en PostgreSQL lo resuelve el índice
+    *_like que Django crea para username; en SQLite (LIKE sin distinguir
+    mayúsculas) recorre la tabla de usuarios, que es chica.
+    """
+    usuarios = Usuario.objects.filter(is_active=True, username__startswith=prefijo).exclude(pk=usuario_id)
+    if despues_de:
+        usuarios = usuarios.filter(username__gt=despues_de)
+
+    filas = list(usuarios.annotate(
+        hilo=FilteredRelation('hilos_chat_con', condition=Q(hilos_chat_con__usuario_id=usuario_id)),
+    ).order_by('username').values(
+        'username', 'first_name', 'last_name',
+        otro_id=F('id'), ultimo_mensaje=F('hilo__ultimo_mensaje'),
+        ultimo_mensaje_propio=F('hilo__ultimo_mensaje_propio'),
+        ultima_actividad=F('hilo__ultima_actividad'), no_leidos=F('hilo__no_leidos'),
+    )[:limite + 1])
+    return filas[:limite], len(filas) > limite
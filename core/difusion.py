@@ -0,0 +1,109 @@
+"""
+Difusión de avisos a todos los usuarios o a un rol.
+
+Las notificaciones se insertan por lotes (una transacción por lote, sin
+señales) y el envío en tiempo real es un único group_send al grupo
+compartido (o al del rol), en lugar de un mensaje por usuario.
+"""
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from . import contadores
+from .conversaciones import BOT_USERNAME
+from .models import Notificacion, Usuario
+from .notificaciones import GRUPO_TODOS, grupo_rol
+
+logger = logging.getLogger(__name__)
+
+
+def destinatarios(rol=None):
+    """Usuarios activos alcanzados por la difusión (sin el bot del chat)"""
+    usuarios = Usuario.objects.filter(is_active=True).exclude(username=BOT_USERNAME)
+    if rol:
+        usuarios = usuarios.filter(rol=rol)
+    return usuarios
+
+
+def enviar_difusion(grupo, notificacion):
+    """Publica la notificación una sola vez en el grupo compartido; devuelve los segundos empleados"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return 0.0
+
+    inicio = time.perf_counter()
+    async_to_sync(channel_layer.group_send)(grupo, {
+        'type': 'notification_broadcast',
+        'notification': notificacion,
+    })
+    return time.perf_counter() - inicio
+
+
+def difundir_notificacion(titulo, mensaje, tipo='system', rol=None, url_accion='', texto_accion='',
+                          prioridad=1, creada_por=None, tamano_lote=5000, progreso=None):
+    """
+    Crea la notificación para cada destinatario y la publica en tiempo real.
+
+    Devuelve un resumen con la cantidad creada, los lotes y los tiempos de
+    inserción y de envío.
+    """
+    if rol and rol not in dict(Usuario.ROLES):
+        raise ValueError(f'Rol desconocido: {rol}')
+    if tipo not in dict(Notificacion.TIPOS_NOTIFICACION):
+        raise ValueError(f'Tipo de notificación desconocido: {tipo}')
+
+    inicio = time.perf_counter()
+    fecha = timezone.now()
+    campos = {
+        'tipo': tipo, 'titulo': titulo, 'mensaje': mensaje, 'fecha': fecha,
+        'url_accion': url_accion, 'texto_accion': texto_accion, 'prioridad': prioridad,
+        'creada_por_id': getattr(creada_por, 'pk', creada_por),
+        'difusion': True,
+    }
+    resumen = {'notificaciones': 0, 'lotes': 0}
+
+    ultimo_id = 0
+    while True:
+        ids = list(destinatarios(rol).filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:tamano_lote])
+        if not ids:
+            break
+        ultimo_id = ids[-1]
+
+        with transaction.atomic():
+            Notificacion.objects.bulk_create([Notificacion(usuario_id=uid, **campos) for uid in ids])
+        # bulk_create no dispara señales: se invalidan los contadores afectados
+        contadores.invalidar_usuarios(ids, 'no_leidas', 'notificaciones_total')
+
+        resumen['notificaciones'] += len(ids)
+        resumen['lotes'] += 1
+        if progreso:
+            progreso(resumen['notificaciones'])
+
+    resumen['segundos_insercion'] = round(time.perf_counter() - inicio, 3)
+    resumen['por_segundo'] = int(resumen['notificaciones'] / resumen['segundos_insercion']) if resumen['segundos_insercion'] else 0
+
+    # Cada destinatario tiene su propia fila (con id distinto), así que el mensaje
+    # compartido no lleva id; el cliente lo muestra y ajusta su contador localmente.
+    # Todas las filas comparten la fecha: para marcarla leída el cliente envía
+    # mark_read con esa fecha y el consumer busca la fila del usuario.
+    # Como su cursor ?since= no avanza con él, los snapshots de reconexión omiten las difusiones
+    resumen['segundos_envio'] = 0.0
+    if resumen['notificaciones']:
+        resumen['segundos_envio'] = round(enviar_difusion(grupo_rol(rol) if rol else GRUPO_TODOS, {
+            'id': None,
+            'titulo': titulo,
+            'mensaje': mensaje,
+            'tipo': tipo,
+            'fecha': fecha.isoformat(),
+            'leida': False,
+            'url_accion': url_accion,
+            'texto_accion': texto_accion,
+            'difusion': True,
+        }), 4)
+
+    logger.info('Difusión "%s" a %s usuarios (%s)', titulo, resumen['notificaciones'], rol or 'todos')
+    return resumen
@@ -0,0 +1,89 @@
+"""
+Estadísticas incrementales del usuario.
+
+registros_totales, errores_totales y precision_promedio se mantienen con
+actualizaciones atómicas (expresiones F) en cada escritura, en lugar de
+recontar todo el historial. reconciliar_estadisticas() compara los
+contadores con los datos reales y corrige la deriva.
+"""
+from django.db.models import Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Error, Registro, Usuario
+
+
+def calcular_precision(registros, errores):
+    """Misma fórmula que Usuario.actualizar_estadisticas"""
+    if registros <= 0:
+        return 0.0
+    return ((registros - errores) / registros) * 100
+
+
+def expresion_precision(registros, errores):
+    """calcular_precision como expresión SQL sobre dos expresiones de conteo"""
+    return ExpressionWrapper(
+        (registros - errores) * Value(100.0) / Greatest(registros, Value(1)),
+        output_field=FloatField(),
+    )
+
+
+def aplicar_delta(usuario_id, registros=0, errores=0, **campos):
+    """Suma los deltas a los contadores y recalcula la precisión en un único UPDATE"""
+    # La precisión usa los mismos valores acotados en 0 que se guardan en los contadores
+    registros_nuevos = Greatest(F('registros_totales') + registros, Value(0))
+    errores_nuevos = Greatest(F('errores_totales') + errores, Value(0))
+    return Usuario.objects.filter(pk=usuario_id).update(
+        registros_totales=registros_nuevos,
+        errores_totales=errores_nuevos,
+        precision_promedio=expresion_precision(registros_nuevos, errores_nuevos),
+        **campos
+    )
+
+
+def conteos_reales(usuarios=None):
+    """QuerySet de usuarios anotado con los conteos reales de registros y errores"""
+    usuarios = Usuario.objects.all() if usuarios is None else usuarios
+    registros = Registro.objects.filter(usuario=OuterRef('pk')).order_by().values('usuario').annotate(n=Count('pk')).values('n')
+    errores = Error.objects.filter(registro__usuario=OuterRef('pk')).order_by().values('registro__usuario').annotate(n=Count('pk')).values('n')
+    return usuarios.annotate(
+        registros_reales=Coalesce(Subquery(registros), 0),
+        errores_reales=Coalesce(Subquery(errores), 0),
+    )
+
+
+def reconciliar_estadisticas(usuarios=None, reparar=True, tamano_lote=1000):
+    """
+    Verifica los contadores contra los datos reales.
+
+    Devuelve la lista de diferencias encontradas (una por usuario con deriva);
+    si `reparar` es True las corrige con bulk_update.
+    """
+    consulta = conteos_reales(usuarios).only(
+        'id', 'username', 'registros_totales', 'errores_totales', 'precision_promedio'
+    ).order_by('pk')
+
+    diferencias = []
+    corregidos = []
+    for usuario in consulta.iterator(chunk_size=tamano_lote):
+        precision = calcular_precision(usuario.registros_reales, usuario.errores_reales)
+        if (usuario.registros_totales == usuario.registros_reales
+                and usuario.errores_totales == usuario.errores_reales
+                and abs(usuario.precision_promedio - precision) < 0.01):
+            continue
+
+        diferencias.append({
+            'usuario': usuario.username,
+            'registros': (usuario.registros_totales, usuario.registros_reales),
+            'errores': (usuario.errores_totales, usuario.errores_reales),
+            'precision': (round(usuario.precision_promedio, 2), round(precision, 2)),
+        })
+        usuario.registros_totales = usuario.registros_reales
+        usuario.errores_totales = usuario.errores_reales
+        usuario.precision_promedio = precision
+        corregidos.append(usuario)
+
+    if reparar and corregidos:
+        Usuario.objects.bulk_update(
+            corregidos, ['registros_totales', 'errores_totales', 'precision_promedio'], batch_size=tamano_lote
+        )
+    return diferencias
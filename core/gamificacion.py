@@ -0,0 +1,41 @@
+"""
+Niveles y progreso de experiencia.
+
+Cada nivel requiere 100 puntos más que el anterior, así que el umbral del
+nivel L es 100 * (1 + 2 + ... + (L - 1)) = 50 * L * (L - 1). El nivel se
+obtiene en O(1) invirtiendo esa fórmula con raíz cuadrada entera.
+"""
+from math import isqrt
+
+XP_POR_NIVEL = 100
+
+
+def umbral_nivel(nivel):
+    """Experiencia mínima para alcanzar `nivel`"""
+    return XP_POR_NIVEL * nivel * (nivel - 1) // 2
+
+
+def nivel_desde_experiencia(experiencia):
+    """Mayor nivel L con umbral_nivel(L) <= experiencia"""
+    # L * (L - 1) <= experiencia // 50  <=>  2L - 1 <= isqrt(4 * (experiencia // 50) + 1)
+    k = max(0, experiencia) // (XP_POR_NIVEL // 2)
+    return (1 + isqrt(4 * k + 1)) // 2
+
+
+def progreso_nivel(experiencia):
+    """Nivel actual, umbrales y porcentaje de avance hacia el siguiente nivel"""
+    # Una experiencia negativa (ajustes manuales) cuenta como 0: el porcentaje queda en [0, 100)
+    experiencia = max(0, experiencia)
+    nivel = nivel_desde_experiencia(experiencia)
+    base = umbral_nivel(nivel)
+    siguiente = umbral_nivel(nivel + 1)
+    return {
+        'nivel': nivel,
+        'experiencia': experiencia,
+        'umbral_actual': base,
+        'umbral_siguiente': siguiente,
+        'experiencia_nivel': experiencia - base,
+        'experiencia_necesaria': siguiente - base,
+        'faltante': siguiente - experiencia,
+        'porcentaje': round((experiencia - base) / (siguiente - base) * 100, 1),
+    }
@@ -1,15 +1,28 @@
 # Exponer ollama_generate como función de módulo para compatibilidad con consumers_chat.py
 def ollama_generate(prompt, system=None):
-    return recomendador.ollama_generate(prompt, system)
+    return recomendador.ollama_generate(prompt, system, PRIORIDAD_CHAT)
+
+
+async def ollama_stream(prompt, system=None):
+    """Itera la respuesta de Ollama token a token (para el chat)"""
+    async for token in recomendador.ollama_stream(prompt, system):
+        yield token
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.cluster import KMeans
-from collections import Counter
+from contextlib import contextmanager
+from functools import cached_property
 from .models import Error, Usuario, Registro, Metrica
-import requests
-import re
+from . import modelo_errores
+from .ollama_client import OllamaClient
+from .llm_cache import CacheRespuestasLLM, normalizar_prompt
+from .validacion import validar_registro, validar_lote
+from django.conf import settings
+import asyncio
+import concurrent.futures
+import itertools
+import threading
+import time
 from datetime import datetime, timedelta
 
 # Base de conocimientos de microlecciones
@@ -47,48 +60,262 @@ MICROLECCIONES = {
 }
 
 
+# Prioridades del programador de generación (menor = se atiende antes)
+PRIORIDAD_CHAT = 0
+PRIORIDAD_FONDO = 10
+
+
+class ColaSaturada(Exception):
+    """La cola de generación está llena; el llamador debe usar las sugerencias de respaldo"""
+
+
+class ProgramadorGeneracion:
+    """
+    Planificador de generaciones contra el modelo local.
+
+    - Deduplica prompts idénticos en vuelo con la misma prioridad (comparten el resultado).
+    - Limita las generaciones concurrentes a `max_concurrencia` workers (el único
+      límite: el OllamaClient solo mantiene el pool de conexiones).
+    - Atiende primero el chat interactivo y luego las sugerencias en segundo plano.
+    - Los streams abandonados por el llamador se cancelan (o no llegan a arrancar).
+    - Si hay `max_cola` trabajos de fondo esperando, rechaza de inmediato con ColaSaturada.
+
+    Los workers corren en el event loop de fondo del OllamaClient.
+    """
+
+    def __init__(self, cliente, max_concurrencia=None, max_cola=None):
+        self.cliente = cliente
+        self.max_concurrencia = max_concurrencia or getattr(settings, 'OLLAMA_MAX_CONCURRENCIA', 2)
+        self.max_cola = max_cola or getattr(settings, 'OLLAMA_MAX_COLA', 8)
+        self._cola = None
+        self._en_vuelo = {}
+        self._esperando = 0
+        self._secuencia = itertools.count()
+        self._lock = threading.Lock()
+
+    def _get_cola(self):
+        if self._cola is None:
+            with self._lock:
+                if self._cola is None:
+                    self._cola = asyncio.run_coroutine_threadsafe(self._iniciar(), self.cliente.get_loop()).result()
+        return self._cola
+
+    async def _iniciar(self):
+        cola = asyncio.PriorityQueue()
+        for _ in range(self.max_concurrencia):
+            asyncio.ensure_future(self._worker(cola))
+        return cola
+
+    async def _worker(self, cola):
+        while True:
+            _, _, trabajo = await cola.get()
+            try:
+                await trabajo()
+            finally:
+                cola.task_done()
+
+    def _encolar(self, prioridad, trabajo):
+        cola = self._get_cola()
+        self.cliente.get_loop().call_soon_threadsafe(cola.put_nowait, (prioridad, next(self._secuencia), trabajo))
+
+    def _reservar(self, prioridad):
+        # Debe llamarse con self._lock tomado
+        if prioridad > PRIORIDAD_CHAT and self._esperando >= self.max_cola:
+            raise ColaSaturada()
+        self._esperando += 1
+
+    def _liberar(self):
+        with self._lock:
+            self._esperando -= 1
+
+    def enviar(self, prompt, system=None, prioridad=PRIORIDAD_FONDO):
+        """Encola una generación completa y devuelve un concurrent.futures.Future con el texto"""
+        # La prioridad es parte de la clave: el chat nunca espera a una generación de fondo en curso
+        clave = (prioridad, self.cliente.model, system or '', normalizar_prompt(prompt))
+        with self._lock:
+            existente = self._en_vuelo.get(clave)
+            if existente is not None:
+                return existente
+            self._reservar(prioridad)
+            futuro = concurrent.futures.Future()
+            self._en_vuelo[clave] = futuro
+
+        async def trabajo():
+            self._liberar()
+            try:
+                futuro.set_result(await self.cliente.agenerar(prompt, system))
+            except Exception as e:
+                futuro.set_exception(e)
+            finally:
+                with self._lock:
+                    self._en_vuelo.pop(clave, None)
+
+        self._encolar(prioridad, trabajo)
+        return futuro
+
+    def generar(self, prompt, system=None, prioridad=PRIORIDAD_FONDO, timeout=None):
+        return self.enviar(prompt, system, prioridad).result(timeout or self.cliente.timeout)
+
+    async def agenerar(self, prompt, system=None, prioridad=PRIORIDAD_CHAT):
+        return await asyncio.wrap_future(self.enviar(prompt, system, prioridad))
+
+    async def astream(self, prompt, system=None, prioridad=PRIORIDAD_CHAT):
+        """Encola una generación en streaming (no se deduplica) e itera sus tokens"""
+        loop = asyncio.get_running_loop()
+        salida = asyncio.Queue()
+        fin = object()
+        # Si el llamador abandona: el trabajo que todavía no arrancó se salta y el que corre se cancela
+        estado = {'cancelado': False, 'tarea': None}
+        with self._lock:
+            self._reservar(prioridad)
+
+        async def producir():
+            async for token in self.cliente.astream(prompt, system):
+                loop.call_soon_threadsafe(salida.put_nowait, token)
+
+        async def trabajo():
+            self._liberar()
+            with self._lock:
+                if estado['cancelado']:
+                    return
+                tarea = estado['tarea'] = asyncio.ensure_future(producir())
+            try:
+                await tarea
+            except asyncio.CancelledError:
+                if not tarea.cancelled():
+                    raise
+                return
+            except Exception as e:
+                loop.call_soon_threadsafe(salida.put_nowait, e)
+            loop.call_soon_threadsafe(salida.put_nowait, fin)
+
+        self._encolar(prioridad, trabajo)
+        terminado = False
+        try:
+            while True:
+                item = await salida.get()
+                if item is fin:
+                    terminado = True
+                    break
+                if isinstance(item, Exception):
+                    terminado = True
+                    raise item
+                yield item
+        finally:
+            if not terminado:
+                self._cancelar_stream(estado)
+
+    def _cancelar_stream(self, estado):
+        with self._lock:
+            estado['cancelado'] = True
+            tarea = estado['tarea']
+        if tarea is not None:
+            # Libera el cupo de concurrencia y cierra la petición HTTP a Ollama
+            self.cliente.get_loop().call_soon_threadsafe(tarea.cancel)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'esperando': self._esperando,
+                'en_vuelo': len(self._en_vuelo),
+                'max_concurrencia': self.max_concurrencia,
+                'max_cola': self.max_cola,
+            }
+
+
+class ContextoAnalisis:
+    """Datos de un usuario cargados una sola vez y compartidos entre los sub-análisis"""
+
+    COLUMNAS_ERRORES = ['id', 'registro_id', 'campo', 'tipo', 'mensaje', 'gravedad', 'patron_detectado']
+
+    def __init__(self, usuario_id):
+        self.usuario_id = usuario_id
+        self.tiempos = {}
+        self._resultados = {}
+
+    @contextmanager
+    def medir(self, etapa):
+        """Acumula el tiempo (en milisegundos) empleado en una etapa del análisis"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            transcurrido = (time.perf_counter() - inicio) * 1000
+            self.tiempos[etapa] = round(self.tiempos.get(etapa, 0) + transcurrido, 2)
+
+    @cached_property
+    def usuario(self):
+        with self.medir('carga_usuario'):
+            return Usuario.objects.get(id=self.usuario_id)
+
+    @cached_property
+    def errores(self):
+        """DataFrame con todos los errores del usuario (una sola consulta)"""
+        with self.medir('carga_errores'):
+            filas = Error.objects.filter(registro__usuario_id=self.usuario_id).values_list(*self.COLUMNAS_ERRORES)
+            df = pd.DataFrame.from_records(list(filas), columns=self.COLUMNAS_ERRORES)
+            df['mensaje'] = df['mensaje'].str.lower()
+            return df
+
+    @cached_property
+    def total_registros(self):
+        with self.medir('carga_registros'):
+            return Registro.objects.filter(usuario_id=self.usuario_id).count()
+
+    def resultado(self, nombre, calcular):
+        """Calcula un sub-análisis una única vez por contexto"""
+        if nombre not in self._resultados:
+            with self.medir(nombre):
+                self._resultados[nombre] = calcular()
+        return self._resultados[nombre]
+
+
 class RecomendadorIA:
-    def __init__(self, ollama_url='http://localhost:11434/api/generate', ollama_model='gemma3:4b'):
-        self.vectorizer = TfidfVectorizer(stop_words='english', max_features=100)
+    def __init__(self, ollama_url=None, ollama_model=None):
         self.modelo_entrenado = False
-        self.ollama_url = ollama_url
-        self.ollama_model = ollama_model
-
-    def ollama_generate(self, prompt, system=None):
-        """Consulta a Ollama local para obtener una respuesta LLM"""
-        payload = {
-            "model": self.ollama_model,
-            "prompt": prompt,
-            "stream": False
-        }
-        if system:
-            payload["system"] = system
+        self.cliente = OllamaClient(url=ollama_url, model=ollama_model)
+        self.programador = ProgramadorGeneracion(self.cliente)
+        self.ollama_url = self.cliente.url
+        self.ollama_model = self.cliente.model
+        self.cache_llm = CacheRespuestasLLM()
+
+    def ollama_generate(self, prompt, system=None, prioridad=PRIORIDAD_FONDO):
+        """Consulta a Ollama local para obtener una respuesta LLM (vacía si la cola está saturada)"""
         try:
-            response = requests.post(self.ollama_url, json=payload, timeout=20)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("response", "")
+            return self.programador.generar(prompt, system, prioridad)
+        except ColaSaturada:
+            return ""
         except Exception as e:
             return f"[Ollama error: {e}]"
 
-    def analizar_patron_errores(self, usuario_id):
-        """Analiza patrones de error del usuario usando machine learning"""
-        errores = Error.objects.filter(registro__usuario_id=usuario_id)
+    def ollama_generate_cacheado(self, prompt, system=None):
+        """Igual que ollama_generate pero reutiliza la respuesta si el prompt normalizado ya se consultó"""
+        prompt_completo = f'{system}\n{prompt}' if system else prompt
+        return self.cache_llm.obtener_o_generar(
+            self.ollama_model,
+            prompt_completo,
+            lambda: self.ollama_generate(prompt, system),
+            es_valida=lambda respuesta: bool(respuesta) and not respuesta.startswith('[Ollama error'),
+        )
 
-        if not errores.exists():
-            return None
+    async def ollama_stream(self, prompt, system=None):
+        """Consulta a Ollama en modo streaming; ante un error emite el mensaje de error"""
+        try:
+            async for token in self.programador.astream(prompt, system, PRIORIDAD_CHAT):
+                yield token
+        except Exception as e:
+            yield f"[Ollama error: {e}]"
 
-        # Crear dataset de errores
-        datos_errores = []
-        for error in errores:
-            datos_errores.append({
-                'campo': error.campo,
-                'tipo': error.tipo,
-                'mensaje': error.mensaje.lower(),
-                'gravedad': error.gravedad
-            })
+    def analizar_patron_errores(self, usuario_id, contexto=None):
+        """Analiza patrones de error del usuario usando machine learning"""
+        contexto = contexto or ContextoAnalisis(usuario_id)
+        return contexto.resultado('analisis_errores', lambda: self._analizar_patron_errores(contexto))
 
-        df = pd.DataFrame(datos_errores)
+    def _analizar_patron_errores(self, contexto):
+        df = contexto.errores
+
+        if df.empty:
+            return None
 
         # Análisis de frecuencia por campo
         campo_mas_frecuente = df['campo'].value_counts().idxmax()
@@ -97,24 +324,23 @@ class RecomendadorIA:
         # Análisis de tipos de error
         tipo_mas_frecuente = df['tipo'].value_counts().idxmax()
 
-        # Clustering de mensajes de error similares
+        # Clustering de mensajes de error similares con el modelo global
+        # (solo se clasifican los errores que aún no tienen cluster asignado)
         if len(df) > 3:
             try:
-                # Vectorizar mensajes de error
-                mensajes = df['mensaje'].fillna('')
-                tfidf_matrix = self.vectorizer.fit_transform(mensajes)
-
-                # Clustering
-                n_clusters = min(3, len(df))
-                kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-                clusters = kmeans.fit_predict(tfidf_matrix)
+                with contexto.medir('clustering'):
+                    clusters = modelo_errores.asignar_clusters(df)
 
-                # Encontrar el cluster más grande
-                cluster_mas_grande = Counter(clusters).most_common(1)[0][0]
-                mensajes_cluster = df.iloc[np.where(clusters == cluster_mas_grande)[0]]['mensaje']
+                if clusters is None:
+                    # Sin modelo entrenado: mensaje más repetido del usuario
+                    mensajes_cluster = df['mensaje']
+                else:
+                    # Encontrar el cluster más grande
+                    cluster_mas_grande = clusters.value_counts().idxmax()
+                    mensajes_cluster = df.loc[clusters == cluster_mas_grande, 'mensaje']
 
                 patron_principal = mensajes_cluster.mode().iloc[0] if not mensajes_cluster.empty else ""
-            except:
+            except Exception:
                 patron_principal = ""
         else:
             patron_principal = ""
@@ -127,9 +353,13 @@ class RecomendadorIA:
             'total_errores': len(df)
         }
 
-    def recomendar_microleccion(self, usuario_id):
+    def recomendar_microleccion(self, usuario_id, contexto=None):
         """Recomienda la microlección más apropiada para el usuario"""
-        analisis = self.analizar_patron_errores(usuario_id)
+        contexto = contexto or ContextoAnalisis(usuario_id)
+        return contexto.resultado('recomendacion', lambda: self._recomendar_microleccion(contexto))
+
+    def _recomendar_microleccion(self, contexto):
+        analisis = self.analizar_patron_errores(contexto.usuario_id, contexto)
 
         if not analisis:
             return {
@@ -161,65 +391,38 @@ class RecomendadorIA:
         }
 
     def predecir_errores_posibles(self, datos_registro):
-        """Predice posibles errores en un registro basado en patrones históricos"""
-        errores_predichos = []
-
-        # Análisis de email
-        if 'email' in datos_registro:
-            email = datos_registro['email']
-            if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
-                errores_predichos.append({
-                    'campo': 'email',
-                    'tipo': 'formato',
-                    'probabilidad': 0.9,
-                    'mensaje': 'El formato del email parece incorrecto'
-                })
-
-        # Análisis de DNI
-        if 'dni' in datos_registro:
-            dni = str(datos_registro['dni'])
-            if not re.match(r'^\d{7,8}$', dni):
-                errores_predichos.append({
-                    'campo': 'dni',
-                    'tipo': 'formato',
-                    'probabilidad': 0.8,
-                    'mensaje': 'El DNI debe tener 7 u 8 dígitos numéricos'
-                })
-
-        # Análisis de teléfono
-        if 'telefono' in datos_registro:
-            telefono = str(datos_registro['telefono'])
-            if not re.match(r'^\+?[\d\s\-\(\)]+$', telefono) or len(re.sub(r'\D', '', telefono)) < 8:
-                errores_predichos.append({
-                    'campo': 'telefono',
-                    'tipo': 'formato',
-                    'probabilidad': 0.7,
-                    'mensaje': 'El formato del teléfono parece incorrecto'
-                })
-
-        return errores_predichos
-
-    def calcular_precision_usuario(self, usuario_id):
-        """Calcula la precisión del usuario basada en su historial"""
-        registros = Registro.objects.filter(usuario_id=usuario_id)
+        """Predice posibles errores en un registro usando el registro de reglas precompiladas"""
+        return validar_registro(datos_registro)
 
-        if not registros.exists():
-            return 0.0
+    def predecir_errores_lote(self, registros):
+        """Predice errores para un lote completo (lista de dicts o DataFrame) de forma vectorizada"""
+        return validar_lote(registros)
 
-        total_registros = registros.count()
-        registros_con_errores = registros.filter(errores__isnull=False).distinct().count()
+    def calcular_precision_usuario(self, usuario_id, contexto=None):
+        """Calcula la precisión del usuario basada en su historial"""
+        contexto = contexto or ContextoAnalisis(usuario_id)
+        return contexto.resultado('precision', lambda: self._calcular_precision_usuario(contexto))
+
+    def _calcular_precision_usuario(self, contexto):
+        total_registros = contexto.total_registros
 
         if total_registros == 0:
             return 0.0
 
+        registros_con_errores = contexto.errores['registro_id'].nunique()
+
         precision = ((total_registros - registros_con_errores) / total_registros) * 100
         return round(precision, 2)
 
-    def sugerir_mejoras(self, usuario_id):
+    def sugerir_mejoras(self, usuario_id, contexto=None):
         """Sugiere mejoras específicas para el usuario, usando Ollama para feedback avanzado"""
-        usuario = Usuario.objects.get(id=usuario_id)
-        precision = self.calcular_precision_usuario(usuario_id)
-        analisis = self.analizar_patron_errores(usuario_id)
+        contexto = contexto or ContextoAnalisis(usuario_id)
+        return contexto.resultado('sugerencias', lambda: self._sugerir_mejoras(contexto))
+
+    def _sugerir_mejoras(self, contexto):
+        usuario = contexto.usuario
+        precision = self.calcular_precision_usuario(contexto.usuario_id, contexto)
+        analisis = self.analizar_patron_errores(contexto.usuario_id, contexto)
 
         # Prompt para Ollama
         prompt = (
@@ -229,7 +432,8 @@ class RecomendadorIA:
             f"Errores principales: {analisis}\n"
             "Sugiere 2-3 recomendaciones personalizadas para mejorar la calidad de los registros, en español, breves y prácticas."
         )
-        respuesta_llm = self.ollama_generate(prompt)
+        with contexto.medir('ollama'):
+            respuesta_llm = self.ollama_generate_cacheado(prompt)
 
         sugerencias = []
         if respuesta_llm:
@@ -269,10 +473,12 @@ def recomendar_microleccion(usuario_id):
     return recomendador.recomendar_microleccion(usuario_id)
 
 def analizar_usuario(usuario_id):
-    """Análisis completo del usuario"""
+    """Análisis completo del usuario (los datos se cargan una sola vez y se comparten entre etapas)"""
+    contexto = ContextoAnalisis(usuario_id)
     return {
-        'precision': recomendador.calcular_precision_usuario(usuario_id),
-        'recomendacion': recomendador.recomendar_microleccion(usuario_id),
-        'sugerencias': recomendador.sugerir_mejoras(usuario_id),
-        'analisis_errores': recomendador.analizar_patron_errores(usuario_id)
-    }
\ No newline at end of file
+        'precision': recomendador.calcular_precision_usuario(usuario_id, contexto),
+        'recomendacion': recomendador.recomendar_microleccion(usuario_id, contexto),
+        'sugerencias': recomendador.sugerir_mejoras(usuario_id, contexto),
+        'analisis_errores': recomendador.analizar_patron_errores(usuario_id, contexto),
+        'tiempos': contexto.tiempos,
+    }
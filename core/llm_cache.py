@@ -0,0 +1,81 @@
+"""
+Cache de respuestas del LLM direccionada por contenido.
+
+La clave es un hash del nombre del modelo y del prompt normalizado, de modo
+que dos prompts que solo difieren en espacios comparten la misma respuesta.
+Se apoya en el framework de cache de Django (alias 'llm', con TTL y
+desalojo LRU configurados en settings.CACHES).
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+
+def normalizar_prompt(prompt):
+    """Unifica la representación Unicode y colapsa los espacios en blanco"""
+    prompt = unicodedata.normalize('NFC', prompt or '')
+    return re.sub(r'\s+', ' ', prompt).strip()
+
+
+class CacheRespuestasLLM:
+    def __init__(self, alias='llm', timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        try:
+            return caches[self.alias]
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def clave(self, modelo, prompt):
+        contenido = f'{modelo}\x00{normalizar_prompt(prompt)}'.encode('utf-8')
+        return 'llm:' + hashlib.sha256(contenido).hexdigest()
+
+    def obtener(self, modelo, prompt):
+        respuesta = self.cache.get(self.clave(modelo, prompt))
+        with self._lock:
+            if respuesta is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+        return respuesta
+
+    def guardar(self, modelo, prompt, respuesta):
+        if self.timeout is None:
+            self.cache.set(self.clave(modelo, prompt), respuesta)
+        else:
+            self.cache.set(self.clave(modelo, prompt), respuesta, timeout=self.timeout)
+
+    def obtener_o_generar(self, modelo, prompt, generar, es_valida=bool):
+        """Devuelve la respuesta cacheada o la genera; solo se guardan las respuestas válidas"""
+        respuesta = self.obtener(modelo, prompt)
+        if respuesta is not None:
+            return respuesta
+
+        respuesta = generar()
+        if es_valida(respuesta):
+            self.guardar(modelo, prompt, respuesta)
+        return respuesta
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'ratio_aciertos': round(self.aciertos / total, 4) if total else 0.0,
+            }
+
+    def reiniciar_estadisticas(self):
+        with self._lock:
+            self.aciertos = 0
+            self.fallos = 0
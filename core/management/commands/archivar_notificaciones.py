@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.archivado import archivar_notificaciones, dias_retencion, pendientes_de_archivo
+
+
+class Command(BaseCommand):
+    help = 'Mueve por lotes las notificaciones leídas antiguas a la tabla de archivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Días de retención (por defecto SARA_NOTIFICACIONES_RETENCION_DIAS)')
+        parser.add_argument('--lote', type=int, default=5000, help='Notificaciones movidas por lote')
+        parser.add_argument('--max-lotes', type=int, help='Detenerse tras esta cantidad de lotes')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar las notificaciones a archivar')
+
+    def handle(self, *args, **options):
+        dias = dias_retencion() if options['dias'] is None else options['dias']
+
+        if options['dry_run']:
+            total = pendientes_de_archivo(dias).count()
+            self.stdout.write(self.style.WARNING(f'{total} notificaciones leídas de más de {dias} días se archivarían.'))
+            return
+
+        resumen = archivar_notificaciones(
+            dias, tamano_lote=options['lote'], max_lotes=options['max_lotes'],
+            progreso=lambda archivadas: self.stdout.write(f'  {archivadas} archivadas...'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{resumen["archivadas"]} notificaciones archivadas en {resumen["lotes"]} lotes '
+            f'({resumen["segundos"]}s, {resumen["por_segundo"]}/s).'
+        ))
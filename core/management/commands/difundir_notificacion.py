@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.difusion import destinatarios, difundir_notificacion
+from core.models import Notificacion, Usuario
+
+
+class Command(BaseCommand):
+    help = 'Envía una notificación a todos los usuarios activos o a un rol, e informa el rendimiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('titulo', help='Título de la notificación')
+        parser.add_argument('mensaje', help='Texto de la notificación')
+        parser.add_argument('--rol', choices=[rol for rol, _ in Usuario.ROLES], help='Solo usuarios con este rol')
+        parser.add_argument('--tipo', default='system', choices=[tipo for tipo, _ in Notificacion.TIPOS_NOTIFICACION])
+        parser.add_argument('--prioridad', type=int, default=1, help='1=Baja, 5=Crítica')
+        parser.add_argument('--url', default='', help='URL de la acción')
+        parser.add_argument('--texto-accion', default='', help='Texto del botón de acción')
+        parser.add_argument('--lote', type=int, default=5000, help='Notificaciones insertadas por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar los destinatarios')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            total = destinatarios(options['rol']).count()
+            self.stdout.write(self.style.WARNING(f'La notificación llegaría a {total} usuarios.'))
+            return
+
+        try:
+            resumen = difundir_notificacion(
+                options['titulo'], options['mensaje'], tipo=options['tipo'], rol=options['rol'],
+                url_accion=options['url'], texto_accion=options['texto_accion'],
+                prioridad=options['prioridad'], tamano_lote=options['lote'],
+                progreso=lambda creadas: self.stdout.write(f'  {creadas} creadas...'),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resumen["notificaciones"]} notificaciones creadas en {resumen["lotes"]} lotes '
+            f'({resumen["segundos_insercion"]}s, {resumen["por_segundo"]}/s); '
+            f'envío en tiempo real: {resumen["segundos_envio"] * 1000:.1f} ms.'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.modelo_errores import entrenar_modelo
+
+
+class Command(BaseCommand):
+    help = 'Entrena por lotes el modelo global de patrones de error y reasigna los clusters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clusters', type=int, default=8, help='Cantidad de clusters del modelo')
+        parser.add_argument('--lote', type=int, default=5000, help='Errores procesados por lote')
+        parser.add_argument('--sin-reasignar', action='store_true',
+                            help='No reasignar los errores existentes (se clasificarán al analizar cada usuario)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Entrenando modelo de patrones de error...')
+
+        modelo = entrenar_modelo(
+            n_clusters=options['clusters'],
+            tamano_lote=options['lote'],
+            reasignar=not options['sin_reasignar'],
+            progreso=lambda mensaje: self.stdout.write(f'  {mensaje}'),
+        )
+
+        if modelo is None:
+            self.stdout.write(self.style.WARNING('No hay suficientes errores para entrenar el modelo.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Modelo {modelo.version} entrenado con {modelo.kmeans.n_clusters} clusters.'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.carga_masiva import TAMANO_LOTE, detectar_formato, importar_registros
+from core.models import Usuario
+
+
+class Command(BaseCommand):
+    help = 'Importa registros masivamente (fuente=bulk) desde un archivo CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV o JSONL')
+        parser.add_argument('--usuario', required=True, help='Username del usuario al que se asignan los registros')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Formato del archivo (por defecto según la extensión)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Registros procesados por lote')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(username=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f'Usuario no encontrado: {options["usuario"]}')
+
+        formato = detectar_formato(options['archivo'], options['formato'])
+        self.stdout.write(f'Importando {options["archivo"]} ({formato}) para {usuario.username}...')
+
+        with open(options['archivo'], 'rb') as archivo:
+            resumen = importar_registros(
+                usuario, archivo, formato=formato, tamano_lote=options['lote'],
+                progreso=lambda mensaje: self.stdout.write(f'  {mensaje}'),
+            )
+
+        if 'error' in resumen:
+            raise CommandError(
+                f'{resumen["error"]}. Se importaron {resumen["registros"]} registros '
+                f'en {resumen["lotes"]} lotes antes del error.'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resumen["registros"]} registros importados en {resumen["segundos"]}s '
+            f'({resumen["registros_por_minuto"]} registros/min), '
+            f'{resumen["registros_con_errores"]} con errores.'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from core.estadisticas import reconciliar_estadisticas
+from core.models import Usuario
+
+
+class Command(BaseCommand):
+    help = 'Verifica los contadores incrementales de los usuarios contra los datos reales y corrige la deriva'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Username a reconciliar (por defecto, todos)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar las diferencias, sin corregirlas')
+
+    def handle(self, *args, **options):
+        usuarios = Usuario.objects.all()
+        if options['usuario']:
+            usuarios = usuarios.filter(username=options['usuario'])
+
+        diferencias = reconciliar_estadisticas(usuarios, reparar=not options['dry_run'])
+
+        for diferencia in diferencias:
+            self.stdout.write(
+                f'  {diferencia["usuario"]}: registros {diferencia["registros"][0]} -> {diferencia["registros"][1]}, '
+                f'errores {diferencia["errores"][0]} -> {diferencia["errores"][1]}, '
+                f'precisión {diferencia["precision"][0]} -> {diferencia["precision"][1]}'
+            )
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('Las estadísticas están consistentes.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(diferencias)} usuarios con deriva (sin corregir).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(diferencias)} usuarios corregidos.'))
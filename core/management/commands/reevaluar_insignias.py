@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Insignia
+from core.motor_insignias import reevaluar_insignias
+
+
+class Command(BaseCommand):
+    help = 'Reevalúa las insignias activas para todos los usuarios y otorga las que falten'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--insignia', action='append', help='Nombre de la insignia a reevaluar (repetible; por defecto, todas)')
+        parser.add_argument('--lote', type=int, default=5000, help='Usuarios procesados por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar qué se otorgaría, sin escribir')
+
+    def handle(self, *args, **options):
+        insignia_ids = None
+        if options['insignia']:
+            insignia_ids = list(Insignia.objects.filter(nombre__in=options['insignia'], activa=True).values_list('id', flat=True))
+            if len(insignia_ids) != len(set(options['insignia'])):
+                raise CommandError('Alguna de las insignias indicadas no existe o no está activa.')
+
+        def progreso(procesados, total, otorgadas):
+            self.stdout.write(f'  {procesados}/{total} usuarios evaluados (+{otorgadas} insignias)')
+
+        resumen = reevaluar_insignias(
+            insignia_ids, dry_run=options['dry_run'], tamano_lote=options['lote'], progreso=progreso
+        )
+
+        for nombre, cantidad in resumen['por_insignia'].items():
+            if cantidad:
+                self.stdout.write(f'  {nombre}: {cantidad}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{resumen["otorgadas"]} insignias se otorgarían (dry-run, sin cambios).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{resumen["otorgadas"]} insignias otorgadas a {resumen["usuarios"]} usuarios evaluados.'))
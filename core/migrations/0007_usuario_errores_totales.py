@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def poblar_errores_totales(apps, schema_editor):
+    Usuario = apps.get_model('core', 'Usuario')
+    Error = apps.get_model('core', 'Error')
+    errores = Error.objects.filter(registro__usuario=OuterRef('pk')).order_by().values('registro__usuario').annotate(n=Count('pk')).values('n')
+    Usuario.objects.update(errores_totales=Coalesce(Subquery(errores), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_chatmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='errores_totales',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(poblar_errores_totales, migrations.RunPython.noop),
+    ]
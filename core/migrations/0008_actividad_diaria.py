@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def poblar_actividad(apps, schema_editor):
+    Registro = apps.get_model('core', 'Registro')
+    Error = apps.get_model('core', 'Error')
+    ActividadDiaria = apps.get_model('core', 'ActividadDiaria')
+
+    actividad = {}
+    registros = Registro.objects.annotate(dia=TruncDate('fecha')).order_by().values('usuario_id', 'dia').annotate(n=Count('id'))
+    for fila in registros.iterator():
+        actividad.setdefault((fila['usuario_id'], fila['dia']), [0, 0])[0] = fila['n']
+    errores = Error.objects.annotate(dia=TruncDate('timestamp')).order_by().values('registro__usuario_id', 'dia').annotate(n=Count('id'))
+    for fila in errores.iterator():
+        actividad.setdefault((fila['registro__usuario_id'], fila['dia']), [0, 0])[1] = fila['n']
+
+    ActividadDiaria.objects.bulk_create([
+        ActividadDiaria(usuario_id=usuario_id, fecha=dia, registros=n_registros, errores=n_errores)
+        for (usuario_id, dia), (n_registros, n_errores) in actividad.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_usuario_errores_totales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActividadDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('registros', models.PositiveIntegerField(default=0)),
+                ('errores', models.PositiveIntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actividad_diaria', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Actividad Diaria',
+                'verbose_name_plural': 'Actividad Diaria',
+                'ordering': ['-fecha'],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'fecha'), name='actividad_diaria_usuario_fecha')],
+            },
+        ),
+        migrations.RunPython(poblar_actividad, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_actividad_diaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(help_text='Mismo id que tenía la notificación original', primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('info', 'Información'), ('success', 'Éxito'), ('warning', 'Advertencia'), ('error', 'Error'), ('achievement', 'Logro'), ('system', 'Sistema')], default='info', max_length=20)),
+                ('titulo', models.CharField(max_length=200)),
+                ('mensaje', models.TextField()),
+                ('fecha', models.DateTimeField()),
+                ('fecha_lectura', models.DateTimeField(blank=True, null=True)),
+                ('url_accion', models.URLField(blank=True)),
+                ('texto_accion', models.CharField(blank=True, max_length=50)),
+                ('prioridad', models.PositiveIntegerField(default=1)),
+                ('fecha_archivado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Notificación Archivada',
+                'verbose_name_plural': 'Notificaciones Archivadas',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', '-fecha'], name='notif_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('leida', False)), fields=['usuario', '-fecha'], name='notif_no_leidas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('leida', True)), fields=['fecha'], name='notif_leidas_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificacionarchivada',
+            name='creada_por',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='notificacionarchivada',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones_archivadas', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notificacionarchivada',
+            index=models.Index(fields=['usuario', '-fecha'], name='notif_arch_usuario_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_hilos(apps, schema_editor):
+    ChatMessage = apps.get_model('core', 'ChatMessage')
+    HiloConversacion = apps.get_model('core', 'HiloConversacion')
+
+    # El último mensaje de cada par gana (recorrido en orden cronológico); los históricos quedan leídos
+    hilos = {}
+    mensajes = ChatMessage.objects.filter(sender__isnull=False, recipient__isnull=False).order_by('timestamp', 'id')
+    for sender_id, recipient_id, texto, momento in mensajes.values_list('sender_id', 'recipient_id', 'text', 'timestamp').iterator():
+        for usuario_id, otro_id in ((sender_id, recipient_id), (recipient_id, sender_id)):
+            hilos[(usuario_id, otro_id)] = HiloConversacion(
+                usuario_id=usuario_id, otro_id=otro_id, ultimo_mensaje=texto[:200],
+                ultimo_mensaje_propio=usuario_id == sender_id, ultima_actividad=momento,
+            )
+
+    HiloConversacion.objects.bulk_create(hilos.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_chatmessage_indice_conversacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HiloConversacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_mensaje', models.CharField(blank=True, max_length=200)),
+                ('ultimo_mensaje_propio', models.BooleanField(default=False)),
+                ('ultima_actividad', models.DateTimeField(default=django.utils.timezone.now)),
+                ('no_leidos', models.PositiveIntegerField(default=0)),
+                ('otro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hilos_chat_con', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hilos_chat', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Hilo de Conversación',
+                'verbose_name_plural': 'Hilos de Conversación',
+                'ordering': ['-ultima_actividad'],
+                'indexes': [models.Index(fields=['usuario', '-ultima_actividad', '-id'], name='hilo_usuario_actividad_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'otro'), name='hilo_conversacion_usuario_otro')],
+            },
+        ),
+        migrations.RunPython(poblar_hilos, migrations.RunPython.noop),
+    ]
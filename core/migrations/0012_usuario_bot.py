@@ -0,0 +1,26 @@
+from django.contrib.auth.hashers import make_password
+from django.db import migrations
+
+
+def crear_bot(apps, schema_editor):
+    Usuario = apps.get_model('core', 'Usuario')
+    # Sin contraseña utilizable: el bot no inicia sesión
+    Usuario.objects.get_or_create(username='sara_bot', defaults={
+        'first_name': 'SARA',
+        'last_name': 'Bot',
+        'email': 'sara-bot@localhost',
+        'is_active': True,
+        'rol': 'operador',
+        'password': make_password(None),
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_hiloconversacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_bot, migrations.RunPython.noop),
+    ]
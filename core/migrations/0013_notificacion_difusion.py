@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_usuario_bot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='difusion',
+            field=models.BooleanField(db_default=False, default=False, help_text='Creada por una difusión a todos o a un rol'),
+        ),
+    ]
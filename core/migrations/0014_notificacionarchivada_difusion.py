@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_notificacion_difusion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacionarchivada',
+            name='difusion',
+            field=models.BooleanField(default=False),
+        ),
+    ]
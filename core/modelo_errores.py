@@ -0,0 +1,166 @@
+"""
+Modelo global de patrones de error.
+
+Los mensajes se vectorizan con HashingVectorizer (sin vocabulario ni estado,
+seguro entre hilos) y se agrupan con MiniBatchKMeans entrenado por lotes con
+`python manage.py entrenar_modelo_errores`. El modelo se persiste en disco y
+cada usuario solo clasifica los errores nuevos: la asignación se guarda en
+`Error.patron_detectado` como "<version>:<cluster>".
+"""
+import logging
+import os
+import threading
+
+import joblib
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from .models import Error
+
+logger = logging.getLogger(__name__)
+
+vectorizer = HashingVectorizer(n_features=2 ** 12, alternate_sign=False, norm='l2')
+
+
+def _ruta_modelo():
+    return str(getattr(settings, 'SARA_MODELO_ERRORES_PATH', os.path.join(settings.BASE_DIR, 'ml_models', 'patrones_errores.joblib')))
+
+
+class ModeloPatronesErrores:
+    """Centroides de los clusters de mensajes de error"""
+
+    def __init__(self, n_clusters=8, random_state=42):
+        self.version = timezone.now().strftime('%Y%m%d%H%M%S')
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3)
+
+    def entrenar_lote(self, mensajes):
+        self.kmeans.partial_fit(vectorizer.transform(mensajes))
+
+    def predecir(self, mensajes):
+        if len(mensajes) == 0:
+            return np.array([], dtype=int)
+        return self.kmeans.predict(vectorizer.transform(mensajes))
+
+    def etiqueta(self, cluster):
+        return f'{self.version}:{cluster}'
+
+
+_modelo = None
+_modelo_mtime = None
+_lock = threading.Lock()
+
+
+def cargar_modelo():
+    """Devuelve el modelo persistido (recargándolo si el job por lotes lo actualizó) o None"""
+    global _modelo, _modelo_mtime
+    ruta = _ruta_modelo()
+    try:
+        mtime = os.path.getmtime(ruta)
+    except OSError:
+        return None
+
+    if _modelo is None or mtime != _modelo_mtime:
+        with _lock:
+            if _modelo is None or mtime != _modelo_mtime:
+                try:
+                    _modelo = joblib.load(ruta)
+                    _modelo_mtime = mtime
+                except Exception:
+                    logger.exception("No se pudo cargar el modelo de patrones de error desde %s", ruta)
+                    return _modelo
+    return _modelo
+
+
+def guardar_modelo(modelo):
+    global _modelo, _modelo_mtime
+    ruta = _ruta_modelo()
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.tmp'
+    joblib.dump(modelo, temporal)
+    os.replace(temporal, ruta)
+    with _lock:
+        _modelo = modelo
+        _modelo_mtime = os.path.getmtime(ruta)
+
+
+def _iterar_lotes(queryset, tamano_lote):
+    lote = []
+    for fila in queryset.iterator(chunk_size=tamano_lote):
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def entrenar_modelo(n_clusters=8, tamano_lote=5000, reasignar=True, progreso=None):
+    """Entrena el modelo global por lotes sobre todos los errores y opcionalmente reasigna los clusters"""
+    modelo = ModeloPatronesErrores(n_clusters=n_clusters)
+    mensajes = Error.objects.order_by('id').values_list('mensaje', flat=True)
+
+    total = 0
+    pendiente = []
+    for lote in _iterar_lotes(mensajes, tamano_lote):
+        pendiente.extend(m.lower() for m in lote)
+        # partial_fit necesita al menos n_clusters muestras en cada lote
+        if len(pendiente) >= n_clusters:
+            modelo.entrenar_lote(pendiente)
+            total += len(pendiente)
+            pendiente = []
+            if progreso:
+                progreso(f'Entrenados {total} mensajes')
+    if pendiente and total:
+        modelo.entrenar_lote(pendiente)
+        total += len(pendiente)
+
+    if not total:
+        return None
+
+    guardar_modelo(modelo)
+
+    if reasignar:
+        reasignados = 0
+        errores = Error.objects.order_by('id').only('id', 'mensaje')
+        for lote in _iterar_lotes(errores, tamano_lote):
+            for error, cluster in zip(lote, modelo.predecir([e.mensaje.lower() for e in lote])):
+                error.patron_detectado = modelo.etiqueta(cluster)
+            Error.objects.bulk_update(lote, ['patron_detectado'])
+            reasignados += len(lote)
+            if progreso:
+                progreso(f'Reasignados {reasignados} errores')
+
+    return modelo
+
+
+def asignar_clusters(errores):
+    """
+    Devuelve el cluster de cada fila del DataFrame de errores de un usuario.
+
+    Solo se vectorizan los errores sin asignación de la versión vigente del
+    modelo; el resultado se persiste para que la próxima vez no se recalcule.
+    Devuelve None si todavía no hay un modelo entrenado.
+    """
+    modelo = cargar_modelo()
+    if modelo is None:
+        return None
+
+    prefijo = f'{modelo.version}:'
+    etiquetas = errores['patron_detectado'].fillna('')
+    nuevos = ~etiquetas.str.startswith(prefijo)
+
+    if nuevos.any():
+        clusters = modelo.predecir(errores.loc[nuevos, 'mensaje'].fillna('').tolist())
+        etiquetas = etiquetas.copy()
+        etiquetas.loc[nuevos] = [modelo.etiqueta(c) for c in clusters]
+        Error.objects.bulk_update(
+            [Error(id=int(error_id), patron_detectado=etiqueta)
+             for error_id, etiqueta in zip(errores.loc[nuevos, 'id'], etiquetas.loc[nuevos])],
+            ['patron_detectado'],
+            batch_size=500,
+        )
+
+    return etiquetas.str.slice(len(prefijo)).astype(int)
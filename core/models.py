@@ -5,6 +5,9 @@ from django.utils import timezone
 from django.conf import settings
 import uuid
 
+from .validacion import REGLAS
+from . import gamificacion
+
 class Usuario(AbstractUser):
     ROLES = (
         ('operador', 'Operador'),
@@ -33,6 +36,7 @@ class Usuario(AbstractUser):
     ultimo_login = models.DateTimeField(null=True, blank=True)
     fecha_creacion = models.DateTimeField(default=timezone.now)
     registros_totales = models.PositiveIntegerField(default=0)
+    errores_totales = models.PositiveIntegerField(default=0)
     precision_promedio = models.FloatField(default=0.0)
 
     # Configuración de privacidad y preferencias
@@ -70,22 +74,21 @@ class Usuario(AbstractUser):
     def calcular_nivel(self):
         """Calcula el nivel basado en puntos de experiencia"""
         # Cada nivel requiere 100 puntos más que el anterior
-        puntos_necesarios = 0
-        nivel = 1
-        while puntos_necesarios <= self.puntos_experiencia:
-            puntos_necesarios += nivel * 100
-            if puntos_necesarios <= self.puntos_experiencia:
-                nivel += 1
-        return nivel
+        return gamificacion.nivel_desde_experiencia(self.puntos_experiencia)
+
+    @property
+    def progreso_nivel(self):
+        """Avance hacia el siguiente nivel (ver core.gamificacion.progreso_nivel)"""
+        return gamificacion.progreso_nivel(self.puntos_experiencia)
 
     def actualizar_estadisticas(self):
-        """Actualiza las estadísticas del usuario"""
+        """Recalcula desde cero las estadísticas del usuario (los contadores se mantienen incrementalmente)"""
         registros = Registro.objects.filter(usuario=self)
         self.registros_totales = registros.count()
+        self.errores_totales = Error.objects.filter(registro__usuario=self).count()
 
         if self.registros_totales > 0:
-            errores_totales = Error.objects.filter(registro__usuario=self).count()
-            self.precision_promedio = ((self.registros_totales - errores_totales) / self.registros_totales) * 100
+            self.precision_promedio = ((self.registros_totales - self.errores_totales) / self.registros_totales) * 100
 
         self.save()
 
@@ -132,33 +135,9 @@ class Insignia(models.Model):
         if not self.activa:
             return False
 
-        # Verificar nivel mínimo
-        if usuario.nivel < self.nivel_requerido:
-            return False
-
-        # Verificar registros mínimos
-        if usuario.registros_totales < self.registros_minimos:
-            return False
-
-        # Verificar precisión mínima
-        if usuario.precision_promedio < self.precision_minima:
-            return False
-
-        # Verificar errores máximos
-        errores_usuario = Error.objects.filter(registro__usuario=usuario).count()
-        if errores_usuario > self.errores_maximos:
-            return False
-
-        # Verificar días consecutivos (esto requeriría más lógica compleja)
-        # Por ahora, solo verificamos que tenga registros recientes
-        if self.dias_consecutivos > 0:
-            dias_ultimo_registro = (timezone.now().date() - Registro.objects.filter(
-                usuario=usuario
-            ).order_by('-fecha').first().fecha.date()).days
-            if dias_ultimo_registro > self.dias_consecutivos:
-                return False
-
-        return True
+        from .motor_insignias import CAMPOS_REGLA, cumple_condiciones, snapshot_usuario
+        regla = {campo: getattr(self, campo) for campo in CAMPOS_REGLA}
+        return cumple_condiciones(regla, snapshot_usuario(usuario, [regla]))
 
     class Meta:
         verbose_name = 'Insignia'
@@ -181,7 +160,7 @@ class Registro(models.Model):
     # Datos del registro (estructurados)
     dni = models.CharField(
         max_length=20,
-        validators=[RegexValidator(r'^\d{7,8}$', 'DNI debe tener 7 u 8 dígitos')],
+        validators=[REGLAS['dni'].validador()],
         help_text='Documento Nacional de Identidad',
         default=''
     )
@@ -191,7 +170,7 @@ class Registro(models.Model):
     telefono = models.CharField(
         max_length=20,
         blank=True,
-        validators=[RegexValidator(r'^\+?[\d\s\-\(\)]+$', 'Formato de teléfono inválido')],
+        validators=[REGLAS['telefono'].validador()],
         default=''
     )
     fecha_nacimiento = models.DateField(null=True, blank=True)
@@ -219,9 +198,9 @@ class Registro(models.Model):
     def __str__(self):
         return f"Registro {self.id} - {self.apellido}, {self.nombres or 'N/A'} ({self.usuario.username})"
 
-    def save(self, *args, **kwargs):
-        # Actualizar datos JSON para compatibilidad
-        self.datos = {
+    def construir_datos(self):
+        """Datos JSON legacy a partir de los campos estructurados"""
+        return {
             'dni': self.dni,
             'apellido': self.apellido,
             'nombres': self.nombres,
@@ -230,9 +209,13 @@ class Registro(models.Model):
             'fecha_nacimiento': str(self.fecha_nacimiento) if self.fecha_nacimiento else None,
             'direccion': self.direccion,
         }
+
+    def save(self, *args, **kwargs):
+        # Actualizar datos JSON para compatibilidad
+        self.datos = self.construir_datos()
         super().save(*args, **kwargs)
 
-    def calcular_puntuacion_calidad(self):
+    def calcular_puntuacion_calidad(self, errores=None, guardar=True):
         """Calcula la puntuación de calidad del registro"""
         puntuacion = 100.0
 
@@ -243,7 +226,8 @@ class Registro(models.Model):
                 puntuacion -= 20
 
         # Penalización por errores asociados
-        errores = self.errores.count()
+        if errores is None:
+            errores = self.errores.count()
         puntuacion -= errores * 5
 
         # Bonificación por revisiones positivas
@@ -251,7 +235,9 @@ class Registro(models.Model):
             puntuacion += 10
 
         self.puntuacion_calidad = max(0, min(100, puntuacion))
-        self.save()
+        if guardar:
+            self.save()
+        return self.puntuacion_calidad
 
     class Meta:
         verbose_name = 'Registro'
@@ -320,6 +306,25 @@ class Error(models.Model):
             models.Index(fields=['corregido']),
         ]
 
+class ActividadDiaria(models.Model):
+    """Resumen diario de actividad por usuario (rachas, calendario de actividad)"""
+    usuario = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='actividad_diaria')
+    fecha = models.DateField()
+    registros = models.PositiveIntegerField(default=0)
+    errores = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.usuario.username} - {self.fecha}: {self.registros} registros"
+
+    class Meta:
+        verbose_name = 'Actividad Diaria'
+        verbose_name_plural = 'Actividad Diaria'
+        ordering = ['-fecha']
+        constraints = [
+            # El índice único (usuario, fecha) sirve también para los escaneos por rango de fechas
+            models.UniqueConstraint(fields=['usuario', 'fecha'], name='actividad_diaria_usuario_fecha'),
+        ]
+
 class Metrica(models.Model):
     TIPOS_METRICA = (
         # Métricas de productividad
@@ -413,20 +418,71 @@ class Notificacion(models.Model):
     # Metadatos
     creada_por = models.ForeignKey('Usuario', on_delete=models.SET_NULL, null=True, blank=True, related_name='notificaciones_creadas')
     prioridad = models.PositiveIntegerField(default=1, help_text='1=Baja, 5=Crítica')
+    # Fila creada por una difusión (core.difusion); db_default para los INSERT directos de los benchmarks
+    difusion = models.BooleanField(default=False, db_default=False, help_text='Creada por una difusión a todos o a un rol')
 
     def __str__(self):
         return f"{self.usuario.username}: {self.titulo}"
 
     def marcar_leida(self):
-        """Marca la notificación como leída"""
+        """
+        Marca la notificación como leída; devuelve True si esta llamada la cambió.
+
+        El UPDATE es condicional (leida=False): si dos peticiones marcan la misma
+        notificación a la vez, solo la que cambió la fila descuenta el contador.
+        """
+        if self.leida:
+            return False
+        from .notificaciones import descontar_no_leida
+
+        fecha_lectura = timezone.now()
+        cambiada = Notificacion.objects.filter(pk=self.pk, leida=False).update(leida=True, fecha_lectura=fecha_lectura)
         self.leida = True
-        self.fecha_lectura = timezone.now()
-        self.save()
+        if not cambiada:
+            return False
+        self.fecha_lectura = fecha_lectura
+        descontar_no_leida(self.usuario_id)
+        return True
 
     class Meta:
         verbose_name = 'Notificación'
         verbose_name_plural = 'Notificaciones'
         ordering = ['-fecha']
+        indexes = [
+            # Listado completo del usuario ordenado por fecha
+            models.Index(fields=['usuario', '-fecha'], name='notif_usuario_fecha_idx'),
+            # Conteo y listado de no leídas: índice parcial, solo crece con las pendientes
+            models.Index(fields=['usuario', '-fecha'], condition=models.Q(leida=False), name='notif_no_leidas_idx'),
+            # Selección de leídas antiguas para el archivado
+            models.Index(fields=['fecha'], condition=models.Q(leida=True), name='notif_leidas_fecha_idx'),
+        ]
+
+class NotificacionArchivada(models.Model):
+    """Notificaciones leídas antiguas movidas fuera de la tabla activa (ver core.archivado)"""
+    id = models.BigIntegerField(primary_key=True, help_text='Mismo id que tenía la notificación original')
+    usuario = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='notificaciones_archivadas')
+    tipo = models.CharField(max_length=20, choices=Notificacion.TIPOS_NOTIFICACION, default='info')
+    titulo = models.CharField(max_length=200)
+    mensaje = models.TextField()
+    fecha = models.DateTimeField()
+    fecha_lectura = models.DateTimeField(null=True, blank=True)
+    url_accion = models.URLField(blank=True)
+    texto_accion = models.CharField(max_length=50, blank=True)
+    creada_por = models.ForeignKey('Usuario', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    prioridad = models.PositiveIntegerField(default=1)
+    difusion = models.BooleanField(default=False)
+    fecha_archivado = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.titulo} (archivada)"
+
+    class Meta:
+        verbose_name = 'Notificación Archivada'
+        verbose_name_plural = 'Notificaciones Archivadas'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['usuario', '-fecha'], name='notif_arch_usuario_fecha_idx'),
+        ]
 
 class LogAuditoria(models.Model):
     ACCIONES = (
@@ -716,7 +772,35 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Historial de un sentido de la conversación paginado por cursor (core.conversaciones)
+            models.Index(fields=['sender', 'recipient', 'timestamp', 'id'], name='chat_conversacion_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender} -> {self.recipient}: {self.text[:30]}"
 
+class HiloConversacion(models.Model):
+    """Resumen de una conversación de chat para uno de sus participantes (lista lateral del chat)"""
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='hilos_chat', on_delete=models.CASCADE)
+    otro = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='hilos_chat_con', on_delete=models.CASCADE)
+    ultimo_mensaje = models.CharField(max_length=200, blank=True)
+    ultimo_mensaje_propio = models.BooleanField(default=False)
+    ultima_actividad = models.DateTimeField(default=timezone.now)
+    no_leidos = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.usuario} <-> {self.otro}: {self.no_leidos} sin leer"
+
+    class Meta:
+        verbose_name = 'Hilo de Conversación'
+        verbose_name_plural = 'Hilos de Conversación'
+        ordering = ['-ultima_actividad']
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'otro'], name='hilo_conversacion_usuario_otro'),
+        ]
+        indexes = [
+            # Conversaciones del usuario por actividad reciente, paginadas por cursor
+            models.Index(fields=['usuario', '-ultima_actividad', '-id'], name='hilo_usuario_actividad_idx'),
+        ]
+
@@ -0,0 +1,249 @@
+"""
+Motor de evaluación de insignias.
+
+Los umbrales de las insignias activas se cargan una sola vez y se cachean
+(se invalidan con las señales de Insignia). Cada evaluación trabaja sobre
+una instantánea de las estadísticas del usuario y otorga las insignias
+nuevas con un único INSERT en la tabla intermedia del M2M.
+
+reevaluar_insignias() aplica las mismas reglas a todos los usuarios de forma
+vectorizada, para cuando se crea o modifica una insignia.
+"""
+import logging
+from datetime import timedelta
+
+import pandas as pd
+from django.core.cache import cache
+from django.db import transaction
+
+from .actividad import calcular_racha, fecha_local
+from . import contadores
+from .models import ActividadDiaria, Insignia, Notificacion, Usuario
+from .notificaciones import agrupar_notificaciones, encolar_estadisticas, encolar_no_leidas, encolar_notificacion
+from .tareas import ejecutar_en_segundo_plano
+
+logger = logging.getLogger(__name__)
+
+CLAVE_REGLAS = 'motor_insignias:reglas'
+# Margen de seguridad para otros procesos; en el proceso que edita se invalida al instante
+TTL_REGLAS = 300
+
+CAMPOS_REGLA = [
+    'id', 'nombre', 'nivel_requerido', 'registros_minimos',
+    'precision_minima', 'errores_maximos', 'dias_consecutivos',
+]
+
+
+def obtener_reglas():
+    """Umbrales de las insignias activas (lista de dicts), desde la cache si está disponible"""
+    reglas = cache.get(CLAVE_REGLAS)
+    if reglas is None:
+        reglas = list(Insignia.objects.filter(activa=True).values(*CAMPOS_REGLA))
+        cache.set(CLAVE_REGLAS, reglas, TTL_REGLAS)
+    return reglas
+
+
+def invalidar_reglas():
+    cache.delete(CLAVE_REGLAS)
+
+
+def snapshot_usuario(usuario, reglas=None):
+    """Instantánea de las estadísticas que usan las condiciones de las insignias"""
+    snapshot = {
+        'nivel': usuario.nivel,
+        'registros_totales': usuario.registros_totales,
+        'precision_promedio': usuario.precision_promedio,
+        'errores_totales': usuario.errores_totales,
+        'racha': usuario.racha_actual,
+    }
+    # La racha vigente solo se consulta si alguna regla la necesita
+    if reglas is None or any(regla['dias_consecutivos'] for regla in reglas):
+        snapshot['racha'] = calcular_racha(usuario.pk)
+    return snapshot
+
+
+def cumple_condiciones(regla, snapshot):
+    """Evalúa los umbrales de una insignia contra una instantánea, sin consultas"""
+    if snapshot['nivel'] < regla['nivel_requerido']:
+        return False
+    if snapshot['registros_totales'] < regla['registros_minimos']:
+        return False
+    if snapshot['precision_promedio'] < regla['precision_minima']:
+        return False
+    if snapshot['errores_totales'] > regla['errores_maximos']:
+        return False
+    if snapshot['racha'] < regla['dias_consecutivos']:
+        return False
+    return True
+
+
+def notificacion_insignia(usuario_id, nombre):
+    return Notificacion(
+        usuario_id=usuario_id,
+        tipo='achievement',
+        titulo='¡Nueva Insignia!',
+        mensaje=f'¡Felicitaciones! Has obtenido la insignia "{nombre}"',
+        url_accion='/mis_insignias/',
+        texto_accion='Ver Insignias'
+    )
+
+
+def otorgar_insignias(usuario):
+    """
+    Otorga al usuario las insignias activas que cumple y todavía no tiene.
+
+    Devuelve (reglas ganadas, notificaciones creadas); ambas listas en el mismo orden.
+    """
+    reglas = obtener_reglas()
+    if not reglas:
+        return [], []
+
+    obtenidas = set(usuario.insignias.values_list('id', flat=True))
+    pendientes = [regla for regla in reglas if regla['id'] not in obtenidas]
+    if not pendientes:
+        return [], []
+
+    snapshot = snapshot_usuario(usuario, pendientes)
+    ganadas = [regla for regla in pendientes if cumple_condiciones(regla, snapshot)]
+    if not ganadas:
+        return [], []
+
+    Through = Usuario.insignias.through
+    Through.objects.bulk_create(
+        [Through(usuario_id=usuario.pk, insignia_id=regla['id']) for regla in ganadas],
+        ignore_conflicts=True,
+    )
+    notificaciones = Notificacion.objects.bulk_create(
+        [notificacion_insignia(usuario.pk, regla['nombre']) for regla in ganadas]
+    )
+
+    # bulk_create no dispara señales: los contadores cacheados se ajustan aquí
+    contadores.incrementar(usuario.pk, 'insignias_total', len(ganadas))
+    contadores.incrementar(usuario.pk, 'notificaciones_total', len(notificaciones))
+    contadores.incrementar(usuario.pk, 'no_leidas', len(notificaciones))
+
+    # Se envían en tiempo real junto con el resto de eventos de la petición, tras el commit
+    for notificacion in notificaciones:
+        encolar_notificacion(usuario.pk, notificacion)
+    encolar_estadisticas(usuario.pk, {'insignias_total': len(obtenidas) + len(ganadas)})
+    # El conteo de no leídas se lee al confirmarse, cuando ya se aplicó el incremento de arriba
+    encolar_no_leidas(usuario.pk)
+    return ganadas, notificaciones
+
+
+# --- Reevaluación masiva ---
+
+def _rachas(usuario_ids, dias_maximos):
+    """Racha vigente (acotada a `dias_maximos`) de cada usuario, en una sola consulta por rango"""
+    rachas = pd.Series(0, index=pd.Index(usuario_ids, name='usuario_id'))
+    if not dias_maximos or not len(usuario_ids):
+        return rachas
+
+    hoy = fecha_local()
+    filas = ActividadDiaria.objects.filter(
+        usuario_id__in=list(usuario_ids), registros__gt=0,
+        fecha__range=(hoy - timedelta(days=dias_maximos), hoy),
+    ).values_list('usuario_id', 'fecha')
+    df = pd.DataFrame.from_records(list(filas), columns=['usuario_id', 'fecha'])
+    if df.empty:
+        return rachas
+
+    df['atraso'] = (pd.Timestamp(hoy) - pd.to_datetime(df['fecha'])).dt.days
+    df = df.sort_values(['usuario_id', 'atraso'])
+    # La racha puede terminar hoy o ayer; los días siguientes deben ser consecutivos
+    inicio = df.groupby('usuario_id')['atraso'].transform('first')
+    consecutivo = (df['atraso'] - df.groupby('usuario_id').cumcount()) == inicio
+    consecutivo &= inicio <= 1
+    tramo = consecutivo.astype(int).groupby(df['usuario_id']).cummin()
+    rachas.update(tramo.groupby(df['usuario_id']).sum())
+    return rachas
+
+
+def evaluar_lote(usuarios, reglas):
+    """
+    Evalúa todas las reglas sobre un DataFrame de usuarios (una fila por usuario).
+
+    Devuelve un dict {insignia_id: array de usuario_id que cumplen}.
+    """
+    cumplen = {}
+    for regla in reglas:
+        mascara = (
+            (usuarios['nivel'].to_numpy() >= regla['nivel_requerido'])
+            & (usuarios['registros_totales'].to_numpy() >= regla['registros_minimos'])
+            & (usuarios['precision_promedio'].to_numpy() >= regla['precision_minima'])
+            & (usuarios['errores_totales'].to_numpy() <= regla['errores_maximos'])
+            & (usuarios['racha'].to_numpy() >= regla['dias_consecutivos'])
+        )
+        cumplen[regla['id']] = usuarios.index.to_numpy()[mascara]
+    return cumplen
+
+
+def reevaluar_insignias(insignia_ids=None, dry_run=False, tamano_lote=5000, progreso=None):
+    """
+    Otorga a todos los usuarios las insignias activas que cumplen y no tenían.
+
+    Trabaja por lotes de usuarios: una consulta de estadísticas, una de rachas y
+    una de insignias ya otorgadas por lote, y dos INSERT masivos (M2M y notificaciones).
+    """
+    reglas = [r for r in obtener_reglas() if insignia_ids is None or r['id'] in insignia_ids]
+    resumen = {'usuarios': 0, 'otorgadas': 0, 'por_insignia': {r['nombre']: 0 for r in reglas}}
+    if not reglas:
+        return resumen
+
+    nombres = {r['id']: r['nombre'] for r in reglas}
+    dias_maximos = max(r['dias_consecutivos'] for r in reglas)
+    Through = Usuario.insignias.through
+    columnas = ['id', 'nivel', 'registros_totales', 'precision_promedio', 'errores_totales']
+    total = Usuario.objects.count()
+
+    ultimo_id = 0
+    while True:
+        filas = list(Usuario.objects.filter(pk__gt=ultimo_id).order_by('pk').values_list(*columnas)[:tamano_lote])
+        if not filas:
+            break
+        ultimo_id = filas[-1][0]
+
+        usuarios = pd.DataFrame.from_records(filas, columns=columnas).set_index('id')
+        usuarios['racha'] = _rachas(usuarios.index, dias_maximos).to_numpy()
+
+        obtenidas = set(Through.objects.filter(
+            usuario_id__in=usuarios.index.tolist(), insignia_id__in=list(nombres)
+        ).values_list('usuario_id', 'insignia_id'))
+
+        nuevas = [
+            (int(usuario_id), insignia_id)
+            for insignia_id, usuario_ids in evaluar_lote(usuarios, reglas).items()
+            for usuario_id in usuario_ids
+            if (usuario_id, insignia_id) not in obtenidas
+        ]
+
+        if nuevas and not dry_run:
+            with agrupar_notificaciones(), transaction.atomic():
+                Through.objects.bulk_create(
+                    [Through(usuario_id=u, insignia_id=i) for u, i in nuevas],
+                    ignore_conflicts=True, batch_size=tamano_lote,
+                )
+                notificaciones = Notificacion.objects.bulk_create(
+                    [notificacion_insignia(u, nombres[i]) for u, i in nuevas], batch_size=tamano_lote,
+                )
+                for notificacion in notificaciones:
+                    encolar_notificacion(notificacion.usuario_id, notificacion)
+            contadores.invalidar_usuarios({u for u, _ in nuevas}, 'insignias_total', 'notificaciones_total', 'no_leidas')
+
+        for _, insignia_id in nuevas:
+            resumen['por_insignia'][nombres[insignia_id]] += 1
+        resumen['usuarios'] += len(usuarios)
+        resumen['otorgadas'] += len(nuevas)
+        if progreso:
+            progreso(resumen['usuarios'], total, len(nuevas))
+
+    return resumen
+
+
+def programar_reevaluacion(insignia_id):
+    """Reevalúa una insignia para todos los usuarios en segundo plano, tras confirmar la transacción"""
+    def _reevaluar():
+        resumen = reevaluar_insignias([insignia_id])
+        logger.info('Reevaluación de la insignia %s: %s otorgadas', insignia_id, resumen['otorgadas'])
+
+    transaction.on_commit(lambda: ejecutar_en_segundo_plano(_reevaluar))
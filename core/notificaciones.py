@@ -0,0 +1,201 @@
+"""
+Despacho diferido y agrupado de notificaciones en tiempo real.
+
+Los eventos (notificaciones y actualizaciones de estadísticas) que produce una
+petición se acumulan por usuario y, cuando la transacción se confirma, se
+envían en un único mensaje 'notification_batch' por usuario desde el pool de
+tareas en segundo plano, fuera del hilo de la petición.
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .actividad import registros_del_dia
+from .contadores import incrementar, obtener_contadores
+from .models import Notificacion, Usuario
+from .tareas import ejecutar_en_segundo_plano
+
+logger = logging.getLogger(__name__)
+
+_pendientes = contextvars.ContextVar('notificaciones_pendientes', default=None)
+
+
+# Notificaciones no leídas que se incluyen en la instantánea al conectar el WebSocket
+LIMITE_SNAPSHOT = 10
+
+CAMPOS_NOTIFICACION = ('id', 'titulo', 'mensaje', 'tipo', 'fecha', 'leida', 'url_accion', 'texto_accion')
+
+# Grupos compartidos para difusiones: un solo group_send llega a todas las conexiones
+GRUPO_TODOS = 'notifications_all'
+
+
+def grupo_usuario(usuario_id):
+    return f'notifications_{usuario_id}'
+
+
+def grupo_rol(rol):
+    return f'notifications_rol_{rol}'
+
+
+def serializar_notificacion(notificacion):
+    """Formato de notificación que esperan notifications.js y NotificationConsumer"""
+    return {
+        'id': notificacion.id,
+        'titulo': notificacion.titulo,
+        'mensaje': notificacion.mensaje,
+        'tipo': notificacion.tipo,
+        'fecha': notificacion.fecha.isoformat(),
+        'leida': notificacion.leida,
+        'url_accion': notificacion.url_accion,
+        'texto_accion': notificacion.texto_accion,
+    }
+
+
+def snapshot_notificaciones(usuario_id, desde_id=None, limite=LIMITE_SNAPSHOT):
+    """
+    Estado inicial del WebSocket: conteo de no leídas (cache) y las últimas no leídas en una consulta.
+
+    Con `desde_id` solo se incluyen las posteriores a ese id, para que una
+    reconexión reciba únicamente lo que se perdió mientras estaba desconectada.
+    En ese caso se omiten las difusiones: llegan sin id (una fila distinta por
+    usuario), así que el cursor no las cubre y se repetirían en cada reconexión;
+    ya están sumadas en el conteo de no leídas.
+    """
+    filas = Notificacion.objects.filter(usuario_id=usuario_id, leida=False)
+    if desde_id is not None:
+        filas = filas.filter(pk__gt=desde_id, difusion=False)
+    notificaciones = list(filas.order_by('-fecha').values(*CAMPOS_NOTIFICACION)[:limite])
+    for notificacion in notificaciones:
+        notificacion['fecha'] = notificacion['fecha'].isoformat()
+
+    ultimo_id = max((n['id'] for n in notificaciones), default=desde_id)
+    return {
+        'type': 'snapshot',
+        'unread_count': obtener_contadores(usuario_id)['no_leidas'],
+        'notifications': notificaciones,
+        'last_id': ultimo_id,
+    }
+
+
+def _lote(pendientes, usuario_id):
+    return pendientes.setdefault(str(usuario_id), {'notifications': [], 'stats': {}})
+
+
+def encolar_notificacion(usuario_id, notificacion):
+    """Agrega una notificación (instancia o dict ya serializado) al lote del usuario"""
+    if not isinstance(notificacion, dict):
+        notificacion = serializar_notificacion(notificacion)
+    with agrupar_notificaciones() as pendientes:
+        _lote(pendientes, usuario_id)['notifications'].append(notificacion)
+
+
+def encolar_estadisticas(usuario_id, stats):
+    """Agrega estadísticas al lote del usuario; los valores posteriores reemplazan a los anteriores"""
+    with agrupar_notificaciones() as pendientes:
+        _lote(pendientes, usuario_id)['stats'].update(stats)
+
+
+def encolar_rol(usuario_id, rol):
+    """Avisa a los sockets del usuario su rol actual para que cambien de grupo de difusión"""
+    with agrupar_notificaciones() as pendientes:
+        _lote(pendientes, usuario_id)['rol'] = rol
+
+
+def encolar_no_leidas(usuario_id):
+    """Encola el conteo de no leídas leído al confirmarse la transacción, ya aplicados los deltas del contador"""
+    transaction.on_commit(lambda: encolar_estadisticas(usuario_id, {
+        'unread_notifications': obtener_contadores(usuario_id)['no_leidas'],
+    }))
+
+
+def descontar_no_leida(usuario_id):
+    """Una notificación pasó a leída (Notificacion.marcar_leida)"""
+    incrementar(usuario_id, 'no_leidas', -1)
+    encolar_no_leidas(usuario_id)
+
+
+CAMPOS_ESTADISTICAS = ('nivel', 'puntos_experiencia', 'registros_totales', 'precision_promedio')
+
+
+def estadisticas_usuario(usuario):
+    """Estadísticas de registro que muestran el navbar y las tarjetas del dashboard"""
+    return {
+        'nivel': usuario.nivel,
+        'puntos_experiencia': usuario.puntos_experiencia,
+        'total_registros': usuario.registros_totales,
+        'precision_actual': round(usuario.precision_promedio, 1),
+        'registros_hoy': registros_del_dia(usuario.pk),
+    }
+
+
+def encolar_estadisticas_usuario(usuario):
+    """Encola las estadísticas de registro del usuario (valores absolutos, ya actualizados en memoria)"""
+    encolar_estadisticas(usuario.pk, estadisticas_usuario(usuario))
+
+
+def encolar_estadisticas_registro(usuario_id):
+    """
+    Encola las estadísticas de registro del usuario leídas de la base al despachar el lote.
+
+    Para altas y bajas de Registro y Error hechas fuera del servicio de envío
+    (REST, router, admin): varias en la misma petición se resuelven con una
+    sola lectura por usuario, ya confirmada la transacción.
+    """
+    with agrupar_notificaciones() as pendientes:
+        _lote(pendientes, usuario_id)['recalcular'] = True
+
+
+@contextmanager
+def agrupar_notificaciones():
+    """
+    Acumula los eventos encolados dentro del bloque y los despacha al confirmarse la transacción.
+
+    Los bloques anidados comparten el lote del bloque exterior.
+    """
+    pendientes = _pendientes.get()
+    if pendientes is not None:
+        yield pendientes
+        return
+
+    pendientes = {}
+    token = _pendientes.set(pendientes)
+    try:
+        yield pendientes
+    finally:
+        _pendientes.reset(token)
+        if pendientes:
+            transaction.on_commit(lambda: ejecutar_en_segundo_plano(enviar_lotes, pendientes))
+
+
+def enviar_lotes(pendientes):
+    """Envía un mensaje 'notification_batch' por usuario al channel layer"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    recalcular = [usuario_id for usuario_id, lote in pendientes.items() if lote.pop('recalcular', False)]
+    if recalcular:
+        for usuario in Usuario.objects.filter(pk__in=recalcular).only(*CAMPOS_ESTADISTICAS):
+            pendientes[str(usuario.pk)]['stats'].update(estadisticas_usuario(usuario))
+
+    async def _enviar():
+        for usuario_id, lote in pendientes.items():
+            await channel_layer.group_send(grupo_usuario(usuario_id), {'type': 'notification_batch', **lote})
+
+    async_to_sync(_enviar)()
+    logger.debug('Lotes de notificaciones enviados a %s usuarios', len(pendientes))
+
+
+class NotificacionesMiddleware:
+    """Agrupa todos los eventos en tiempo real producidos por una petición"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with agrupar_notificaciones():
+            return self.get_response(request)
@@ -0,0 +1,97 @@
+"""
+Cliente asíncrono de Ollama con pool de conexiones y streaming.
+
+Todas las peticiones HTTP se ejecutan en un event loop propio que corre en un
+hilo de fondo, de modo que el pool de conexiones se comparte entre las vistas
+síncronas y los consumers de Channels (cada uno en su propio loop).
+
+El cliente no limita la concurrencia: ProgramadorGeneracion
+(core.ia_recomendador) corre sus workers en este loop, llama a agenerar() y
+astream() y decide cuántas generaciones van en paralelo y en qué orden.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaClient:
+    def __init__(self, url=None, model=None, max_conexiones=None, timeout=None):
+        self.url = url or getattr(settings, 'OLLAMA_URL', 'http://localhost:11434/api/generate')
+        self.model = model or getattr(settings, 'OLLAMA_MODEL', 'gemma3:4b')
+        self.max_conexiones = max_conexiones or getattr(settings, 'OLLAMA_MAX_CONEXIONES', 10)
+        self.timeout = timeout or getattr(settings, 'OLLAMA_TIMEOUT', 60)
+
+        self._loop = None
+        self._http = None
+        self._lock = threading.Lock()
+
+    # --- Loop de fondo ---
+
+    def get_loop(self):
+        """Event loop del cliente (se inicia en un hilo daemon la primera vez)"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='ollama-client', daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def _get_http(self):
+        # Solo se llama desde el loop de fondo
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_conexiones, max_keepalive_connections=self.max_conexiones),
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+            )
+        return self._http
+
+    def payload(self, prompt, system=None, stream=True):
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream
+        }
+        if system:
+            payload["system"] = system
+        return payload
+
+    # --- API pública: corutinas que corren en el loop de fondo (get_loop()) ---
+
+    async def astream(self, prompt, system=None):
+        """Itera los tokens a medida que llegan; cancelar la tarea cierra la petición HTTP"""
+        http = self._get_http()
+        async with http.stream('POST', self.url, json=self.payload(prompt, system)) as response:
+            response.raise_for_status()
+            async for linea in response.aiter_lines():
+                if not linea.strip():
+                    continue
+                data = json.loads(linea)
+                token = data.get("response", "")
+                if token:
+                    yield token
+                if data.get("done"):
+                    break
+
+    async def agenerar(self, prompt, system=None):
+        """Respuesta completa"""
+        partes = []
+        async for token in self.astream(prompt, system):
+            partes.append(token)
+        return ''.join(partes)
+
+    def cerrar(self):
+        """Cierra el pool de conexiones y detiene el loop de fondo"""
+        if self._loop is None:
+            return
+        if self._http is not None:
+            asyncio.run_coroutine_threadsafe(self._http.aclose(), self._loop).result(5)
+            self._http = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
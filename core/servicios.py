@@ -0,0 +1,99 @@
+"""
+Servicio transaccional de envío de registros.
+
+Calcula en memoria la puntuación de calidad, los deltas de estadísticas, la
+experiencia y el nivel, e inserta el registro y actualiza al usuario con una
+sola escritura cada uno (contadores con expresiones F atómicas). La racha se
+toma de la actividad diaria (core.actividad).
+"""
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .actividad import calcular_racha, fecha_local, registrar_actividad
+from .estadisticas import aplicar_delta, calcular_precision
+from . import contadores
+from .models import Registro, Usuario
+from .notificaciones import encolar_estadisticas_usuario
+
+XP_BASE = 10
+XP_BONUS_CALIDAD = 5
+UMBRAL_BONUS_CALIDAD = 90
+
+CAMPOS_ESTADISTICAS = [
+    'nivel', 'puntos_experiencia', 'puntos_totales', 'racha_actual',
+    'mejor_racha', 'registros_totales', 'errores_totales', 'precision_promedio',
+]
+
+
+def calcular_puntos(puntuacion_calidad, racha_actual):
+    """Experiencia ganada por un registro nuevo"""
+    puntos = XP_BASE
+    if puntuacion_calidad > UMBRAL_BONUS_CALIDAD:
+        puntos += XP_BONUS_CALIDAD  # Bonificación por calidad
+    if racha_actual > 0:
+        puntos += racha_actual  # Bonificación por racha
+    return puntos
+
+
+def enviar_registro(usuario, datos, fuente='web', ip_origen=None, user_agent=''):
+    """
+    Crea un registro sin errores y acredita al usuario en una única transacción.
+
+    Devuelve (registro, puntos_ganados). Los campos de estadísticas de `usuario`
+    quedan actualizados en memoria con los valores persistidos.
+    """
+    registro = Registro(
+        usuario=usuario,
+        dni=datos.get('dni', ''),
+        apellido=datos.get('apellido', ''),
+        nombres=datos.get('nombres', ''),
+        email=datos.get('email', ''),
+        telefono=datos.get('telefono', ''),
+        fecha_nacimiento=datos.get('fecha_nacimiento') or None,
+        direccion=datos.get('direccion', ''),
+        fuente=fuente,
+        ip_origen=ip_origen,
+        user_agent=user_agent or '',
+    )
+    # El registro se crea sin errores asociados: no hace falta contarlos
+    registro.calcular_puntuacion_calidad(errores=0, guardar=False)
+
+    with transaction.atomic():
+        # Bloquea la fila del usuario para que racha, experiencia y nivel se calculen sobre valores vigentes
+        actual = Usuario.objects.select_for_update().only(*CAMPOS_ESTADISTICAS).get(pk=usuario.pk)
+
+        puntos = calcular_puntos(registro.puntuacion_calidad, actual.racha_actual)
+        actual.puntos_experiencia += puntos
+        nivel = actual.calcular_nivel()
+
+        # Las estadísticas se acreditan aquí; la señal post_save no debe volver a sumarlas
+        registro._estadisticas_aplicadas = True
+        registro.save()
+        registrar_actividad(usuario.pk, fecha_local(registro.fecha), registros=1)
+        # La racha son días consecutivos con actividad, no registros seguidos
+        racha = calcular_racha(usuario.pk)
+        aplicar_delta(
+            usuario.pk,
+            registros=1,
+            puntos_experiencia=F('puntos_experiencia') + puntos,
+            puntos_totales=F('puntos_totales') + puntos,
+            racha_actual=racha,
+            mejor_racha=Greatest(F('mejor_racha'), Value(racha)),
+            nivel=nivel,
+        )
+
+    # Reflejar en memoria lo persistido sin volver a consultar
+    usuario.registros_totales = actual.registros_totales + 1
+    usuario.errores_totales = actual.errores_totales
+    usuario.precision_promedio = calcular_precision(usuario.registros_totales, usuario.errores_totales)
+    usuario.puntos_experiencia = actual.puntos_experiencia
+    usuario.puntos_totales = actual.puntos_totales + puntos
+    usuario.racha_actual = racha
+    usuario.mejor_racha = max(actual.mejor_racha, racha)
+    usuario.nivel = nivel
+    contadores.actualizar(usuario.pk, nivel=nivel, puntos_experiencia=usuario.puntos_experiencia)
+    # Las pestañas abiertas del usuario reciben los nuevos valores por WebSocket tras el commit
+    encolar_estadisticas_usuario(usuario)
+
+    return registro, puntos
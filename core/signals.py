@@ -0,0 +1,108 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Error, Insignia, Notificacion, Registro, Usuario
+from .analisis_cache import marcar_obsoleto
+from .actividad import fecha_local, registrar_actividad
+from .estadisticas import aplicar_delta
+from . import contadores
+from .notificaciones import encolar_estadisticas, encolar_estadisticas_registro, encolar_no_leidas, encolar_rol
+from .motor_insignias import invalidar_reglas, programar_reevaluacion
+
+
+def _usuario_del_error(error):
+    return Registro.objects.filter(pk=error.registro_id).values_list('usuario_id', flat=True).first()
+
+
+@receiver(post_save, sender=Registro)
+def registro_guardado(sender, instance, created, **kwargs):
+    """Los registros creados fuera del servicio de envío también suman a las estadísticas"""
+    if created and not getattr(instance, '_estadisticas_aplicadas', False):
+        aplicar_delta(instance.usuario_id, registros=1)
+        registrar_actividad(instance.usuario_id, fecha_local(instance.fecha), registros=1)
+        # El servicio de envío encola sus propias estadísticas; el resto se envía tras el commit
+        encolar_estadisticas_registro(instance.usuario_id)
+
+
+@receiver(post_delete, sender=Registro)
+def registro_eliminado(sender, instance, **kwargs):
+    aplicar_delta(instance.usuario_id, registros=-1)
+    registrar_actividad(instance.usuario_id, fecha_local(instance.fecha), registros=-1)
+    encolar_estadisticas_registro(instance.usuario_id)
+
+
+@receiver(post_save, sender=Error)
+def error_guardado(sender, instance, created, **kwargs):
+    """Un error nuevo descuenta precisión y deja desactualizado el análisis de IA del usuario"""
+    if created:
+        usuario_id = _usuario_del_error(instance)
+        if usuario_id:
+            aplicar_delta(usuario_id, errores=1)
+            registrar_actividad(usuario_id, fecha_local(instance.timestamp), errores=1)
+            marcar_obsoleto(usuario_id)
+            encolar_estadisticas_registro(usuario_id)
+
+
+@receiver(post_delete, sender=Error)
+def error_eliminado(sender, instance, **kwargs):
+    usuario_id = _usuario_del_error(instance)
+    if usuario_id:
+        aplicar_delta(usuario_id, errores=-1)
+        registrar_actividad(usuario_id, fecha_local(instance.timestamp), errores=-1)
+        marcar_obsoleto(usuario_id)
+        encolar_estadisticas_registro(usuario_id)
+
+
+@receiver(post_save, sender=Insignia)
+def insignia_guardada(sender, instance, raw=False, **kwargs):
+    """Los umbrales cambiaron: se invalida la cache y se reevalúa a los usuarios existentes"""
+    invalidar_reglas()
+    if instance.activa and not raw:
+        programar_reevaluacion(instance.pk)
+
+
+@receiver(post_delete, sender=Insignia)
+def insignia_eliminada(sender, **kwargs):
+    invalidar_reglas()
+
+
+@receiver(post_save, sender=Notificacion)
+def notificacion_guardada(sender, instance, created, **kwargs):
+    """Mantiene los contadores de notificaciones cacheados y envía el nuevo conteo de no leídas"""
+    if not created:
+        # marcar_leida no pasa por save() (descuenta con un UPDATE condicional); otros cambios invalidan
+        contadores.invalidar(instance.usuario_id, 'no_leidas')
+        return
+    contadores.incrementar(instance.usuario_id, 'notificaciones_total')
+    if not instance.leida:
+        contadores.incrementar(instance.usuario_id, 'no_leidas')
+        encolar_no_leidas(instance.usuario_id)
+
+
+@receiver(post_delete, sender=Notificacion)
+def notificacion_eliminada(sender, instance, **kwargs):
+    # El archivado (core.archivado) borra sin señales e invalida por usuario
+    contadores.invalidar(instance.usuario_id, 'no_leidas', 'notificaciones_total')
+
+
+@receiver(m2m_changed, sender=Usuario.insignias.through)
+def insignias_usuario_modificadas(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        contadores.invalidar(instance.pk, 'insignias_total')
+    elif pk_set:
+        contadores.invalidar_usuarios(pk_set, 'insignias_total')
+    else:
+        # clear() desde la insignia: no se conocen los usuarios afectados
+        contadores.invalidar_usuarios(Usuario.objects.values_list('pk', flat=True), 'insignias_total')
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_guardado(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or {'nivel', 'puntos_experiencia'} & set(update_fields)):
+        contadores.actualizar(instance.pk, nivel=instance.nivel, puntos_experiencia=instance.puntos_experiencia)
+        encolar_estadisticas(instance.pk, {'nivel': instance.nivel, 'puntos_experiencia': instance.puntos_experiencia})
+    if not created and (update_fields is None or 'rol' in update_fields):
+        # Los sockets abiertos se unen al grupo de difusión del rol actual (si no cambió no hacen nada)
+        encolar_rol(instance.pk, instance.rol)
@@ -46,6 +46,7 @@
                 <button id="sara-chat-close" style="background:none;border:none;color:white;font-size:1.5rem;cursor:pointer;">&times;</button>
             </div>
         </div>
+        <input id="sara-chat-search" type="search" placeholder="Buscar usuario..." style="margin:8px 12px 0 12px;padding:6px 10px;border-radius:6px;border:1px solid #ccc;outline:none;" autocomplete="off" />
         <div id="sara-chat-users" style="background:#f7f7f7;padding:8px 12px;overflow-x:auto;white-space:nowrap;"></div>
         <div id="sara-chat-messages" style="flex:1;overflow-y:auto;padding:12px;background:#f9f9f9;"></div>
         <form id="sara-chat-form" style="display:flex;padding:10px 8px 8px 8px;background:#f7f7f7;gap:8px;">
@@ -115,7 +116,9 @@
 
     // Mostrar/ocultar chat
     chatBtn.onclick = () => {
-        chatWindow.style.display = chatWindow.style.display === 'none' ? 'flex' : 'none';
+        const wasHidden = chatWindow.style.display === 'none';
+        chatWindow.style.display = wasHidden ? 'flex' : 'none';
+        if (wasHidden) markConversationRead();
     };
     chatWindow.querySelector('#sara-chat-close').onclick = () => {
         chatWindow.style.display = 'none';
@@ -123,6 +126,7 @@
 
     // Lógica de usuarios y mensajes (placeholder, se conectará a backend)
     const usersDiv = chatWindow.querySelector('#sara-chat-users');
+    const searchInput = chatWindow.querySelector('#sara-chat-search');
     const messagesDiv = chatWindow.querySelector('#sara-chat-messages');
     const form = chatWindow.querySelector('#sara-chat-form');
     const input = chatWindow.querySelector('#sara-chat-input');
@@ -133,45 +137,82 @@
     let messages = [];
     let myId = null;
     let ws = null;
+    // Respuesta del bot que se está recibiendo en streaming
+    let streamingMsg = null;
+    // Paginación del historial: quedan mensajes anteriores / hay una página en camino
+    let hasOlderMessages = false;
+    let loadingOlder = false;
+    // Lista lateral: conversaciones recientes o resultado de la búsqueda, de a páginas
+    let usersQuery = '';
+    let hasMoreUsers = false;
+    let loadingUsers = false;
+
+    function toChatUser(u) {
+        return {
+            id: u.id,
+            name: u.username === 'sara_bot' ? 'SARA Bot 🤖' : (u.first_name || u.username),
+            username: u.username,
+            unread: u.unread || 0
+        };
+    }
 
-    // Cargar usuarios desde backend
-    fetch('/api/chat/users/')
-        .then(r => r.json())
-        .then(data => {
-            // Evitar duplicados de sara_bot
-            const seen = new Set();
-            users = data.users
-                .filter(u => u.username !== 'SARA' && u.username !== 'sara' && u.username !== 'Sara')
-                .filter(u => {
-                    if (seen.has(u.username)) return false;
-                    seen.add(u.username);
-                    return true;
-                })
-                .map(u => ({
-                    id: u.id,
-                    name: u.username === 'sara_bot' ? 'SARA Bot 🤖' : (u.first_name || u.username),
-                    username: u.username
-                }));
-            // Obtener el id del usuario autenticado si viene en la respuesta
-            if (data.my_id) {
+    // Cargar usuarios desde backend (append: página siguiente de la lista actual)
+    function loadUsers(append = false) {
+        const params = new URLSearchParams();
+        if (usersQuery) params.set('q', usersQuery);
+        if (append && users.length) {
+            const last = users[users.length - 1];
+            params.set(usersQuery ? 'after' : 'before', usersQuery ? last.username : last.id);
+        }
+        const query = usersQuery;
+        loadingUsers = true;
+        return fetch(`/api/chat/users/?${params}`)
+            .then(r => r.json())
+            .then(data => {
                 myId = data.my_id;
-            } else {
-                myId = users.find(u => u.username !== 'sara_bot')?.id;
-            }
-            // Seleccionar el usuario bot por username y guardar su id globalmente
-            const botUser = users.find(u => u.username === 'sara_bot');
-            window.saraBotId = botUser ? botUser.id : null;
-            selectedUser = botUser ? botUser.id : users[0].id;
-            renderUsers();
-            loadMessages();
-            connectWS();
-        });
+                window.saraBotId = data.bot_id;
+                // Respuesta de una búsqueda que ya cambió
+                if (query !== usersQuery) return data;
+                const page = data.users
+                    .filter(u => u.username !== 'SARA' && u.username !== 'sara' && u.username !== 'Sara')
+                    .map(toChatUser);
+                users = append ? users.concat(page.filter(u => !users.some(x => x.id === u.id))) : page;
+                hasMoreUsers = data.has_more;
+                renderUsers();
+                return data;
+            })
+            .finally(() => { loadingUsers = false; });
+    }
+
+    loadUsers().then(data => {
+        // Empezar en la conversación con el bot
+        selectedUser = data.bot_id || (users[0] && users[0].id);
+        renderUsers();
+        loadMessages();
+        connectWS();
+    });
+
+    let searchTimer = null;
+    searchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            usersQuery = searchInput.value.trim();
+            loadUsers();
+        }, 250);
+    });
+
+    // Página siguiente al llegar al final de la lista
+    usersDiv.addEventListener('scroll', () => {
+        if (hasMoreUsers && !loadingUsers && usersDiv.scrollLeft + usersDiv.clientWidth >= usersDiv.scrollWidth - 40) {
+            loadUsers(true);
+        }
+    });
 
     function renderUsers() {
         usersDiv.innerHTML = '';
         users.forEach(u => {
             const btn = document.createElement('button');
-            btn.textContent = u.name;
+            btn.textContent = u.unread ? `${u.name} (${u.unread})` : u.name;
             btn.style.marginRight = '8px';
             btn.style.padding = '6px 12px';
             btn.style.borderRadius = '6px';
@@ -181,6 +222,7 @@
             btn.style.cursor = 'pointer';
             btn.onclick = () => {
                 selectedUser = u.id;
+                u.unread = 0;
                 renderUsers();
                 loadMessages();
                 // Ocultar notificación visual al abrir cualquier conversación
@@ -190,7 +232,9 @@
         });
     }
 
-    function renderMessages() {
+    function renderMessages(keepScroll = false) {
+        // Al anteponer mensajes anteriores se conserva la posición de lectura
+        const fromBottom = messagesDiv.scrollHeight - messagesDiv.scrollTop;
         messagesDiv.innerHTML = '';
         messages.forEach(m => {
             const msgDiv = document.createElement('div');
@@ -201,7 +245,11 @@
             msgDiv.innerHTML = `<span style="display:inline-block;padding:8px 12px;border-radius:8px;background:${isMine ? '#007bff' : '#e0e0e0'};color:${isMine ? 'white' : '#222'};max-width:80%;word-break:break-word;">${m.text}</span>`;
             messagesDiv.appendChild(msgDiv);
         });
-        // Siempre scrollear al final
+        if (keepScroll) {
+            messagesDiv.scrollTop = messagesDiv.scrollHeight - fromBottom;
+            return;
+        }
+        // Scrollear al final
         setTimeout(() => { messagesDiv.scrollTop = messagesDiv.scrollHeight; }, 50);
     }
 
@@ -211,20 +259,102 @@
             .then(r => r.json())
             .then(data => {
                 messages = data.messages;
+                hasOlderMessages = data.has_more;
+                // Conservar la respuesta parcial del bot mientras siga llegando
+                if (streamingMsg && (String(streamingMsg.from_id) === String(selectedUser))) {
+                    messages.push(streamingMsg);
+                }
                 renderMessages();
                 // Forzar scroll al final después de cargar mensajes
                 setTimeout(() => { messagesDiv.scrollTop = messagesDiv.scrollHeight; }, 100);
             });
     }
 
+    // Lo que llega a la conversación abierta y visible queda leído también en el servidor
+    function markConversationRead() {
+        if (!selectedUser || chatWindow.style.display === 'none') return;
+        const user = users.find(u => String(u.id) === String(selectedUser));
+        if (user && user.unread) {
+            user.unread = 0;
+            renderUsers();
+        }
+        if (ws && ws.readyState === WebSocket.OPEN) {
+            ws.send(JSON.stringify({action: 'read', other_id: selectedUser}));
+        }
+    }
+
+    function loadOlderMessages() {
+        const oldest = messages.find(m => m.id);
+        if (!selectedUser || !hasOlderMessages || loadingOlder || !oldest) return;
+        loadingOlder = true;
+        const conversation = selectedUser;
+        fetch(`/api/chat/messages/?other_id=${conversation}&before_id=${oldest.id}`)
+            .then(r => r.json())
+            .then(data => {
+                if (conversation !== selectedUser) return;
+                messages = data.messages.concat(messages);
+                hasOlderMessages = data.has_more;
+                renderMessages(true);
+            })
+            .finally(() => { loadingOlder = false; });
+    }
+
+    // Mensajes anteriores al llegar arriba del historial
+    messagesDiv.addEventListener('scroll', () => {
+        if (messagesDiv.scrollTop < 40) loadOlderMessages();
+    });
+
+    let wsReconnectAttempts = 0;
     function connectWS() {
-        if (ws) ws.close();
+        if (ws) {
+            ws.onclose = null;
+            ws.close();
+        }
         ws = new WebSocket(`ws://${window.location.host}/ws/chat/`);
+        ws.onopen = () => {
+            // Tras una reconexión, recuperar lo que llegó mientras el socket estuvo caído
+            if (wsReconnectAttempts > 0) loadMessages();
+            wsReconnectAttempts = 0;
+        };
+        ws.onclose = () => {
+            // Reconexión con backoff exponencial y jitter (cualquier worker o nodo sirve)
+            wsReconnectAttempts++;
+            const tope = Math.min(1000 * Math.pow(2, wsReconnectAttempts), 60000);
+            setTimeout(connectWS, tope / 2 + Math.random() * tope / 2);
+        };
         ws.onmessage = (event) => {
             const data = JSON.parse(event.data);
             // Solo mostrar si es para la conversación activa
             const isForActive = String(data.sender_id) === String(selectedUser) || String(data.recipient_id) === String(selectedUser);
             const isMine = String(data.sender_id) === String(myId);
+            if (data.partial) {
+                // Token parcial de la respuesta del bot: se acumula en una única burbuja
+                if (!streamingMsg) {
+                    streamingMsg = {
+                        from: users.find(u => u.id == data.sender_id)?.name || 'SARA Bot',
+                        from_id: data.sender_id,
+                        to: users.find(u => u.id == data.recipient_id)?.name || '',
+                        to_id: data.recipient_id,
+                        text: '',
+                        timestamp: Date.now(),
+                        is_bot: true
+                    };
+                    if (isForActive) messages.push(streamingMsg);
+                }
+                streamingMsg.text += data.text;
+                if (isForActive) renderMessages();
+                return;
+            }
+            if (data.is_bot && streamingMsg && String(data.sender_id) === String(streamingMsg.from_id)) {
+                // Mensaje completo: reemplaza la burbuja parcial
+                streamingMsg.text = data.text;
+                streamingMsg = null;
+                if (isForActive) {
+                    renderMessages();
+                    markConversationRead();
+                }
+                return;
+            }
             if (isForActive) {
                 messages.push({
                     from: users.find(u => u.id == data.sender_id)?.name || 'Desconocido',
@@ -236,6 +366,18 @@
                     is_bot: data.is_bot
                 });
                 renderMessages();
+                if (!isMine) markConversationRead();
+            }
+            // Mensaje de otra conversación: sumar no leídos y subirla en la lista
+            if (!isMine && !isForActive && String(data.recipient_id) === String(myId) && !usersQuery) {
+                const sender = users.find(u => String(u.id) === String(data.sender_id));
+                if (sender) {
+                    sender.unread++;
+                    users = [sender].concat(users.filter(u => u !== sender));
+                    renderUsers();
+                } else {
+                    loadUsers();
+                }
             }
             // Notificación si el mensaje es para mí y no lo envié yo
             if (!isMine && notifEnabled && (String(data.recipient_id) === String(myId) || String(data.recipient_id) === String(window.saraBotId))) {
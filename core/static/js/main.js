@@ -95,37 +95,17 @@ function initializeForms() {
 
 // Funciones del dashboard
 function initializeDashboard() {
-    // Actualizar estadísticas en tiempo real cada 30 segundos
-    if (document.querySelector('.dashboard-stats')) {
-        setInterval(updateDashboardStats, 30000);
-    }
+    // Las estadísticas llegan por WebSocket (ver initializeNavbar)
 
     // Inicializar gráficos si existen
     initializeCharts();
 }
 
-// Actualizar estadísticas del dashboard
-function updateDashboardStats() {
-    fetch(window.location.href, {
-        headers: {
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-    })
-    .then(response => response.json())
-    .then(data => {
-        // Actualizar contadores
-        if (data.estadisticas_rapidas) {
-            updateStatsCards(data.estadisticas_rapidas);
-        }
-    })
-    .catch(error => console.error('Error updating stats:', error));
-}
-
 // Actualizar tarjetas de estadísticas
 function updateStatsCards(stats) {
-    document.querySelectorAll('.stats-card').forEach(function(card) {
+    document.querySelectorAll('[data-stat-type]').forEach(function(card) {
         var statType = card.dataset.statType;
-        var valueElement = card.querySelector('.stat-number');
+        var valueElement = card.querySelector('.stat-number') || card;
 
         if (stats[statType] !== undefined && valueElement) {
             var currentValue = parseInt(valueElement.textContent);
@@ -385,8 +365,35 @@ function initializeNavbar() {
     // Animaciones de entrada para elementos del navbar
     animateNavbarElements();
 
-    // Actualizar indicadores en tiempo real
-    setInterval(updateNavbarIndicators, 30000); // Cada 30 segundos
+    // Indicadores en tiempo real: el servidor los empuja por el WebSocket de notificaciones
+    document.addEventListener('sara:stats', function(e) {
+        applyLiveStats(e.detail);
+    });
+
+    // Respaldo por HTTP solo mientras el WebSocket está caído
+    document.addEventListener('sara:ws-estado', function(e) {
+        if (e.detail.reconexion) {
+            // Recuperar lo que cambió mientras estuvo desconectado
+            updateNavbarIndicators();
+        }
+    });
+    setInterval(function() {
+        var manager = window.notificationManager;
+        if (manager && !manager.isConnected) {
+            updateNavbarIndicators();
+        }
+    }, 30000); // Cada 30 segundos
+}
+
+// Aplicar estadísticas recibidas (push o respaldo HTTP) al navbar y al dashboard
+function applyLiveStats(stats) {
+    if (stats.nivel !== undefined) {
+        updateLevelBadge(stats.nivel);
+    }
+    if (stats.unread_notifications !== undefined) {
+        updateNotificationBadge(stats.unread_notifications);
+    }
+    updateStatsCards(stats);
 }
 
 // Toggle del tema
@@ -520,7 +527,7 @@ function updateNavbarIndicators() {
     fetch('/api/notifications/count/')
         .then(response => response.json())
         .then(data => {
-            updateNotificationBadge(data.count);
+            updateNotificationBadge(data.unread_count);
         })
         .catch(error => console.log('Error updating notifications:', error));
 
@@ -528,7 +535,8 @@ function updateNavbarIndicators() {
     fetch('/api/user/level/')
         .then(response => response.json())
         .then(data => {
-            updateLevelBadge(data.level);
+            updateLevelBadge(data.nivel);
+            updateStatsCards(data);
         })
         .catch(error => console.log('Error updating level:', error));
 }
@@ -13,6 +13,10 @@ class NotificationManager {
         this.userId = userId || this.getCurrentUserId();
         this.isConnected = false;
 
+        // Cursor de la última notificación recibida: al reconectar solo se piden las posteriores
+        this.lastIdKey = `sara_notif_last_id_${this.userId}`;
+        this.lastNotificationId = parseInt(localStorage.getItem(this.lastIdKey), 10) || null;
+
         // Elementos del DOM
         this.notificationContainer = null;
         this.notificationBadge = null;
@@ -30,7 +34,6 @@ class NotificationManager {
         this.requestNotificationPermission();
         this.connectWebSocket();
         this.setupEventListeners();
-        this.updateNavbarStats();
     }
 
     getCurrentUserId() {
@@ -159,14 +162,17 @@ class NotificationManager {
         if (!this.userId) return;
 
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/notifications/${this.userId}/`;
+        const since = this.lastNotificationId ? `?since=${this.lastNotificationId}` : '';
+        const wsUrl = `${protocol}//${window.location.host}/ws/notifications/${this.userId}/${since}`;
 
         try {
             this.ws = new WebSocket(wsUrl);
 
             this.ws.onopen = (event) => {
                 console.log('WebSocket conectado para notificaciones');
+                const reconexion = this.reconnectAttempts > 0;
                 this.isConnected = true;
+                this.emitConnectionState(reconexion);
                 this.reconnectAttempts = 0;
                 this.reconnectInterval = this.baseReconnectInterval;
                 this.showConnectionStatus('Conectado', 'success');
@@ -180,6 +186,7 @@ class NotificationManager {
             this.ws.onclose = (event) => {
                 console.log('WebSocket desconectado:', event.code, event.reason);
                 this.isConnected = false;
+                this.emitConnectionState(false);
                 this.handleReconnection();
             };
 
@@ -198,30 +205,91 @@ class NotificationManager {
         try {
             const data = JSON.parse(event.data);
 
-            if (data.type === 'notification') {
+            if (data.type === 'snapshot') {
+                this.handleSnapshot(data);
+            } else if (data.type === 'notification') {
                 this.handleNewNotification(data.notification);
             } else if (data.type === 'stats_update') {
                 this.handleStatsUpdate(data.stats);
+            } else if (data.type === 'notification_batch') {
+                this.handleNotificationBatch(data);
             }
         } catch (error) {
             console.error('Error al procesar mensaje WebSocket:', error);
         }
     }
 
+    emitConnectionState(reconexion) {
+        // main.js usa este evento para sondear por HTTP solo mientras el socket está caído
+        document.dispatchEvent(new CustomEvent('sara:ws-estado', {
+            detail: { conectado: this.isConnected, reconexion: reconexion }
+        }));
+    }
+
+    rememberNotificationId(id) {
+        if (id && (!this.lastNotificationId || id > this.lastNotificationId)) {
+            this.lastNotificationId = id;
+            localStorage.setItem(this.lastIdKey, id);
+        }
+    }
+
+    handleSnapshot(snapshot) {
+        // Estado inicial en un solo mensaje: conteo de no leídas y las que faltan por mostrar
+        const notifications = snapshot.notifications || [];
+        notifications.slice().reverse().forEach(notification => {
+            this.showNotificationToast(notification);
+        });
+        if (notifications.length > 0) {
+            this.playNotificationSound();
+        }
+
+        this.rememberNotificationId(snapshot.last_id);
+        this.updateNavbarWithStats({ unread_notifications: snapshot.unread_count });
+    }
+
     handleNewNotification(notification) {
+        this.rememberNotificationId(notification.id);
+
         // Mostrar notificación toast
         this.showNotificationToast(notification);
 
         // Mostrar notificación del navegador si está permitido
         this.showBrowserNotification(notification);
 
-        // Actualizar badge del navbar
-        this.updateNotificationBadge();
+        // Actualizar badge del navbar; las difusiones llegan a todos a la vez,
+        // así que se suman localmente en lugar de consultar el conteo al servidor
+        if (notification.difusion) {
+            this.incrementNotificationBadge();
+        } else {
+            this.updateNotificationBadge();
+        }
 
         // Reproducir sonido si está habilitado
         this.playNotificationSound();
     }
 
+    handleNotificationBatch(batch) {
+        const notifications = batch.notifications || [];
+        notifications.forEach(notification => {
+            this.rememberNotificationId(notification.id);
+            this.showNotificationToast(notification);
+            this.showBrowserNotification(notification);
+        });
+
+        // Un solo refresco del badge y un solo sonido por lote; si el lote ya trae
+        // el conteo de no leídas no hace falta pedirlo al servidor
+        if (notifications.length > 0) {
+            if (!batch.stats || batch.stats.unread_notifications === undefined) {
+                this.updateNotificationBadge();
+            }
+            this.playNotificationSound();
+        }
+
+        if (batch.stats && Object.keys(batch.stats).length > 0) {
+            this.handleStatsUpdate(batch.stats);
+        }
+    }
+
     handleStatsUpdate(stats) {
         // Actualizar elementos del navbar con las nuevas estadísticas
         this.updateNavbarWithStats(stats);
@@ -246,7 +314,11 @@ class NotificationManager {
         // Agregar evento de click para marcar como leída y redireccionar
         toast.addEventListener('click', (e) => {
             if (!e.target.classList.contains('notification-close')) {
-                this.markNotificationAsRead(notification.id);
+                if (notification.id) {
+                    this.markNotificationAsRead(notification.id);
+                } else if (notification.difusion) {
+                    this.markBroadcastAsRead(notification);
+                }
                 if (notification.url_accion) {
                     window.location.href = notification.url_accion;
                 }
@@ -297,6 +369,15 @@ class NotificationManager {
         }
     }
 
+    incrementNotificationBadge() {
+        const badge = document.querySelector('.notification-badge');
+        if (badge) {
+            const actual = parseInt(badge.textContent, 10) || 0;
+            badge.textContent = actual + 1;
+            badge.style.display = 'inline';
+        }
+    }
+
     updateNavbarWithStats(stats) {
         // Actualizar elementos del navbar con estadísticas en tiempo real
         if (stats.nivel !== undefined) {
@@ -327,6 +408,16 @@ class NotificationManager {
                 notificationBadge.style.display = stats.unread_notifications > 0 ? 'inline' : 'none';
             }
         }
+
+        // Nivel y tarjetas del dashboard los actualiza main.js
+        document.dispatchEvent(new CustomEvent('sara:stats', { detail: stats }));
+    }
+
+    markBroadcastAsRead(notification) {
+        // La difusión llega sin id (cada usuario tiene su fila): el servidor la busca por la fecha compartida
+        if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+            this.ws.send(JSON.stringify({ action: 'mark_read', difusion: notification.fecha }));
+        }
     }
 
     markNotificationAsRead(notificationId) {
@@ -362,20 +453,12 @@ class NotificationManager {
             });
     }
 
-    updateNavbarStats() {
-        // Actualizar estadísticas del navbar periódicamente
-        this.fetchNotificationCount();
-
-        // Actualizar cada 30 segundos
-        setInterval(() => {
-            this.fetchNotificationCount();
-        }, 30000);
-    }
-
     handleReconnection() {
         this.reconnectAttempts++;
-        // Backoff exponencial hasta 1 minuto
-        this.reconnectInterval = Math.min(this.baseReconnectInterval * Math.pow(2, this.reconnectAttempts - 1), 60000);
+        // Backoff exponencial hasta 1 minuto con jitter completo: tras un reinicio o drenado
+        // (cierres 1012/1013) los clientes no vuelven todos en el mismo instante
+        const tope = Math.min(this.baseReconnectInterval * Math.pow(2, this.reconnectAttempts - 1), 60000);
+        this.reconnectInterval = Math.round(tope / 2 + Math.random() * tope / 2);
         console.log(`Intentando reconectar WebSocket... (intento ${this.reconnectAttempts}, en ${this.reconnectInterval / 1000}s)`);
         this.showConnectionStatus(`Desconectado - Reintentando conexión (${this.reconnectAttempts})...`, 'error');
         setTimeout(() => {
@@ -0,0 +1,41 @@
+"""
+Ejecución de tareas en segundo plano dentro del proceso (sin broker externo)
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Devuelve el pool de hilos compartido para tareas en segundo plano"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'SARA_TAREAS_MAX_HILOS', 2),
+                    thread_name_prefix='sara-tareas',
+                )
+    return _executor
+
+
+def ejecutar_en_segundo_plano(funcion, *args, **kwargs):
+    """Encola una función en el pool y cierra las conexiones a la base de datos al terminar"""
+    def _tarea():
+        close_old_connections()
+        try:
+            return funcion(*args, **kwargs)
+        except Exception:
+            logger.exception("Error en tarea en segundo plano %s", getattr(funcion, '__name__', funcion))
+        finally:
+            close_old_connections()
+
+    return get_executor().submit(_tarea)
@@ -9,11 +9,12 @@ from .views import (
     UsuarioViewSet, RegistroViewSet, ErrorViewSet, InsigniaViewSet, MetricaViewSet,
     SesionTrabajoViewSet, ReportePersonalizadoViewSet, TareaAutomaticaViewSet,
     ComentarioRegistroViewSet, PlantillaRegistroViewSet, IntegracionExternaViewSet,
-    panel_usuario, panel_equipo, validar_registro,
+    panel_usuario, panel_equipo, validar_registro, importar_registros_api,
     notificaciones_view, insignias_view, perfil_usuario_view,
     sesiones_trabajo_view, reportes_personalizados_view, tareas_automaticas_view, plantillas_registro_view,
     comentarios_registro_view, integraciones_externas_view,
-    user_level_api, notifications_count_api, mark_notification_read_api,
+    user_level_api, actividad_calendario_api, notifications_count_api, mark_notification_read_api,
+    notifications_broadcast_api,
     notificacion_prueba,
     chat_users_api, chat_messages_api
 )
@@ -57,10 +58,13 @@ urlpatterns = [
     path('panel_usuario/<int:usuario_id>/', panel_usuario, name='panel_usuario'),
     path('panel_equipo/', panel_equipo, name='panel_equipo'),
     path('validar_registro/', validar_registro, name='validar_registro'),
+    path('importar_registros/', importar_registros_api, name='importar_registros_api'),
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('user/level/', user_level_api, name='user_level_api'),
+    path('actividad/calendario/', actividad_calendario_api, name='actividad_calendario_api'),
     path('notifications/count/', notifications_count_api, name='notifications_count_api'),
+    path('notifications/broadcast/', notifications_broadcast_api, name='notifications_broadcast_api'),
     path('notifications/<int:notification_id>/read/', mark_notification_read_api, name='mark_notification_read_api'),
     path('chat/users/', chat_users_api, name='chat_users_api'),
     path('chat/messages/', chat_messages_api, name='chat_messages_api'),
@@ -0,0 +1,112 @@
+"""
+Registro único de reglas de validación de campos de Registro.
+
+Las expresiones regulares se compilan una sola vez al importar el módulo y
+se comparten entre los validadores del modelo, la predicción de errores de
+RecomendadorIA y la validación vectorizada de lotes (cargas masivas).
+"""
+import re
+
+import pandas as pd
+from django.core.validators import RegexValidator
+
+
+class ReglaValidacion:
+    def __init__(self, campo, patron, mensaje, mensaje_validador=None, tipo='formato', probabilidad=0.5, min_digitos=None):
+        self.campo = campo
+        self.patron = patron
+        self.regex = re.compile(patron)
+        self.mensaje = mensaje
+        self.mensaje_validador = mensaje_validador or mensaje
+        self.tipo = tipo
+        self.probabilidad = probabilidad
+        self.min_digitos = min_digitos
+
+    def es_valido(self, valor):
+        valor = '' if valor is None else str(valor)
+        if not self.regex.match(valor):
+            return False
+        if self.min_digitos and sum(c.isdigit() for c in valor) < self.min_digitos:
+            return False
+        return True
+
+    def validar_serie(self, serie):
+        """Devuelve una Serie booleana (True = válido) evaluada en una sola pasada vectorizada"""
+        valores = serie.fillna('').astype(str)
+        validos = valores.str.match(self.regex)
+        if self.min_digitos:
+            validos &= valores.str.count(r'\d') >= self.min_digitos
+        return validos.fillna(False).astype(bool)
+
+    def validador(self):
+        """RegexValidator para usar en los campos del modelo"""
+        return RegexValidator(self.patron, self.mensaje_validador)
+
+    def error_predicho(self):
+        return {
+            'campo': self.campo,
+            'tipo': self.tipo,
+            'probabilidad': self.probabilidad,
+            'mensaje': self.mensaje
+        }
+
+
+REGLAS = {
+    'email': ReglaValidacion(
+        'email', r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$',
+        'El formato del email parece incorrecto',
+        probabilidad=0.9,
+    ),
+    'dni': ReglaValidacion(
+        'dni', r'^\d{7,8}$',
+        'El DNI debe tener 7 u 8 dígitos numéricos',
+        mensaje_validador='DNI debe tener 7 u 8 dígitos',
+        probabilidad=0.8,
+    ),
+    'telefono': ReglaValidacion(
+        'telefono', r'^\+?[\d\s\-\(\)]+$',
+        'El formato del teléfono parece incorrecto',
+        mensaje_validador='Formato de teléfono inválido',
+        probabilidad=0.7,
+        min_digitos=8,
+    ),
+}
+
+COLUMNAS_ERRORES = ['fila', 'campo', 'tipo', 'probabilidad', 'mensaje']
+
+
+def validar_registro(datos):
+    """Valida un único registro (dict); solo se evalúan los campos presentes"""
+    return [
+        regla.error_predicho()
+        for campo, regla in REGLAS.items()
+        if campo in datos and not regla.es_valido(datos[campo])
+    ]
+
+
+def validar_lote(registros):
+    """
+    Valida un lote de registros (lista de dicts o DataFrame) en una pasada vectorizada por regla.
+
+    Devuelve un DataFrame con una fila por error y las columnas de COLUMNAS_ERRORES,
+    donde `fila` es el índice del registro dentro del lote.
+    """
+    df = registros if isinstance(registros, pd.DataFrame) else pd.DataFrame.from_records(list(registros))
+
+    errores = []
+    for campo, regla in REGLAS.items():
+        if campo not in df.columns:
+            continue
+        filas = df.index[~regla.validar_serie(df[campo])]
+        if len(filas):
+            errores.append(pd.DataFrame({
+                'fila': filas,
+                'campo': campo,
+                'tipo': regla.tipo,
+                'probabilidad': regla.probabilidad,
+                'mensaje': regla.mensaje,
+            }))
+
+    if not errores:
+        return pd.DataFrame(columns=COLUMNAS_ERRORES)
+    return pd.concat(errores, ignore_index=True)
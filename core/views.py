@@ -12,15 +12,21 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import Usuario, Registro, Error, Insignia, Metrica, Notificacion, LogAuditoria, SesionTrabajo, ReportePersonalizado, TareaAutomatica, ComentarioRegistro, PlantillaRegistro, IntegracionExterna, ChatMessage
 from .serializers import UsuarioSerializer, RegistroSerializer, ErrorSerializer, InsigniaSerializer, MetricaSerializer, SesionTrabajoSerializer, ReportePersonalizadoSerializer, TareaAutomaticaSerializer, ComentarioRegistroSerializer, PlantillaRegistroSerializer, IntegracionExternaSerializer
-from .ia_recomendador import recomendador, analizar_usuario
-from .consumers import send_notification_to_user, send_stats_update_to_user
+from .ia_recomendador import recomendador
+from .analisis_cache import obtener_analisis
+from .carga_masiva import detectar_formato, importar_registros
+from .servicios import enviar_registro
+from .motor_insignias import otorgar_insignias
+from .actividad import calcular_racha, calendario_actividad, registros_del_dia
+from .notificaciones import encolar_notificacion
+from .contadores import obtener_contadores
+from .difusion import difundir_notificacion
 # --- VISTA PARA NOTIFICACIÓN DE PRUEBA ---
 from django.views.decorators.http import require_GET
 @login_required
 @require_GET
 def notificacion_prueba(request):
     """Vista para enviar una notificación de prueba al usuario autenticado"""
-    from asgiref.sync import async_to_sync
     from django.utils import timezone
     notification_data = {
         'id': None,
@@ -32,7 +38,7 @@ def notificacion_prueba(request):
         'url_accion': '',
         'texto_accion': '',
     }
-    async_to_sync(send_notification_to_user)(str(request.user.id), notification_data)
+    encolar_notificacion(request.user.id, notification_data)
     return JsonResponse({'success': True, 'msg': 'Notificación de prueba enviada'})
 import json
 
@@ -71,7 +77,7 @@ def logout_view(request):
 def registro_form(request):
     mensaje = None
     errores_predichos = []
-    analisis_usuario = analizar_usuario(request.user.id)
+    analisis_usuario = obtener_analisis(request.user.id)
 
     if request.method == 'POST':
         dni = request.POST.get('dni', '').strip()
@@ -99,82 +105,23 @@ def registro_form(request):
             mensaje = {'tipo': 'warning', 'texto': f'Se detectaron {len(errores_predichos)} posibles errores. Revisa los datos.'}
         else:
             try:
-                # Crear el registro con los datos estructurados
-                registro = Registro.objects.create(
-                    usuario=request.user,
-                    dni=dni,
-                    apellido=apellido,
-                    nombres=nombres,
-                    email=email,
-                    telefono=telefono,
-                    fecha_nacimiento=fecha_nacimiento if fecha_nacimiento else None,
-                    direccion=direccion,
-                    fuente='web'
+                # Crear el registro y acreditar estadísticas, experiencia y nivel en una transacción
+                registro, puntos_ganados = enviar_registro(
+                    request.user,
+                    {
+                        'dni': dni,
+                        'apellido': apellido,
+                        'nombres': nombres,
+                        'email': email,
+                        'telefono': telefono,
+                        'fecha_nacimiento': fecha_nacimiento,
+                        'direccion': direccion,
+                    },
+                    fuente='web',
                 )
 
-                # Calcular puntuación de calidad
-                registro.calcular_puntuacion_calidad()
-                registro.save()
-
-                # Actualizar estadísticas del usuario
-                request.user.registros_totales += 1
-                request.user.actualizar_estadisticas()
-
-                # Otorgar puntos de experiencia
-                puntos_ganados = 10  # Base
-                if registro.puntuacion_calidad > 90:
-                    puntos_ganados += 5  # Bonificación por calidad
-                if request.user.racha_actual > 0:
-                    puntos_ganados += request.user.racha_actual  # Bonificación por racha
-
-                request.user.puntos_experiencia += puntos_ganados
-                request.user.puntos_totales += puntos_ganados
-                request.user.racha_actual += 1
-                request.user.mejor_racha = max(request.user.mejor_racha, request.user.racha_actual)
-                request.user.nivel = request.user.calcular_nivel()
-                request.user.save()
-
-                # Verificar y otorgar insignias
-                insignias_ganadas = []
-                for insignia in Insignia.objects.filter(activa=True):
-                    if insignia.verificar_condicion(request.user) and not request.user.insignias.filter(id=insignia.id).exists():
-                        request.user.insignias.add(insignia)
-                        insignias_ganadas.append(insignia)
-
-                        # Crear notificación
-                        Notificacion.objects.create(
-                            usuario=request.user,
-                            tipo='achievement',
-                            titulo='¡Nueva Insignia!',
-                            mensaje=f'¡Felicitaciones! Has obtenido la insignia "{insignia.nombre}"',
-                            url_accion='/mis_insignias/',
-                            texto_accion='Ver Insignias'
-                        )
-
-                        # Enviar notificación en tiempo real
-                        import asyncio
-                        from asgiref.sync import async_to_sync
-
-                        notification_data = {
-                            'id': None,  # Se asignará automáticamente
-                            'titulo': '¡Nueva Insignia!',
-                            'mensaje': f'¡Felicitaciones! Has obtenido la insignia "{insignia.nombre}"',
-                            'tipo': 'achievement',
-                            'fecha': timezone.now().isoformat(),
-                            'leida': False,
-                            'url_accion': '/mis_insignias/',
-                            'texto_accion': 'Ver Insignias',
-                        }
-
-                        async_to_sync(send_notification_to_user)(str(request.user.id), notification_data)
-
-                        # Enviar actualización de estadísticas
-                        stats_data = {
-                            'nivel': request.user.nivel,
-                            'puntos_experiencia': request.user.puntos_experiencia,
-                            'insignias_total': request.user.insignias.count(),
-                        }
-                        async_to_sync(send_stats_update_to_user)(str(request.user.id), stats_data)
+                # Verificar y otorgar insignias (las notificaciones se envían en lote tras el commit)
+                insignias_ganadas, _ = otorgar_insignias(request.user)
 
                 # Registrar en log de auditoría
                 LogAuditoria.objects.create(
@@ -190,7 +137,7 @@ def registro_form(request):
                 mensaje = {
                     'tipo': 'success',
                     'texto': f'¡Registro guardado exitosamente! +{puntos_ganados} puntos de experiencia.',
-                    'insignias_ganadas': [i.nombre for i in insignias_ganadas] if insignias_ganadas else None
+                    'insignias_ganadas': [i['nombre'] for i in insignias_ganadas] if insignias_ganadas else None
                 }
 
             except Exception as e:
@@ -271,11 +218,7 @@ def panel_usuario_view(request):
         tendencia_errores = 0
 
     # Sistema de gamificación
-    progreso_nivel = 0
-    if request.user.nivel > 0:
-        puntos_base_nivel = (request.user.nivel - 1) * 100
-        puntos_para_siguiente = request.user.nivel * 100
-        progreso_nivel = ((request.user.puntos_experiencia - puntos_base_nivel) / (puntos_para_siguiente - puntos_base_nivel)) * 100
+    progreso_nivel = request.user.progreso_nivel['porcentaje']
 
     # Insignias recientes
     insignias_recientes = request.user.insignias.order_by('-fecha_creacion')[:3]
@@ -287,7 +230,7 @@ def panel_usuario_view(request):
     ).order_by('-fecha')[:5]
 
     # Análisis de IA
-    analisis_ia = analizar_usuario(request.user.id)
+    analisis_ia = obtener_analisis(request.user.id)
 
     # Obtener métricas recientes para gráficos
     metricas_recientes = Metrica.objects.filter(
@@ -396,14 +339,12 @@ def crear_registro(request):
             if not all([dni, apellido, email]):
                 return JsonResponse({'error': 'Todos los campos son obligatorios'}, status=400)
             
-            # Crear el registro
+            # Crear el registro (sin la experiencia ni la racha del envío desde el formulario)
             registro = Registro.objects.create(
                 usuario=request.user,
-                datos={
-                    'dni': dni,
-                    'apellido': apellido,
-                    'email': email
-                }
+                dni=dni,
+                apellido=apellido,
+                email=email
             )
             
             return JsonResponse({
@@ -450,6 +391,32 @@ def panel_equipo(request):
 def validar_registro(request):
     return JsonResponse({'validado': True})
 
+@api_view(['POST'])
+def importar_registros_api(request):
+    """API para la carga masiva de registros desde un archivo CSV o JSONL (campo 'archivo')"""
+    if not request.user.is_authenticated:
+        return Response({'error': 'Usuario no autenticado'}, status=401)
+
+    archivo = request.FILES.get('archivo')
+    if archivo is None:
+        return Response({'error': 'Falta el archivo a importar'}, status=400)
+
+    try:
+        formato = detectar_formato(archivo.name, request.data.get('formato'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    resumen = importar_registros(
+        request.user, archivo.file, formato=formato,
+        ip_origen=request.META.get('REMOTE_ADDR'),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+    )
+    if 'error' in resumen:
+        # Archivo inválido: el resumen indica cuántos registros de los bloques anteriores se guardaron
+        return Response(resumen, status=400)
+
+    return Response(resumen, status=201)
+
 @api_view(['GET'])
 def user_level_api(request):
     """API para obtener el nivel del usuario actual"""
@@ -461,7 +428,28 @@ def user_level_api(request):
         'puntos_experiencia': request.user.puntos_experiencia,
         'puntos_totales': request.user.puntos_totales,
         'racha_actual': request.user.racha_actual,
-        'insignias_total': request.user.insignias.count(),
+        'progreso_nivel': request.user.progreso_nivel['porcentaje'],
+        'insignias_total': obtener_contadores(request.user.id)['insignias_total'],
+        'total_registros': request.user.registros_totales,
+        'registros_hoy': registros_del_dia(request.user.id),
+        'precision_actual': round(request.user.precision_promedio, 1),
+    })
+
+@api_view(['GET'])
+def actividad_calendario_api(request):
+    """API con la actividad diaria del usuario (mapa de calor) y su racha"""
+    if not request.user.is_authenticated:
+        return Response({'error': 'Usuario no autenticado'}, status=401)
+
+    try:
+        dias = min(max(int(request.GET.get('dias', 365)), 1), 366)
+    except ValueError:
+        return Response({'error': 'Parámetro dias inválido'}, status=400)
+
+    return Response({
+        'racha_actual': calcular_racha(request.user.id),
+        'mejor_racha': request.user.mejor_racha,
+        'dias': calendario_actividad(request.user.id, dias),
     })
 
 @api_view(['GET'])
@@ -470,14 +458,11 @@ def notifications_count_api(request):
     if not request.user.is_authenticated:
         return Response({'error': 'Usuario no autenticado'}, status=401)
 
-    count = Notificacion.objects.filter(
-        usuario=request.user,
-        leida=False
-    ).count()
+    contadores = obtener_contadores(request.user.id)
 
     return Response({
-        'unread_count': count,
-        'total_notifications': Notificacion.objects.filter(usuario=request.user).count(),
+        'unread_count': contadores['no_leidas'],
+        'total_notifications': contadores['notificaciones_total'],
     })
 
 @api_view(['POST'])
@@ -491,24 +476,40 @@ def mark_notification_read_api(request, notification_id):
             id=notification_id,
             usuario=request.user
         )
+        # El nuevo conteo de no leídas se envía por WebSocket desde la señal de Notificacion
         notification.marcar_leida()
 
-        # Enviar actualización en tiempo real
-        from asgiref.sync import async_to_sync
-        from .consumers import send_stats_update_to_user
-
-        stats_data = {
-            'unread_notifications': Notificacion.objects.filter(
-                usuario=request.user,
-                leida=False
-            ).count(),
-        }
-        async_to_sync(send_stats_update_to_user)(str(request.user.id), stats_data)
-
         return Response({'success': True})
     except Notificacion.DoesNotExist:
         return Response({'error': 'Notificación no encontrada'}, status=404)
 
+@api_view(['POST'])
+def notifications_broadcast_api(request):
+    """API para enviar una notificación a todos los usuarios o a un rol (líderes y admins)"""
+    if not request.user.is_authenticated:
+        return Response({'error': 'Usuario no autenticado'}, status=401)
+    if request.user.rol not in ['lider', 'admin']:
+        return Response({'error': 'Sin permisos para enviar difusiones'}, status=403)
+
+    titulo = request.data.get('titulo', '').strip()
+    mensaje = request.data.get('mensaje', '').strip()
+    if not titulo or not mensaje:
+        return Response({'error': 'Faltan el título o el mensaje'}, status=400)
+
+    try:
+        resumen = difundir_notificacion(
+            titulo, mensaje,
+            tipo=request.data.get('tipo', 'system'),
+            rol=request.data.get('rol') or None,
+            url_accion=request.data.get('url_accion', ''),
+            texto_accion=request.data.get('texto_accion', ''),
+            creada_por=request.user,
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    return Response(resumen, status=201)
+
 class UsuarioViewSet(viewsets.ModelViewSet):
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
@@ -717,7 +718,7 @@ def perfil_usuario_view(request):
 
     context = {
         'mensaje': mensaje,
-        'analisis_usuario': analizar_usuario(request.user.id),
+        'analisis_usuario': obtener_analisis(request.user.id),
     }
 
     return render(request, 'core/perfil.html', context)
@@ -728,6 +729,7 @@ def dashboard_view(request):
     usuario = request.user
 
     # Estadísticas rápidas
+    contadores = obtener_contadores(usuario.id)
     estadisticas_rapidas = {
         'total_registros': Registro.objects.filter(usuario=usuario).count(),
         'registros_hoy': Registro.objects.filter(
@@ -736,10 +738,8 @@ def dashboard_view(request):
         ).count(),
         'precision_actual': usuario.precision_promedio,
         'nivel_actual': usuario.nivel,
-        'insignias_total': usuario.insignias.count(),
-        'notificaciones_no_leidas': Notificacion.objects.filter(
-            usuario=usuario, leida=False
-        ).count(),
+        'insignias_total': contadores['insignias_total'],
+        'notificaciones_no_leidas': contadores['no_leidas'],
     }
 
     # Agregar propiedades al usuario para el navbar
@@ -788,7 +788,7 @@ def dashboard_view(request):
     actividad_reciente = actividad_reciente[:6]  # Limitar a 6 elementos
 
     # Recomendaciones de IA
-    analisis_ia = analizar_usuario(usuario.id)
+    analisis_ia = obtener_analisis(usuario.id)
     recomendaciones = analisis_ia.get('sugerencias', [])[:3]
 
     context = {
@@ -1174,50 +1174,76 @@ def integraciones_externas_view(request):
 
     return render(request, 'core/integraciones_externas.html', context)
 
-from django.contrib.auth import get_user_model
 from django.http import JsonResponse
-from .models import ChatMessage
-from django.db import models
 from django.contrib.auth.decorators import login_required
 
+def _usuario_chat(fila):
+    actividad = fila['ultima_actividad']
+    return {
+        'id': fila['otro_id'],
+        'username': fila['username'],
+        'first_name': fila['first_name'],
+        'last_name': fila['last_name'],
+        'last_message': fila['ultimo_mensaje'] or '',
+        'last_message_mine': bool(fila['ultimo_mensaje_propio']),
+        'last_activity': actividad.isoformat() if actividad else None,
+        'unread': fila['no_leidos'] or 0,
+    }
+
 @login_required
 def chat_users_api(request):
-    User = get_user_model()
-    users = list(User.objects.values('id', 'username', 'first_name', 'last_name'))
-    # Obtener el usuario bot real
-    from .consumers_chat import get_bot_user
-    bot_user = get_bot_user()
-    users.append({'id': bot_user.id, 'username': 'sara_bot', 'first_name': 'SARA', 'last_name': 'Bot'})
-    return JsonResponse({'users': users, 'my_id': request.user.id})
+    """Lista lateral del chat: conversaciones recientes (?before=) o búsqueda por prefijo de username (?q=&after=)"""
+    from .conversaciones import hilos_recientes, buscar_usuarios, id_bot, BOT_USERNAME, PAGINA_HILOS, PAGINA_HILOS_MAX
+    try:
+        before = int(request.GET['before']) if request.GET.get('before') else None
+        limite = min(max(int(request.GET.get('limit', PAGINA_HILOS)), 1), PAGINA_HILOS_MAX)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros de paginación inválidos'}, status=400)
+
+    q = request.GET.get('q', '').strip()
+    if q:
+        filas, hay_mas = buscar_usuarios(request.user.id, q, despues_de=request.GET.get('after') or None, limite=limite)
+    else:
+        filas, hay_mas = hilos_recientes(request.user.id, antes_de=before, limite=limite)
+    users = [_usuario_chat(fila) for fila in filas]
+
+    bot_id = id_bot()
+    # El bot siempre está disponible al comienzo de la lista aunque todavía no haya conversación
+    if not q and before is None and all(u['id'] != bot_id for u in users):
+        users.insert(0, {
+            'id': bot_id, 'username': BOT_USERNAME, 'first_name': 'SARA', 'last_name': 'Bot',
+            'last_message': '', 'last_message_mine': False, 'last_activity': None, 'unread': 0,
+        })
+    return JsonResponse({'users': users, 'my_id': request.user.id, 'bot_id': bot_id, 'has_more': hay_mas})
 
 @login_required
 def chat_messages_api(request):
-    user_id = request.user.id
-    other_id = request.GET.get('other_id')
-    if other_id is None:
-        return JsonResponse({'messages': []})
-    from .consumers_chat import get_bot_user
-    bot_user = get_bot_user()
-    bot_id = str(bot_user.id)
-    if str(other_id) == bot_id:
-        # Mensajes con el bot
-        messages = ChatMessage.objects.filter(
-            (models.Q(sender_id=user_id, recipient_id=bot_id) | models.Q(sender_id=bot_id, recipient_id=user_id))
-        ).order_by('timestamp')
-    else:
-        messages = ChatMessage.objects.filter(
-            (models.Q(sender_id=user_id, recipient_id=other_id) | models.Q(sender_id=other_id, recipient_id=user_id))
-        ).order_by('timestamp')
+    """Historial con otro usuario, de a páginas: ?other_id=&before_id=&limit= (los más recientes primero)"""
+    from .conversaciones import historial, marcar_hilo_leido, PAGINA_MENSAJES, PAGINA_MENSAJES_MAX
+    if request.GET.get('other_id') is None:
+        return JsonResponse({'messages': [], 'has_more': False})
+    try:
+        other_id = int(request.GET['other_id'])
+        before_id = int(request.GET['before_id']) if request.GET.get('before_id') else None
+        limite = min(max(int(request.GET.get('limit', PAGINA_MENSAJES)), 1), PAGINA_MENSAJES_MAX)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros de paginación inválidos'}, status=400)
+
+    mensajes, hay_mas = historial(request.user.id, other_id, antes_id=before_id, limite=limite)
+    if before_id is None:
+        # Abrir la conversación la marca como leída en la lista lateral
+        marcar_hilo_leido(request.user.id, other_id)
     data = [
         {
-            'from': m.sender.username if m.sender else 'SARA Bot',
-            'from_id': m.sender.id if m.sender else 0,
-            'to': m.recipient.username if m.recipient else 'SARA Bot',
-            'to_id': m.recipient.id if m.recipient else 0,
-            'text': m.text,
-            'timestamp': m.timestamp.isoformat(),
-            'is_bot': m.is_bot
+            'id': m['id'],
+            'from': m['sender__username'] or 'SARA Bot',
+            'from_id': m['sender_id'] or 0,
+            'to': m['recipient__username'] or 'SARA Bot',
+            'to_id': m['recipient_id'] or 0,
+            'text': m['text'],
+            'timestamp': m['timestamp'].isoformat(),
+            'is_bot': m['is_bot']
         }
-        for m in messages
+        for m in mensajes
     ]
-    return JsonResponse({'messages': data})
+    return JsonResponse({'messages': data, 'has_more': hay_mas})
@@ -1,9 +1,23 @@
 #!/usr/bin/env python
 """
 Script para ejecutar el servidor ASGI con Django Channels
+
+Uso: python run_asgi.py [--host 0.0.0.0] [--port 8000] [--workers 4]
+
+Con --workers > 1 el socket se abre una vez y se reparte entre procesos
+worker; los mensajes entre workers viajan por el channel layer (SQLite en un
+nodo, Redis con SARA_CHANNELS_REDIS para varios nodos) y la cache tiene que
+ser compartida (SARA_CACHE_REDIS); las dos opciones de Redis necesitan
+pip install -r requirements-redis.txt. Al recibir SIGTERM o SIGINT cada worker
+deja de aceptar conexiones y drena las abiertas de forma escalonada
+(SARA_WS_DRENADO_SEGUNDOS) antes de terminar.
 """
+import argparse
+import multiprocessing
 import os
+import signal
 import sys
+import time
 import django
 from pathlib import Path
 
@@ -16,12 +30,113 @@ django.setup()
 
 # Ahora importar y ejecutar uvicorn
 import uvicorn
+from django.conf import settings
 
-if __name__ == '__main__':
-    uvicorn.run(
+from core import conexiones
+
+
+class ServidorSara(uvicorn.Server):
+    """Servidor uvicorn que drena los WebSockets antes del apagado normal"""
+
+    async def shutdown(self, sockets=None):
+        # Dejar de aceptar conexiones nuevas antes de empezar a cerrar las abiertas
+        for server in self.servers:
+            server.close()
+        for sock in sockets or []:
+            sock.close()
+        await conexiones.drenar()
+        await super().shutdown(sockets=sockets)
+
+
+def crear_config(args):
+    drenado = getattr(settings, 'SARA_WS_DRENADO_SEGUNDOS', 10)
+    return uvicorn.Config(
         'sara.asgi:application',
-        host='0.0.0.0',
-        port=8000,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
         reload=False,  # Desactivar reload para evitar problemas
-        log_level='info'
+        log_level='info',
+        lifespan='off',
+        # El drenado tiene que entrar en la espera de apagado ordenado
+        timeout_graceful_shutdown=drenado + 5,
     )
+
+
+def ejecutar_worker(config, sockets):
+    config.configure_logging()
+    ServidorSara(config).run(sockets=sockets)
+
+
+def supervisar(config):
+    """Abre el socket una vez, lanza los workers y los reemplaza si mueren inesperadamente"""
+    sock = config.bind_socket()
+    contexto = multiprocessing.get_context('spawn')
+    apagando = False
+
+    def lanzar():
+        proceso = contexto.Process(target=ejecutar_worker, args=(config, [sock]))
+        proceso.start()
+        return proceso
+
+    def apagar(signum, frame):
+        nonlocal apagando
+        if apagando:
+            return
+        apagando = True
+        # Ctrl+C ya llega a todo el grupo de procesos; SIGTERM hay que reenviarlo
+        if signum == signal.SIGTERM:
+            for proceso in procesos:
+                if proceso.is_alive():
+                    os.kill(proceso.pid, signal.SIGTERM)
+
+    procesos = [lanzar() for _ in range(config.workers)]
+    signal.signal(signal.SIGTERM, apagar)
+    signal.signal(signal.SIGINT, apagar)
+    print(f'Supervisor {os.getpid()}: {config.workers} workers en {config.host}:{config.port}')
+
+    while not apagando:
+        for i, proceso in enumerate(procesos):
+            if not proceso.is_alive() and not apagando:
+                print(f'Worker {proceso.pid} terminó con código {proceso.exitcode}; relanzando')
+                procesos[i] = lanzar()
+        time.sleep(0.5)
+
+    for proceso in procesos:
+        proceso.join(config.timeout_graceful_shutdown + 5)
+        if proceso.is_alive():
+            proceso.kill()
+    sock.close()
+
+
+def caches_locales():
+    """Alias de cache que viven en la memoria de cada proceso"""
+    return [alias for alias, config in settings.CACHES.items()
+            if config.get('BACKEND', '').endswith('.LocMemCache')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor ASGI de SARA (HTTP y WebSocket)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SARA_WS_WORKERS') or 1))
+    args = parser.parse_args()
+
+    # Contadores, análisis y respuestas del LLM se cachean: con cache por proceso divergirían entre workers
+    locales = caches_locales()
+    if args.workers > 1 and locales:
+        sys.exit(f'--workers {args.workers} requiere una cache compartida (LocMemCache en: {", ".join(locales)}); '
+                 'defina SARA_CACHE_REDIS=redis://host:6379/1 o use un solo worker')
+
+    # Los workers leen esta variable para repartir SARA_WS_MAX_CONEXIONES (core.conexiones)
+    os.environ['SARA_WS_WORKERS'] = str(args.workers)
+    config = crear_config(args)
+
+    if args.workers > 1:
+        supervisar(config)
+    else:
+        ServidorSara(config).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -12,8 +12,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -56,6 +60,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Agrupa las notificaciones en tiempo real de cada petición y las envía tras el commit
+    'core.notificaciones.NotificacionesMiddleware',
 ]
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -92,18 +98,103 @@ WSGI_APPLICATION = 'sara.wsgi.application'
 ASGI_APPLICATION = 'sara.asgi.application'
 
 # Channel layers for WebSockets
+# SQLiteChannelLayer comparte mensajes y grupos entre los workers de un mismo host
+# (InMemoryChannelLayer solo sirve con un único proceso)
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-        # Para producción usar Redis:
-        # 'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        # 'CONFIG': {
-        #     "hosts": [('127.0.0.1', 6379)],
-        # },
+        'BACKEND': 'core.channels_sqlite.SQLiteChannelLayer',
+        'CONFIG': {
+            'ruta': BASE_DIR / 'channels.sqlite3',
+        },
     },
 }
 
 
+def requiere_paquete(modulo, variable):
+    """Las opciones de Redis son opcionales: sin el paquete se falla al arrancar con un mensaje claro"""
+    if importlib.util.find_spec(modulo) is None:
+        raise ImproperlyConfigured(
+            f'{variable} está definida pero falta el módulo {modulo}: pip install -r requirements-redis.txt'
+        )
+
+
+# Varios nodos: SARA_CHANNELS_REDIS=redis://host:6379/0 comparte la capa por Redis (requirements-redis.txt)
+if os.environ.get('SARA_CHANNELS_REDIS'):
+    requiere_paquete('channels_redis', 'SARA_CHANNELS_REDIS')
+    CHANNEL_LAYERS['default'] = {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [os.environ['SARA_CHANNELS_REDIS']],
+        },
+    }
+
+# Conexiones WebSocket admitidas por nodo (se reparten entre los workers de run_asgi.py; None sin límite)
+SARA_WS_MAX_CONEXIONES = 10000
+
+# Segundos en los que se cierran escalonadamente los sockets al apagar un worker (core.conexiones)
+SARA_WS_DRENADO_SEGUNDOS = 10
+
+# Cache (análisis de IA y contadores por usuario)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sara-default',
+    },
+    # Respuestas del LLM (core.llm_cache): TTL de 6 horas y desalojo LRU de a una entrada
+    'llm': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sara-llm',
+        'TIMEOUT': 6 * 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'CULL_FREQUENCY': 1000,
+        },
+    },
+}
+
+# LocMem es por proceso: con varios workers (run_asgi.py --workers N) cada uno tendría sus
+# propios contadores, instantáneas de análisis y respuestas del LLM. run_asgi.py no arranca
+# más de un worker con cache local; SARA_CACHE_REDIS=redis://host:6379/1 la comparte (requirements-redis.txt)
+if os.environ.get('SARA_CACHE_REDIS'):
+    requiere_paquete('redis', 'SARA_CACHE_REDIS')
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['SARA_CACHE_REDIS'],
+            'KEY_PREFIX': 'sara',
+        },
+        'llm': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['SARA_CACHE_REDIS'],
+            'KEY_PREFIX': 'sara-llm',
+            'TIMEOUT': 6 * 3600,
+        },
+    }
+
+# Segundos tras los cuales la instantánea del análisis de IA se recalcula en segundo plano
+SARA_ANALISIS_IA_TTL = 3600
+
+# Vigencia máxima de los contadores por usuario cacheados (core.contadores)
+SARA_CONTADORES_TTL = 3600
+
+# Días que se conservan las notificaciones leídas antes de archivarlas (archivar_notificaciones)
+SARA_NOTIFICACIONES_RETENCION_DIAS = 90
+
+# Hilos del pool de tareas en segundo plano (core.tareas)
+SARA_TAREAS_MAX_HILOS = 2
+
+# Ollama (core.ollama_client; cola y concurrencia en core.ia_recomendador.ProgramadorGeneracion)
+OLLAMA_URL = 'http://localhost:11434/api/generate'
+OLLAMA_MODEL = 'gemma3:4b'
+OLLAMA_MAX_CONCURRENCIA = 2  # generaciones simultáneas contra el modelo local (workers del programador)
+OLLAMA_MAX_CONEXIONES = 10  # tamaño del pool HTTP
+OLLAMA_MAX_COLA = 8  # sugerencias en espera antes de responder solo con las de respaldo
+OLLAMA_TIMEOUT = 60  # segundos
+
+# Modelo global de patrones de error (python manage.py entrenar_modelo_errores)
+SARA_MODELO_ERRORES_PATH = BASE_DIR / 'ml_models' / 'patrones_errores.joblib'
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -1,12 +1,26 @@
 #!/usr/bin/env python
 """
 Script para probar las conexiones WebSocket
+
+Uso:
+  python test_websocket.py                          # prueba simple contra ws://localhost:8000
+  python test_websocket.py --carga 5000 [--rondas 3] [--concurrencia 200]
+
+En modo carga abre N sockets autenticados (todos con la sesión de un mismo
+usuario de prueba), mide la latencia de conexión (handshake + snapshot
+inicial) y luego publica --rondas notificaciones al grupo del usuario por el
+channel layer, midiendo cuánto tarda cada socket en recibirlas. El servidor
+tiene que usar el mismo channel layer (SQLite del mismo host o Redis).
 """
+import argparse
 import asyncio
 import websockets
 import json
 import os
+import resource
+import statistics
 import sys
+import time
 import django
 from pathlib import Path
 
@@ -47,6 +61,124 @@ async def test_websocket():
     except Exception as e:
         print(f"❌ Error en WebSocket: {e}")
 
+
+# --- Modo carga ---
+
+def preparar_sesion(username):
+    """Usuario de prueba y una sesión autenticada para sus sockets"""
+    from importlib import import_module
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from core.models import Usuario
+
+    usuario, creado = Usuario.objects.get_or_create(username=username)
+    if creado:
+        usuario.set_unusable_password()
+        usuario.save(update_fields=['password'])
+
+    sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+    sesion[SESSION_KEY] = str(usuario.pk)
+    sesion[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+    sesion.create()
+    return usuario, sesion.session_key
+
+
+def percentiles(valores):
+    if not valores:
+        return 'sin datos'
+    valores = sorted(v * 1000 for v in valores)
+    p = lambda q: valores[min(len(valores) - 1, int(len(valores) * q))]  # noqa: E731
+    return (f'p50 {statistics.median(valores):8.1f} ms   p95 {p(0.95):8.1f} ms   '
+            f'p99 {p(0.99):8.1f} ms   máx {valores[-1]:8.1f} ms')
+
+
+async def prueba_carga(args):
+    from asgiref.sync import sync_to_async
+    from channels.layers import get_channel_layer
+    from core.notificaciones import grupo_usuario
+
+    # Miles de sockets necesitan miles de descriptores de archivo
+    suave, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (duro, duro))
+
+    usuario, session_key = await sync_to_async(preparar_sesion)(args.usuario)
+    uri = f'ws://{args.host}/ws/notifications/{usuario.pk}/'
+    cabeceras = {'Cookie': f'sessionid={session_key}'}
+
+    conexion_ms, rechazos, errores = [], {}, []
+    entregas = [[] for _ in range(args.rondas)]
+    todos_conectados = asyncio.Event()
+    semaforo = asyncio.Semaphore(args.concurrencia)
+    pendientes = [args.carga]
+
+    async def cliente():
+        try:
+            async with semaforo:
+                inicio = time.perf_counter()
+                websocket = await websockets.connect(uri, additional_headers=cabeceras, open_timeout=60)
+                await websocket.recv()  # snapshot inicial
+                conexion_ms.append(time.perf_counter() - inicio)
+        except websockets.exceptions.ConnectionClosed as e:
+            codigo = e.rcvd.code if e.rcvd else None
+            rechazos[codigo] = rechazos.get(codigo, 0) + 1
+            return
+        except Exception as e:
+            errores.append(repr(e))
+            return
+        finally:
+            pendientes[0] -= 1
+            if pendientes[0] == 0:
+                todos_conectados.set()
+
+        try:
+            for ronda in range(args.rondas):
+                mensaje = json.loads(await websocket.recv())
+                enviado = mensaje.get('notification', {}).get('enviado')
+                if enviado:
+                    entregas[ronda].append(time.time() - enviado)
+        except Exception as e:
+            errores.append(repr(e))
+        finally:
+            await websocket.close()
+
+    print(f'Abriendo {args.carga} sockets contra {uri} (concurrencia {args.concurrencia})...')
+    inicio = time.perf_counter()
+    tareas = [asyncio.create_task(cliente()) for _ in range(args.carga)]
+    await todos_conectados.wait()
+    duracion = time.perf_counter() - inicio
+    print(f'Conectados {len(conexion_ms)} en {duracion:.1f}s ({len(conexion_ms) / duracion:,.0f}/s); '
+          f'rechazados {rechazos or 0}; errores {len(errores)}')
+    print(f'  Conexión (handshake + snapshot): {percentiles(conexion_ms)}')
+
+    layer = get_channel_layer()
+    for ronda in range(args.rondas):
+        await asyncio.sleep(args.pausa)
+        await layer.group_send(grupo_usuario(usuario.pk), {
+            'type': 'notification_message',
+            'notification': {'id': None, 'titulo': 'Prueba de carga', 'mensaje': f'Ronda {ronda + 1}',
+                             'tipo': 'info', 'enviado': time.time()},
+        })
+
+    await asyncio.wait(tareas, timeout=args.pausa + 30)
+    for ronda, latencias in enumerate(entregas, 1):
+        print(f'  Difusión ronda {ronda} ({len(latencias)}/{len(conexion_ms)} recibidas): {percentiles(latencias)}')
+    if errores:
+        print(f'  Primeros errores: {errores[:3]}')
+
+
 if __name__ == "__main__":
-    print("🔌 Probando conexión WebSocket...")
-    asyncio.run(test_websocket())
+    parser = argparse.ArgumentParser(description='Prueba de conexiones WebSocket de SARA')
+    parser.add_argument('--carga', type=int, help='Sockets concurrentes a abrir (modo carga)')
+    parser.add_argument('--host', default='localhost:8000')
+    parser.add_argument('--usuario', default='prueba_carga_ws', help='Usuario de prueba (se crea si no existe)')
+    parser.add_argument('--rondas', type=int, default=3, help='Notificaciones difundidas a todos los sockets')
+    parser.add_argument('--concurrencia', type=int, default=200, help='Handshakes simultáneos')
+    parser.add_argument('--pausa', type=float, default=1.0, help='Segundos entre rondas')
+    args = parser.parse_args()
+
+    if args.carga:
+        asyncio.run(prueba_carga(args))
+    else:
+        print("🔌 Probando conexión WebSocket...")
+        asyncio.run(test_websocket())